@@ -0,0 +1,203 @@
+import asyncio
+import logging
+import math
+import os
+import time
+from collections import OrderedDict, deque
+from typing import Optional
+
+from database import DB_POOL_CAPACITY
+
+logger = logging.getLogger(__name__)
+
+# AI 생성 요청 입장 제어 설정
+# AI 요청이 모두 커넥션을 잡고 있어도 로그인/목록 등 다른 API가 쓸 수 있게 남겨두는 커넥션 수
+AI_ADMISSION_DB_RESERVE = int(os.getenv("AI_ADMISSION_DB_RESERVE", "5"))
+# 동시 생성 수 상한 (기본값: DB 풀 용량 - 예약분, PgBouncer 모드는 16; 설정값도 이 용량을 넘지 못함)
+AI_ADMISSION_MAX_CONCURRENT = int(os.getenv(
+    "AI_ADMISSION_MAX_CONCURRENT",
+    "16" if DB_POOL_CAPACITY is None else str(max(1, DB_POOL_CAPACITY - AI_ADMISSION_DB_RESERVE))
+))
+AI_ADMISSION_MAX_QUEUE = int(os.getenv("AI_ADMISSION_MAX_QUEUE", "100"))
+AI_ADMISSION_MAX_QUEUE_PER_USER = int(os.getenv("AI_ADMISSION_MAX_QUEUE_PER_USER", "3"))
+AI_ADMISSION_QUEUE_TIMEOUT_SECONDS = float(os.getenv("AI_ADMISSION_QUEUE_TIMEOUT_SECONDS", "30"))
+
+def pool_bounded_concurrency(requested: int, pool_capacity: Optional[int], reserve: int) -> int:
+    """
+    Cap generation concurrency below the DB pool capacity
+
+    Each admitted request briefly needs a pooled connection to save messages, so
+    max_concurrent must stay under pool_size + max_overflow with `reserve`
+    connections left for the rest of the API.
+    """
+    if pool_capacity is None:
+        return requested
+    return min(requested, max(1, pool_capacity - max(0, reserve)))
+
+class AdmissionRejected(Exception):
+    """
+    The wait queue is full (or the wait timed out); retry after retry_after seconds
+    """
+    def __init__(self, retry_after: int, reason: str):
+        super().__init__(reason)
+        self.retry_after = retry_after
+        self.reason = reason
+
+class AdmissionTicket:
+    """
+    A held generation slot; release() is idempotent
+    """
+    def __init__(self, controller: "AdmissionController"):
+        self._controller = controller
+        self._acquired_at = time.monotonic()
+        self._released = False
+
+    def release(self):
+        if self._released:
+            return
+        self._released = True
+        self._controller._release(time.monotonic() - self._acquired_at)
+
+class AdmissionController:
+    """
+    Global concurrency cap for AI generation with per-user round-robin queuing
+
+    Requests over the cap wait in a per-user FIFO; freed slots are handed to users
+    in turn, so one user sending many messages cannot starve the others. When the
+    queue (or a user's share of it) is full the request is rejected immediately.
+    """
+    def __init__(
+        self,
+        max_concurrent: int = AI_ADMISSION_MAX_CONCURRENT,
+        max_queue: int = AI_ADMISSION_MAX_QUEUE,
+        max_queue_per_user: int = AI_ADMISSION_MAX_QUEUE_PER_USER,
+        queue_timeout: float = AI_ADMISSION_QUEUE_TIMEOUT_SECONDS
+    ):
+        self.max_concurrent = max(1, max_concurrent)
+        self.max_queue = max(0, max_queue)
+        self.max_queue_per_user = max(0, max_queue_per_user)
+        self.queue_timeout = queue_timeout
+        self._in_flight = 0
+        self._queues = OrderedDict()  # user_id -> deque of waiter futures, in round-robin order
+        self._queued = 0
+        # Stats
+        self.admitted = 0
+        self.queued_total = 0
+        self.rejected = 0
+        self.timeouts = 0
+        self.wait_seconds_total = 0.0
+        self.wait_seconds_max = 0.0
+        self.service_seconds_avg = 0.0
+
+    async def acquire(self, user_id: int) -> AdmissionTicket:
+        if self._in_flight < self.max_concurrent and self._queued == 0:
+            self._in_flight += 1
+            return self._admit(0.0)
+
+        waiters = self._queues.get(user_id)
+        if self._queued >= self.max_queue or (waiters is not None and len(waiters) >= self.max_queue_per_user):
+            self.rejected += 1
+            raise AdmissionRejected(self.retry_after(), "AI generation queue is full")
+
+        future = asyncio.get_running_loop().create_future()
+        if waiters is None:
+            waiters = self._queues[user_id] = deque()
+        waiters.append(future)
+        self._queued += 1
+        self.queued_total += 1
+        started = time.monotonic()
+
+        try:
+            await asyncio.wait_for(future, timeout=self.queue_timeout)
+        except asyncio.TimeoutError:
+            self._remove_waiter(user_id, future)
+            self.timeouts += 1
+            raise AdmissionRejected(self.retry_after(), "Timed out waiting for an AI generation slot")
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled():
+                # The slot was handed over just before the caller went away
+                self._release(None)
+            else:
+                self._remove_waiter(user_id, future)
+            raise
+
+        return self._admit(time.monotonic() - started)
+
+    def _admit(self, waited: float) -> AdmissionTicket:
+        self.admitted += 1
+        self.wait_seconds_total += waited
+        self.wait_seconds_max = max(self.wait_seconds_max, waited)
+        return AdmissionTicket(self)
+
+    def _remove_waiter(self, user_id: int, future: asyncio.Future):
+        waiters = self._queues.get(user_id)
+        if waiters is None:
+            return
+        try:
+            waiters.remove(future)
+            self._queued -= 1
+        except ValueError:
+            pass
+        if not waiters:
+            del self._queues[user_id]
+
+    def _release(self, held_seconds: Optional[float]):
+        if held_seconds is not None:
+            # EWMA of slot hold time, used for Retry-After estimates
+            if self.service_seconds_avg == 0.0:
+                self.service_seconds_avg = held_seconds
+            else:
+                self.service_seconds_avg = 0.8 * self.service_seconds_avg + 0.2 * held_seconds
+
+        # Hand the slot straight to the next user in round-robin order
+        while self._queues:
+            user_id, waiters = next(iter(self._queues.items()))
+            future = waiters.popleft()
+            self._queued -= 1
+            if waiters:
+                self._queues.move_to_end(user_id)
+            else:
+                del self._queues[user_id]
+            if not future.done():
+                future.set_result(None)
+                return
+        self._in_flight -= 1
+
+    def retry_after(self) -> int:
+        """
+        Seconds until the current backlog is expected to drain
+        """
+        service = self.service_seconds_avg or 5.0
+        backlog = (self._queued + 1) / self.max_concurrent
+        return max(1, min(120, math.ceil(service * backlog)))
+
+    def get_status(self) -> dict:
+        return {
+            "max_concurrent": self.max_concurrent,
+            "in_flight": self._in_flight,
+            "queue_depth": self._queued,
+            "queued_users": len(self._queues),
+            "max_queue": self.max_queue,
+            "admitted": self.admitted,
+            "queued_total": self.queued_total,
+            "rejected": self.rejected,
+            "timeouts": self.timeouts,
+            "wait_seconds_total": round(self.wait_seconds_total, 6),
+            "wait_seconds_max": round(self.wait_seconds_max, 6),
+            "wait_seconds_avg": round(self.wait_seconds_total / self.admitted, 6) if self.admitted else 0.0,
+            "service_seconds_avg": round(self.service_seconds_avg, 6)
+        }
+
+_max_concurrent = pool_bounded_concurrency(AI_ADMISSION_MAX_CONCURRENT, DB_POOL_CAPACITY, AI_ADMISSION_DB_RESERVE)
+if _max_concurrent < AI_ADMISSION_MAX_CONCURRENT:
+    logger.warning(
+        "AI admission concurrency capped by DB pool capacity",
+        extra={
+            "requested": AI_ADMISSION_MAX_CONCURRENT,
+            "max_concurrent": _max_concurrent,
+            "pool_capacity": DB_POOL_CAPACITY,
+            "reserve": AI_ADMISSION_DB_RESERVE
+        }
+    )
+
+ai_admission = AdmissionController(max_concurrent=_max_concurrent)
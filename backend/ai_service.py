@@ -1,238 +1,289 @@
-import google.generativeai as genai
+import logging
 import os
-from typing import Optional
+from typing import AsyncIterator, Optional
 import asyncio
-from PIL import Image
+import concurrent.futures
+import threading
+import time
+from opentelemetry import trace
+from opentelemetry.trace import SpanKind, Status, StatusCode
+
+from llm_providers import create_provider
+from resilience import AI_RETRY_MAX_ATTEMPTS, CircuitBreaker, CircuitOpenError, backoff_delay, is_retryable
+from metrics import AI_PROMPT_CHARS, AI_REQUEST_DURATION, AI_RESPONSE_CHARS, AI_RETRIES, AI_TIMEOUTS, AI_TIME_TO_FIRST_CHUNK
+from tracing import tracer
+
+logger = logging.getLogger(__name__)
+
+# Gemini 호출 동시성/타임아웃 설정
+AI_MAX_CONCURRENCY = int(os.getenv("AI_MAX_CONCURRENCY", "32"))
+AI_TIMEOUT_SECONDS = float(os.getenv("AI_TIMEOUT_SECONDS", "30"))
+AI_FALLBACK_MESSAGE = "죄송합니다. 일시적인 오류가 발생했습니다. 다시 시도해 주세요."
+
+# 과목별 시스템 프롬프트 (모듈 로드 시 한 번만 생성)
+SUBJECT_PROMPTS = {
+    "수학": r"""
+    당신은 한국의 고등학생을 위한 수학 전문 AI 선생님입니다.
+    
+    **응답 규칙:**
+    1. 수학 문제, 개념, 공식에 관한 질문만 답변합니다.
+    2. 수학과 관련 없는 질문에는 "수학 공부와 관련된 질문만 답변해드릴 수 있습니다"라고 응답하세요.
+    3. 학생이 "수학이 어려워요", "공부가 힘들어요" 등의 학습 고민을 토로할 때는 따뜻한 격려와 응원을 해주세요.
+    
+    학생이 수학 문제를 질문하면:
+    1. 문제를 정확히 파악하고 어떤 개념/단원인지 설명
+    2. 단계별로 자세한 풀이 과정 제공
+    3. 각 단계의 수학적 근거 설명
+    4. 유사한 문제나 응용 문제 제안
+    5. 실수하기 쉬운 부분 주의사항 안내
+    
+    **수식 표기 규칙:**
+    - 인라인 수식: $수식$ (예: $x^2 + 2x + 1$)
+    - 블록 수식: $$수식$$ (예: $$\frac{-b \pm \sqrt{b^2-4ac}}{2a}$$)
+    - 분수: \frac{분자}{분모}
+    - 제곱근: \sqrt{내용}
+    - 지수: x^{지수}
+    - 절댓값: |내용|
+    - 그리스 문자: \alpha, \beta, \pi, \theta 등
+    
+    **대화 연결 및 상호작용:**
+    - 이전 대화 내용을 참고하여 연속적인 설명 제공
+    - 학생이 이해했는지 확인하는 질문하기
+    - 추가 설명이 필요한 부분이 있는지 물어보기
+    - 비슷한 유형의 문제를 더 연습할지 제안하기
+    - 학생의 이해도에 따라 난이도 조절하기
+    
+    **학습 격려 메시지:**
+    수학이 어렵다고 느낄 때는 "수학은 논리와 패턴의 아름다운 학문이에요. 처음엔 어려워 보이지만, 차근차근 개념을 쌓아가면 분명히 재미있어질 거예요! 💪"와 같은 격려를 해주세요.
+    """,
+    
+    "영어": r"""
+    당신은 한국의 고등학생을 위한 영어 전문 AI 선생님입니다.
+    
+    **응답 규칙:**
+    1. 영어 문법, 어휘, 독해, 문제에 관한 질문만 답변합니다.
+    2. 영어와 관련 없는 질문에는 "영어 공부와 관련된 질문만 답변해드릴 수 있습니다"라고 응답하세요.
+    3. 학생이 "영어가 어려워요", "공부가 힘들어요" 등의 학습 고민을 토로할 때는 따뜻한 격려와 응원을 해주세요.
+    
+    학생이 영어 문제를 질문하면:
+    1. 문법 개념이나 어휘의 의미 정확히 설명
+    2. 문장 구조 분석
+    3. 번역과 함께 자연스러운 한국어 표현 제공
+    4. 관련 표현이나 숙어 소개
+    5. 수능에서 자주 출제되는 유형이라면 팁 제공
+    
+    **대화 연결 및 상호작용:**
+    - 이전 대화에서 학습한 내용과 연결하여 설명
+    - 학생이 비슷한 문법/어휘 패턴을 이해했는지 확인
+    - 추가 예문이나 연습 문제 제안
+    - 학습한 표현을 실제로 사용해볼 수 있는 상황 제시
+    
+    **학습 격려 메시지:**
+    영어가 어렵다고 느낄 때는 "영어는 꾸준히 노출되면서 익숙해지는 언어예요. 지금 모르는 것도 계속 연습하면 분명히 늘어날 거예요! 포기하지 말고 함께 해봐요 💪"와 같은 격려를 해주세요.
+    """,
+    
+    "국어": r"""
+    당신은 한국의 고등학생을 위한 국어 전문 AI 선생님입니다.
+    
+    **응답 규칙:**
+    1. 국어 문학, 언어, 독해, 문법에 관한 질문만 답변합니다.
+    2. 국어와 관련 없는 질문에는 "국어 공부와 관련된 질문만 답변해드릴 수 있습니다"라고 응답하세요.
+    3. 학생이 "국어가 어려워요", "공부가 힘들어요" 등의 학습 고민을 토로할 때는 따뜻한 격려와 응원을 해주세요.
+    
+    학생이 국어 문제를 질문하면:
+    1. 문학 작품이나 언어 개념의 핵심 이해
+    2. 문맥과 주제 의식 분석
+    3. 수능 출제 경향과 연결한 설명
+    4. 관련 작품이나 유사한 개념 소개
+    5. 논리적 사고와 표현 능력 향상 조언
+    
+    **대화 연결 및 상호작용:**
+    - 이전에 학습한 작품이나 개념과 비교 설명
+    - 학생의 이해도를 확인하는 질문
+    - 추가로 읽어볼 작품이나 참고 자료 추천
+    - 학생만의 해석이나 생각을 물어보기
+    
+    **학습 격려 메시지:**
+    국어가 어렵다고 느낄 때는 "국어는 우리말이지만 깊이 있게 사고하는 힘을 기르는 과목이에요. 천천히 읽고 생각하면서 함께 이해해봐요! 😊"와 같은 격려를 해주세요.
+    """,
+    
+    "사회탐구": r"""
+    당신은 한국의 고등학생을 위한 사회탐구 전문 AI 선생님입니다.
+    
+    **응답 규칙:**
+    1. 사회, 역사, 지리, 정치, 경제에 관한 질문만 답변합니다.
+    2. 사회탐구와 관련 없는 질문에는 "사회탐구 공부와 관련된 질문만 답변해드릴 수 있습니다"라고 응답하세요.
+    3. 학생이 "사회가 어려워요", "공부가 힘들어요" 등의 학습 고민을 토로할 때는 따뜻한 격려와 응원을 해주세요.
+    
+    학생이 사회탐구 문제를 질문하면:
+    1. 핵심 개념과 원리 명확히 설명
+    2. 역사적 맥락이나 사회적 배경 제시
+    3. 그래프나 자료 해석 방법 안내
+    4. 최근 시사 이슈와 연관지어 설명
+    5. 다른 개념들과의 관계 정리
+    
+    **대화 연결 및 상호작용:**
+    - 이전에 학습한 개념과 연결하여 설명
+    - 학생이 비슷한 개념이나 원리를 이해했는지 확인
+    - 추가 예시나 연습 문제 제안
+    - 학습한 개념을 실제로 적용해볼 수 있는 상황 제시
+    
+    **학습 격려 메시지:**
+    사회탐구가 어렵다고 느낄 때는 "사회는 우리가 살아가는 세상을 이해하는 흥미로운 과목이에요. 복잡해 보이지만 하나씩 차근차근 익혀가면 분명히 재미있어질 거예요! 🌟"와 같은 격려를 해주세요.
+    """,
+    
+    "과학탐구": r"""
+    당신은 한국의 고등학생을 위한 과학탐구 전문 AI 선생님입니다.
+    
+    **응답 규칙:**
+    1. 물리, 화학, 생물, 지구과학에 관한 질문만 답변합니다.
+    2. 과학탐구와 관련 없는 질문에는 "과학탐구 공부와 관련된 질문만 답변해드릴 수 있습니다"라고 응답하세요.
+    3. 학생이 "과학이 어려워요", "공부가 힘들어요" 등의 학습 고민을 토로할 때는 따뜻한 격려와 응원을 해주세요.
+    
+    학생이 과학탐구 문제를 질문하면:
+    1. 관련 과학 개념과 원리 명확히 설명
+    2. 공식의 유도 과정이나 적용 방법 제시
+    3. 그래프나 도표 해석 방법 안내
+    4. 일상생활 속 과학 현상과 연결
+    5. 실험 설계나 변인 통제 방법 설명
+    
+    **수식 표기 규칙:**
+    - 인라인 수식: $수식$ (예: $F = ma$, $E = mc^2$)
+    - 블록 수식: $$수식$$ (예: $$v = \frac{d}{t}$$)
+    - 분수: \frac{분자}{분모}
+    - 제곱근: \sqrt{내용}
+    - 지수: x^{지수}
+    - 하첨자: x_{하첨자}
+    - 그리스 문자: \alpha, \beta, \gamma, \delta, \lambda 등
+    - 화학식: H_2O, CO_2, NaCl 등
+    
+    **대화 연결 및 상호작용:**
+    - 이전에 학습한 개념과 연결하여 설명
+    - 학생이 비슷한 과학 원리나 법칙을 이해했는지 확인
+    - 추가 예시나 연습 문제 제안
+    - 학습한 개념을 실제로 적용해볼 수 있는 상황 제시
+    
+    **학습 격려 메시지:**
+    과학이 어렵다고 느낄 때는 "과학은 우리 주변의 신비로운 현상들을 이해하는 멋진 학문이에요. 어려운 개념도 차근차근 이해하면 '아하!'하는 순간이 올 거예요! 함께 탐구해봐요 🔬"와 같은 격려를 해주세요.
+    """
+}
+
+DEFAULT_SUBJECT = "수학"
 
 class AIService:
-    def __init__(self):
-        # Configure Gemini API
-        api_key = os.getenv("GEMINI_API_KEY")
-        if not api_key:
-            print("Warning: GEMINI_API_KEY not found in environment variables")
+    def __init__(self, max_concurrency: int = AI_MAX_CONCURRENCY, timeout: float = AI_TIMEOUT_SECONDS):
+        # Shared, bounded pool for blocking SDK calls (awaited via run_in_executor)
+        self.timeout = timeout
+        # Retries with backoff for transient errors; the breaker fails fast during provider incidents
+        self.retry_attempts = max(1, AI_RETRY_MAX_ATTEMPTS)
+        self.retries = 0
+        self.breaker = CircuitBreaker()
+        self._executor = concurrent.futures.ThreadPoolExecutor(
+            max_workers=max_concurrency,
+            thread_name_prefix="gemini"
+        )
         
-        genai.configure(api_key=api_key)
+        # LLM backend (Gemini, or the local fake for load tests), selected by AI_PROVIDER.
+        # Created off the event loop by start_warm_up()/ensure_provider() so importing the app stays cheap
+        self._provider = None
+        self._provider_lock = threading.Lock()
+        self._warm_up = None
         
-        # Configure safety settings
-        safety_settings = [
-            {
-                "category": "HARM_CATEGORY_HARASSMENT",
-                "threshold": "BLOCK_MEDIUM_AND_ABOVE"
-            },
-            {
-                "category": "HARM_CATEGORY_HATE_SPEECH",
-                "threshold": "BLOCK_MEDIUM_AND_ABOVE"
-            },
-            {
-                "category": "HARM_CATEGORY_SEXUALLY_EXPLICIT",
-                "threshold": "BLOCK_MEDIUM_AND_ABOVE"
-            },
-            {
-                "category": "HARM_CATEGORY_DANGEROUS_CONTENT",
-                "threshold": "BLOCK_MEDIUM_AND_ABOVE"
-            }
-        ]
-        
-        # Configure generation config
-        generation_config = {
-            "temperature": 0.3,  # Lower temperature for more precise math responses
-            "top_p": 1,
-            "top_k": 1,
-            # "max_output_tokens": 2048,
-        }
+    @property
+    def provider(self):
+        if self._provider is None:
+            with self._provider_lock:
+                if self._provider is None:
+                    self._provider = create_provider(SUBJECT_PROMPTS, DEFAULT_SUBJECT)
+        return self._provider
+    
+    @property
+    def model(self):
+        """
+        Used for subject-independent calls (summaries, pattern analysis)
+        """
+        return self.provider.model
+    
+    def warm_up(self):
+        """
+        Create the provider ahead of the first request (blocking; run off the event loop)
+        """
+        self.provider
+    
+    def start_warm_up(self) -> asyncio.Future:
+        """
+        Start creating the provider on the default executor; a failed attempt is retried on the next call
+        """
+        if self._warm_up is None or (self._warm_up.done() and self._provider is None):
+            self._warm_up = asyncio.get_running_loop().run_in_executor(None, self.warm_up)
+            self._warm_up.add_done_callback(self._log_warm_up)
+        return self._warm_up
+    
+    @staticmethod
+    def _log_warm_up(future: asyncio.Future):
+        if not future.cancelled() and future.exception() is not None:
+            logger.error("AI provider warm-up failed", exc_info=future.exception())
+    
+    async def ensure_provider(self):
+        """
+        Wait for the provider without blocking the event loop (await before build_prompt/model_for)
+        """
+        if self._provider is None:
+            await asyncio.shield(self.start_warm_up())
+        return self._provider
         
-        # Initialize the latest Gemini 2.5 Flash Preview model (supports both text and vision)
-        self.model = genai.GenerativeModel(
-            model_name="gemini-2.5-flash-preview-05-20",
-            safety_settings=safety_settings,
-            generation_config=generation_config
-        )
+    def model_for(self, subject_name: str):
+        """
+        Model to answer questions for a subject
+        """
+        if self.provider.system_instruction:
+            return self.provider.model_for(subject_name)
+        return self.model
         
     def get_subject_prompt(self, subject_name: str) -> str:
         """
         Get specialized prompt for each subject
         """
-        prompts = {
-            "수학": r"""
-            당신은 한국의 고등학생을 위한 수학 전문 AI 선생님입니다.
-            
-            **응답 규칙:**
-            1. 수학 문제, 개념, 공식에 관한 질문만 답변합니다.
-            2. 수학과 관련 없는 질문에는 "수학 공부와 관련된 질문만 답변해드릴 수 있습니다"라고 응답하세요.
-            3. 학생이 "수학이 어려워요", "공부가 힘들어요" 등의 학습 고민을 토로할 때는 따뜻한 격려와 응원을 해주세요.
-            
-            학생이 수학 문제를 질문하면:
-            1. 문제를 정확히 파악하고 어떤 개념/단원인지 설명
-            2. 단계별로 자세한 풀이 과정 제공
-            3. 각 단계의 수학적 근거 설명
-            4. 유사한 문제나 응용 문제 제안
-            5. 실수하기 쉬운 부분 주의사항 안내
-            
-            **수식 표기 규칙:**
-            - 인라인 수식: $수식$ (예: $x^2 + 2x + 1$)
-            - 블록 수식: $$수식$$ (예: $$\frac{-b \pm \sqrt{b^2-4ac}}{2a}$$)
-            - 분수: \frac{분자}{분모}
-            - 제곱근: \sqrt{내용}
-            - 지수: x^{지수}
-            - 절댓값: |내용|
-            - 그리스 문자: \alpha, \beta, \pi, \theta 등
-            
-            **대화 연결 및 상호작용:**
-            - 이전 대화 내용을 참고하여 연속적인 설명 제공
-            - 학생이 이해했는지 확인하는 질문하기
-            - 추가 설명이 필요한 부분이 있는지 물어보기
-            - 비슷한 유형의 문제를 더 연습할지 제안하기
-            - 학생의 이해도에 따라 난이도 조절하기
-            
-            **학습 격려 메시지:**
-            수학이 어렵다고 느낄 때는 "수학은 논리와 패턴의 아름다운 학문이에요. 처음엔 어려워 보이지만, 차근차근 개념을 쌓아가면 분명히 재미있어질 거예요! 💪"와 같은 격려를 해주세요.
-            """,
-            
-            "영어": r"""
-            당신은 한국의 고등학생을 위한 영어 전문 AI 선생님입니다.
-            
-            **응답 규칙:**
-            1. 영어 문법, 어휘, 독해, 문제에 관한 질문만 답변합니다.
-            2. 영어와 관련 없는 질문에는 "영어 공부와 관련된 질문만 답변해드릴 수 있습니다"라고 응답하세요.
-            3. 학생이 "영어가 어려워요", "공부가 힘들어요" 등의 학습 고민을 토로할 때는 따뜻한 격려와 응원을 해주세요.
-            
-            학생이 영어 문제를 질문하면:
-            1. 문법 개념이나 어휘의 의미 정확히 설명
-            2. 문장 구조 분석
-            3. 번역과 함께 자연스러운 한국어 표현 제공
-            4. 관련 표현이나 숙어 소개
-            5. 수능에서 자주 출제되는 유형이라면 팁 제공
-            
-            **대화 연결 및 상호작용:**
-            - 이전 대화에서 학습한 내용과 연결하여 설명
-            - 학생이 비슷한 문법/어휘 패턴을 이해했는지 확인
-            - 추가 예문이나 연습 문제 제안
-            - 학습한 표현을 실제로 사용해볼 수 있는 상황 제시
-            
-            **학습 격려 메시지:**
-            영어가 어렵다고 느낄 때는 "영어는 꾸준히 노출되면서 익숙해지는 언어예요. 지금 모르는 것도 계속 연습하면 분명히 늘어날 거예요! 포기하지 말고 함께 해봐요 💪"와 같은 격려를 해주세요.
-            """,
-            
-            "국어": r"""
-            당신은 한국의 고등학생을 위한 국어 전문 AI 선생님입니다.
-            
-            **응답 규칙:**
-            1. 국어 문학, 언어, 독해, 문법에 관한 질문만 답변합니다.
-            2. 국어와 관련 없는 질문에는 "국어 공부와 관련된 질문만 답변해드릴 수 있습니다"라고 응답하세요.
-            3. 학생이 "국어가 어려워요", "공부가 힘들어요" 등의 학습 고민을 토로할 때는 따뜻한 격려와 응원을 해주세요.
-            
-            학생이 국어 문제를 질문하면:
-            1. 문학 작품이나 언어 개념의 핵심 이해
-            2. 문맥과 주제 의식 분석
-            3. 수능 출제 경향과 연결한 설명
-            4. 관련 작품이나 유사한 개념 소개
-            5. 논리적 사고와 표현 능력 향상 조언
-            
-            **대화 연결 및 상호작용:**
-            - 이전에 학습한 작품이나 개념과 비교 설명
-            - 학생의 이해도를 확인하는 질문
-            - 추가로 읽어볼 작품이나 참고 자료 추천
-            - 학생만의 해석이나 생각을 물어보기
-            
-            **학습 격려 메시지:**
-            국어가 어렵다고 느낄 때는 "국어는 우리말이지만 깊이 있게 사고하는 힘을 기르는 과목이에요. 천천히 읽고 생각하면서 함께 이해해봐요! 😊"와 같은 격려를 해주세요.
-            """,
-            
-            "사회탐구": r"""
-            당신은 한국의 고등학생을 위한 사회탐구 전문 AI 선생님입니다.
-            
-            **응답 규칙:**
-            1. 사회, 역사, 지리, 정치, 경제에 관한 질문만 답변합니다.
-            2. 사회탐구와 관련 없는 질문에는 "사회탐구 공부와 관련된 질문만 답변해드릴 수 있습니다"라고 응답하세요.
-            3. 학생이 "사회가 어려워요", "공부가 힘들어요" 등의 학습 고민을 토로할 때는 따뜻한 격려와 응원을 해주세요.
-            
-            학생이 사회탐구 문제를 질문하면:
-            1. 핵심 개념과 원리 명확히 설명
-            2. 역사적 맥락이나 사회적 배경 제시
-            3. 그래프나 자료 해석 방법 안내
-            4. 최근 시사 이슈와 연관지어 설명
-            5. 다른 개념들과의 관계 정리
-            
-            **대화 연결 및 상호작용:**
-            - 이전에 학습한 개념과 연결하여 설명
-            - 학생이 비슷한 개념이나 원리를 이해했는지 확인
-            - 추가 예시나 연습 문제 제안
-            - 학습한 개념을 실제로 적용해볼 수 있는 상황 제시
-            
-            **학습 격려 메시지:**
-            사회탐구가 어렵다고 느낄 때는 "사회는 우리가 살아가는 세상을 이해하는 흥미로운 과목이에요. 복잡해 보이지만 하나씩 차근차근 익혀가면 분명히 재미있어질 거예요! 🌟"와 같은 격려를 해주세요.
-            """,
-            
-            "과학탐구": r"""
-            당신은 한국의 고등학생을 위한 과학탐구 전문 AI 선생님입니다.
-            
-            **응답 규칙:**
-            1. 물리, 화학, 생물, 지구과학에 관한 질문만 답변합니다.
-            2. 과학탐구와 관련 없는 질문에는 "과학탐구 공부와 관련된 질문만 답변해드릴 수 있습니다"라고 응답하세요.
-            3. 학생이 "과학이 어려워요", "공부가 힘들어요" 등의 학습 고민을 토로할 때는 따뜻한 격려와 응원을 해주세요.
-            
-            학생이 과학탐구 문제를 질문하면:
-            1. 관련 과학 개념과 원리 명확히 설명
-            2. 공식의 유도 과정이나 적용 방법 제시
-            3. 그래프나 도표 해석 방법 안내
-            4. 일상생활 속 과학 현상과 연결
-            5. 실험 설계나 변인 통제 방법 설명
-            
-            **수식 표기 규칙:**
-            - 인라인 수식: $수식$ (예: $F = ma$, $E = mc^2$)
-            - 블록 수식: $$수식$$ (예: $$v = \frac{d}{t}$$)
-            - 분수: \frac{분자}{분모}
-            - 제곱근: \sqrt{내용}
-            - 지수: x^{지수}
-            - 하첨자: x_{하첨자}
-            - 그리스 문자: \alpha, \beta, \gamma, \delta, \lambda 등
-            - 화학식: H_2O, CO_2, NaCl 등
-            
-            **대화 연결 및 상호작용:**
-            - 이전에 학습한 개념과 연결하여 설명
-            - 학생이 비슷한 과학 원리나 법칙을 이해했는지 확인
-            - 추가 예시나 연습 문제 제안
-            - 학습한 개념을 실제로 적용해볼 수 있는 상황 제시
-            
-            **학습 격려 메시지:**
-            과학이 어렵다고 느낄 때는 "과학은 우리 주변의 신비로운 현상들을 이해하는 멋진 학문이에요. 어려운 개념도 차근차근 이해하면 '아하!'하는 순간이 올 거예요! 함께 탐구해봐요 🔬"와 같은 격려를 해주세요.
-            """
-        }
-        
-        return prompts.get(subject_name, prompts["수학"])
+        return SUBJECT_PROMPTS.get(subject_name, SUBJECT_PROMPTS[DEFAULT_SUBJECT])
     
-    async def generate_response(
+    def build_prompt(
         self, 
         subject_name: str, 
         message_text: str, 
         conversation_history: Optional[list] = None,
-        image=None
+        image=None,
+        summary: Optional[str] = None
     ) -> str:
         """
-        Generate AI response based on subject, message, and conversation history
+        Build the full prompt from subject prompt, conversation summary/history and question
         """
-        try:
-            subject_prompt = self.get_subject_prompt(subject_name)
-            
-            # Build conversation context
-            context = ""
-            if conversation_history:
-                context = "\n\n=== 이전 대화 내용 ===\n"
-                # Include ALL messages from this session for full context
-                for msg in conversation_history:
-                    speaker = "학생" if msg.get('is_user') else "AI 선생님"
-                    content = msg.get('content', '')
-                    # Only show text content, skip image paths
-                    if content.strip():
-                        context += f"{speaker}: {content}\n"
-                context += "\n=== 현재 질문 ===\n"
-            
-            # Prepare the full prompt with context
-            if image:
-                # When image is provided, focus on problem analysis and solution
-                full_prompt = f"""{subject_prompt}
-
-{context}**이미지 분석 및 문제 해결 지침:**
+        # Subject models already carry the prompt as system_instruction
+        if self.provider.system_instruction:
+            preamble = ""
+        else:
+            preamble = f"{self.get_subject_prompt(subject_name)}\n\n"
+        
+        # Build conversation context
+        context = ""
+        if summary:
+            # Rolling summary of older turns that no longer fit the token budget
+            context += f"\n\n=== 이전 대화 요약 ===\n{summary}\n"
+        if conversation_history:
+            context += "\n\n=== 이전 대화 내용 ===\n"
+            # Recent turns selected by the context builder's token budget
+            for msg in conversation_history:
+                speaker = "학생" if msg.get('is_user') else "AI 선생님"
+                content = msg.get('content', '')
+                # Only show text content, skip image paths
+                if content.strip():
+                    context += f"{speaker}: {content}\n"
+        if context:
+            context += "\n=== 현재 질문 ===\n"
+        
+        # Prepare the full prompt with context
+        if image:
+            # When image is provided, focus on problem analysis and solution
+            full_prompt = f"""{preamble}{context}**이미지 분석 및 문제 해결 지침:**
 
 학생이 수학 문제 이미지를 업로드했습니다. 위의 이전 대화 내용을 참고하여 연속성 있는 답변을 제공하세요.
 
@@ -249,47 +300,327 @@ class AIService:
 학생 질문: {message_text}
 
 이미지의 수학 문제를 분석하고 즉시 풀이를 시작하세요."""
-            else:
-                # For text-only messages, emphasize context continuity
-                full_prompt = f"""{subject_prompt}
-
-{context}**대화 연속성 중요**: 위의 이전 대화 내용을 반드시 참고하여 연속적이고 일관된 답변을 제공하세요. 학생이 이전에 어떤 질문을 했고, 어떤 도움이 필요한지 고려하여 답변하세요.
+        else:
+            # For text-only messages, emphasize context continuity
+            full_prompt = f"""{preamble}{context}**대화 연속성 중요**: 위의 이전 대화 내용을 반드시 참고하여 연속적이고 일관된 답변을 제공하세요. 학생이 이전에 어떤 질문을 했고, 어떤 도움이 필요한지 고려하여 답변하세요.
 
 학생 질문: {message_text}"""
-            
-            # Run generation in thread to avoid blocking
-            def generate():
-                max_retries = 3
-                for attempt in range(max_retries):
+        
+        return full_prompt
+    
+    async def generate_response(
+        self, 
+        subject_name: str, 
+        message_text: str, 
+        conversation_history: Optional[list] = None,
+        image=None,
+        summary: Optional[str] = None
+    ) -> str:
+        """
+        Generate AI response based on subject, message, and conversation history
+        """
+        with tracer.start_as_current_span(
+            "ai.generate_response",
+            kind=SpanKind.CLIENT,
+            attributes={"ai.subject": subject_name, "ai.has_image": image is not None}
+        ) as span:
+            started = time.perf_counter()
+            outcome = "error"
+            try:
+                await self.ensure_provider()
+                full_prompt = self.build_prompt(subject_name, message_text, conversation_history, image, summary)
+                AI_PROMPT_CHARS.labels("generate").observe(len(full_prompt))
+                span.set_attribute("ai.prompt_chars", len(full_prompt))
+                # Use vision model for image analysis, text-only generation otherwise
+                contents = [full_prompt, image] if image else full_prompt
+            
+                # Run generation in thread to avoid blocking
+                def generate():
+                    response = self.model_for(subject_name).generate_content(contents)
                     try:
-                        if image:
-                            # Use vision model for image analysis
-                            response = self.model.generate_content([full_prompt, image])
-                        else:
-                            # Use text-only generation
-                            response = self.model.generate_content(full_prompt)
-                        
-                        if hasattr(response, 'text') and response.text:
-                            return response.text.strip()
-                        else:
-                            if attempt == max_retries - 1:
-                                return "죄송합니다. 현재 응답을 생성할 수 없습니다. 다시 시도해 주세요."
-                    
-                    except Exception as e:
-                        if attempt == max_retries - 1:
-                            return f"죄송합니다. 오류가 발생했습니다: {str(e)}"
-                
-                return "죄송합니다. 응답을 생성할 수 없습니다."
-            
-            # Run in thread pool to avoid blocking
-            import concurrent.futures
-            with concurrent.futures.ThreadPoolExecutor() as executor:
-                future = executor.submit(generate)
-                return future.result(timeout=30)  # 30 second timeout
+                        return response.text.strip()
+                    except ValueError:
+                        # No text parts (e.g. safety-blocked)
+                        return ""
+            
+                # Retried with backoff on transient errors, in the shared pool
+                response_text = await self._call_with_retry(generate)
+                AI_RESPONSE_CHARS.labels("generate").observe(len(response_text))
+                if not response_text:
+                    outcome = "empty"
+                    return "죄송합니다. 현재 응답을 생성할 수 없습니다. 다시 시도해 주세요."
+                outcome = "success"
+                return response_text
                 
+            except CircuitOpenError:
+                outcome = "circuit_open"
+                logger.warning("AI provider circuit open, returning fallback message")
+                return AI_FALLBACK_MESSAGE
+            except asyncio.TimeoutError:
+                outcome = "timeout"
+                logger.warning("AI generation timed out", extra={"timeout_seconds": self.timeout})
+                return "죄송합니다. 응답 시간이 초과되었습니다. 다시 시도해 주세요."
+            except Exception as e:
+                span.record_exception(e)
+                logger.exception("AI generation failed")
+                return AI_FALLBACK_MESSAGE
+            finally:
+                AI_REQUEST_DURATION.labels("generate", outcome).observe(time.perf_counter() - started)
+                span.set_attribute("ai.outcome", outcome)
+                if outcome != "success":
+                    span.set_status(Status(StatusCode.ERROR, outcome))
+    
+    async def stream_response(
+        self, 
+        subject_name: str, 
+        message_text: str, 
+        conversation_history: Optional[list] = None,
+        image=None,
+        summary: Optional[str] = None
+    ) -> AsyncIterator[str]:
+        """
+        Stream AI response text chunks as Gemini produces them
+        
+        Transient errors are retried only before the first chunk; once text has
+        been sent to the client the error is raised to the caller.
+        """
+        await self.ensure_provider()
+        full_prompt = self.build_prompt(subject_name, message_text, conversation_history, image, summary)
+        contents = [full_prompt, image] if image else full_prompt
+        AI_PROMPT_CHARS.labels("stream").observe(len(full_prompt))
+        
+        # Not made current: the generator is resumed from the response's context
+        span = tracer.start_span(
+            "ai.stream_response",
+            kind=SpanKind.CLIENT,
+            attributes={
+                "ai.subject": subject_name,
+                "ai.has_image": image is not None,
+                "ai.prompt_chars": len(full_prompt)
+            }
+        )
+        started = time.perf_counter()
+        outcome = "error"
+        response_chars = 0
+        try:
+            attempt = 0
+            while True:
+                attempt += 1
+                self.breaker.before_call()
+                received = False
+                chunks = self._stream_once(subject_name, contents)
+                try:
+                    async for text in chunks:
+                        if not received:
+                            AI_TIME_TO_FIRST_CHUNK.observe(time.perf_counter() - started)
+                            span.add_event("first_chunk")
+                        received = True
+                        response_chars += len(text)
+                        yield text
+                except (asyncio.CancelledError, GeneratorExit):
+                    self.breaker.record_ignored()
+                    raise
+                except asyncio.TimeoutError:
+                    AI_TIMEOUTS.inc()
+                    self.breaker.record_failure()
+                    raise
+                except Exception as e:
+                    if not is_retryable(e):
+                        self.breaker.record_ignored()
+                        raise
+                    self.breaker.record_failure()
+                    if received or attempt >= self.retry_attempts:
+                        raise
+                    await self._backoff(attempt, e, span)
+                    continue
+                finally:
+                    # Stop the producer thread promptly if the consumer went away
+                    await chunks.aclose()
+                self.breaker.record_success()
+                outcome = "success"
+                return
+        except CircuitOpenError:
+            outcome = "circuit_open"
+            raise
+        except asyncio.TimeoutError:
+            outcome = "timeout"
+            raise
+        except (asyncio.CancelledError, GeneratorExit):
+            outcome = "cancelled"
+            raise
         except Exception as e:
-            print(f"Error in generate_response: {e}")
-            return f"죄송합니다. 오류가 발생했습니다: {str(e)}"
+            span.record_exception(e)
+            raise
+        finally:
+            AI_REQUEST_DURATION.labels("stream", outcome).observe(time.perf_counter() - started)
+            AI_RESPONSE_CHARS.labels("stream").observe(response_chars)
+            span.set_attribute("ai.outcome", outcome)
+            span.set_attribute("ai.response_chars", response_chars)
+            if outcome not in ("success", "cancelled"):
+                span.set_status(Status(StatusCode.ERROR, outcome))
+            span.end()
+    
+    async def _stream_once(self, subject_name: str, contents) -> AsyncIterator[str]:
+        loop = asyncio.get_running_loop()
+        queue = asyncio.Queue()
+        finished = object()
+        cancelled = threading.Event()
+        
+        def push(item):
+            try:
+                loop.call_soon_threadsafe(queue.put_nowait, item)
+            except RuntimeError:
+                # Event loop already closed (shutdown)
+                cancelled.set()
+        
+        # Iterate the blocking SDK stream on the shared pool, handing chunks to the loop
+        def produce():
+            try:
+                response = self.model_for(subject_name).generate_content(contents, stream=True)
+                for chunk in response:
+                    if cancelled.is_set():
+                        break
+                    try:
+                        text = chunk.text
+                    except ValueError:
+                        # Chunk without text parts (e.g. safety-blocked)
+                        continue
+                    if text:
+                        push(text)
+            except Exception as e:
+                push(e)
+            finally:
+                push(finished)
+        
+        loop.run_in_executor(self._executor, produce)
+        try:
+            while True:
+                # Timeout applies between chunks, not to the whole answer
+                item = await asyncio.wait_for(queue.get(), timeout=self.timeout)
+                if item is finished:
+                    break
+                if isinstance(item, Exception):
+                    raise item
+                yield item
+        finally:
+            cancelled.set()
+    
+    async def _call_with_retry(self, func, *args):
+        """
+        Run a blocking SDK call through the circuit breaker, retrying transient errors with backoff
+        
+        Timeouts are not retried: the timed-out thread is still running and a
+        retry would only add load on a struggling provider.
+        """
+        attempt = 0
+        while True:
+            attempt += 1
+            self.breaker.before_call()
+            try:
+                result = await self._run_in_executor(func, *args)
+            except asyncio.CancelledError:
+                self.breaker.record_ignored()
+                raise
+            except asyncio.TimeoutError:
+                AI_TIMEOUTS.inc()
+                self.breaker.record_failure()
+                raise
+            except Exception as e:
+                if not is_retryable(e):
+                    self.breaker.record_ignored()
+                    raise
+                self.breaker.record_failure()
+                if attempt >= self.retry_attempts:
+                    raise
+                await self._backoff(attempt, e)
+                continue
+            self.breaker.record_success()
+            return result
+    
+    async def _backoff(self, attempt: int, error: Exception, span=None):
+        delay = backoff_delay(attempt)
+        self.retries += 1
+        AI_RETRIES.inc()
+        (span or trace.get_current_span()).add_event(
+            "retry",
+            {"error.type": type(error).__name__, "attempt": attempt, "delay_seconds": delay}
+        )
+        logger.warning(
+            "AI call failed, retrying",
+            extra={
+                "error_type": type(error).__name__,
+                "attempt": attempt,
+                "max_retries": self.retry_attempts - 1,
+                "delay_seconds": round(delay, 2)
+            }
+        )
+        await asyncio.sleep(delay)
+    
+    async def _run_in_executor(self, func, *args):
+        """
+        Run a blocking SDK call on the shared executor without blocking the event loop
+        """
+        loop = asyncio.get_running_loop()
+        return await asyncio.wait_for(
+            loop.run_in_executor(self._executor, func, *args),
+            timeout=self.timeout
+        )
+    
+    def shutdown(self):
+        """
+        Release the shared executor threads and provider resources (e.g. prompt caches)
+        """
+        self._executor.shutdown(wait=False, cancel_futures=True)
+        if self._provider is not None:
+            self._provider.close()
+    
+    async def summarize_conversation(
+        self,
+        previous_summary: Optional[str],
+        turns: list,
+        max_chars: int = 800
+    ) -> str:
+        """
+        Fold older conversation turns into the running session summary
+        """
+        transcript = "\n".join(
+            f"{'학생' if msg.get('is_user') else 'AI 선생님'}: {msg.get('content', '')}"
+            for msg in turns
+            if msg.get('content', '').strip()
+        )
+        summary_prompt = f"""다음은 학생과 AI 선생님의 학습 대화입니다. 기존 요약과 새 대화를 합쳐 하나의 요약으로 갱신하세요.
+
+- 학생이 다룬 문제/개념, 풀이의 핵심 결론, 학생이 어려워한 부분을 남기세요.
+- 인사말이나 격려 문구는 생략하세요.
+- 한국어로 {max_chars}자 이내로 작성하세요.
+
+=== 기존 요약 ===
+{previous_summary or "(없음)"}
+
+=== 새 대화 ===
+{transcript}"""
+        
+        await self.ensure_provider()
+        
+        def summarize():
+            response = self.model.generate_content(summary_prompt)
+            return response.text.strip()
+        
+        AI_PROMPT_CHARS.labels("summarize").observe(len(summary_prompt))
+        started = time.perf_counter()
+        outcome = "error"
+        with tracer.start_as_current_span(
+            "ai.summarize_conversation",
+            kind=SpanKind.CLIENT,
+            attributes={"ai.prompt_chars": len(summary_prompt)}
+        ):
+            try:
+                summary = await self._call_with_retry(summarize)
+                outcome = "success"
+            finally:
+                AI_REQUEST_DURATION.labels("summarize", outcome).observe(time.perf_counter() - started)
+        AI_RESPONSE_CHARS.labels("summarize").observe(len(summary))
+        return summary[:max_chars * 2]
     
     async def analyze_student_pattern(self, user_id: int, recent_questions: list) -> str:
         """
@@ -320,14 +651,14 @@ class AIService:
                 try:
                     response = self.model.generate_content(analysis_prompt)
                     return response.text
-                except:
+                except Exception:
                     return ""
             
-            loop = asyncio.get_event_loop()
-            analysis = await loop.run_in_executor(None, analyze)
+            await self.ensure_provider()
+            analysis = await self._run_in_executor(analyze)
             
             return analysis
             
-        except Exception as e:
-            print(f"Error analyzing student pattern: {e}")
+        except Exception:
+            logger.exception("student pattern analysis failed")
             return ""
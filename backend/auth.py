@@ -1,3 +1,4 @@
+import logging
 from datetime import datetime, timedelta
 from typing import Optional
 from jose import JWTError, jwt
@@ -15,6 +16,8 @@ SECRET_KEY = "your-secret-key-here-change-in-production"
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 30
 
+logger = logging.getLogger(__name__)
+
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="token")
 
@@ -63,20 +66,17 @@ async def get_current_user(token: str = Depends(oauth2_scheme), db: Session = De
         headers={"WWW-Authenticate": "Bearer"},
     )
     try:
-        print(f"Validating token: {token[:20]}..." if token else "No token provided")
         payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
         email: str = payload.get("sub")
-        print(f"Token payload email: {email}")
         if email is None:
-            print("No email in token payload")
+            logger.info("token rejected", extra={"reason": "missing_sub"})
             raise credentials_exception
         token_data = TokenData(email=email)
     except JWTError as e:
-        print(f"JWT Error: {e}")
+        logger.info("token rejected", extra={"reason": type(e).__name__})
         raise credentials_exception
     user = get_user_by_email(db, email=token_data.email)
     if user is None:
-        print(f"User not found for email: {token_data.email}")
+        logger.info("token rejected", extra={"reason": "unknown_user", "email": token_data.email})
         raise credentials_exception
-    print(f"User authenticated: {user.email}")
     return user
@@ -2,8 +2,18 @@ import cloudinary
 import cloudinary.uploader
 from cloudinary.utils import cloudinary_url
 import os
+import functools
+import logging
+import time
 from dotenv import load_dotenv
 
+from opentelemetry.trace import SpanKind, Status, StatusCode
+
+from metrics import CLOUDINARY_UPLOAD_BYTES, CLOUDINARY_UPLOAD_DURATION
+from tracing import run_in_executor_with_context, tracer
+
+logger = logging.getLogger(__name__)
+
 load_dotenv()
 
 class CloudinaryService:
@@ -28,42 +38,66 @@ class CloudinaryService:
         Returns:
             dict: 업로드 결과 (url, public_id 등)
         """
-        try:
-            # 파일명에서 확장자 제거하고 public_id 생성
-            public_id = f"{folder}/{filename.split('.')[0]}_{cloudinary.utils.archive_params()['timestamp']}"
+        with tracer.start_as_current_span(
+            "cloudinary.upload_image",
+            kind=SpanKind.CLIENT,
+            attributes={"image.bytes": len(file_data), "cloudinary.folder": folder}
+        ) as span:
+            started = time.perf_counter()
+            CLOUDINARY_UPLOAD_BYTES.observe(len(file_data))
+            try:
+                # 파일명에서 확장자 제거하고 public_id 생성
+                public_id = f"{folder}/{filename.split('.')[0]}_{cloudinary.utils.archive_params()['timestamp']}"
             
-            # Cloudinary에 업로드
-            result = cloudinary.uploader.upload(
-                file_data,
-                public_id=public_id,
-                folder=folder,
-                resource_type="image",
-                # 이미지 최적화 옵션
-                quality="auto:good",
-                fetch_format="auto",
-                # 메타데이터
-                context={
-                    "alt": f"AISSAM uploaded image: {filename}",
-                    "caption": f"Student uploaded: {filename}"
-                }
-            )
+                # Cloudinary에 업로드
+                result = cloudinary.uploader.upload(
+                    file_data,
+                    public_id=public_id,
+                    folder=folder,
+                    resource_type="image",
+                    # 이미지 최적화 옵션
+                    quality="auto:good",
+                    fetch_format="auto",
+                    # 메타데이터
+                    context={
+                        "alt": f"AISSAM uploaded image: {filename}",
+                        "caption": f"Student uploaded: {filename}"
+                    }
+                )
             
-            return {
-                "success": True,
-                "url": result.get("secure_url"),
-                "public_id": result.get("public_id"),
-                "width": result.get("width"),
-                "height": result.get("height"),
-                "format": result.get("format"),
-                "bytes": result.get("bytes")
-            }
+                CLOUDINARY_UPLOAD_DURATION.labels("success").observe(time.perf_counter() - started)
+                return {
+                    "success": True,
+                    "url": result.get("secure_url"),
+                    "public_id": result.get("public_id"),
+                    "width": result.get("width"),
+                    "height": result.get("height"),
+                    "format": result.get("format"),
+                    "bytes": result.get("bytes")
+                }
             
-        except Exception as e:
-            print(f"Cloudinary upload error: {e}")
-            return {
-                "success": False,
-                "error": str(e)
-            }
+            except Exception as e:
+                CLOUDINARY_UPLOAD_DURATION.labels("error").observe(time.perf_counter() - started)
+                span.record_exception(e)
+                span.set_status(Status(StatusCode.ERROR))
+                logger.warning("Cloudinary upload failed", extra={"error": str(e)})
+                return {
+                    "success": False,
+                    "error": str(e),
+                    # ValueError는 SDK가 요청 전에 던지는 설정/인자 오류(예: api_key 누락)라 재시도해도 실패
+                    "retryable": not isinstance(e, ValueError)
+                }
+    
+    async def upload_image_async(self, file_data, filename, folder="aissam_uploads"):
+        """
+        upload_image를 스레드 풀에서 실행 (이벤트 루프 블로킹 없이 await 가능)
+        
+        Args/Returns: upload_image와 동일
+        """
+        # 현재 span을 유지한 채 스레드 풀에서 실행
+        return await run_in_executor_with_context(
+            functools.partial(self.upload_image, file_data, filename, folder=folder)
+        )
     
     def delete_image(self, public_id):
         """
@@ -79,7 +113,7 @@ class CloudinaryService:
             result = cloudinary.uploader.destroy(public_id)
             return result.get("result") == "ok"
         except Exception as e:
-            print(f"Cloudinary delete error: {e}")
+            logger.warning("Cloudinary delete failed", extra={"public_id": public_id, "error": str(e)})
             return False
     
     def get_optimized_url(self, public_id, width=None, height=None, quality="auto:good"):
@@ -112,5 +146,5 @@ class CloudinaryService:
             )
             return url
         except Exception as e:
-            print(f"Cloudinary URL generation error: {e}")
+            logger.warning("Cloudinary URL generation failed", extra={"error": str(e)})
             return None
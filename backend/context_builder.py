@@ -0,0 +1,195 @@
+import asyncio
+import logging
+import math
+import os
+from dataclasses import dataclass, field
+from typing import List, Optional
+
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from admission import AdmissionRejected
+from models import ChatSession, Message
+
+logger = logging.getLogger(__name__)
+
+# 대화 컨텍스트 토큰 예산 설정
+AI_CONTEXT_TOKEN_BUDGET = int(os.getenv("AI_CONTEXT_TOKEN_BUDGET", "3000"))
+# 한 번에 살펴볼 최근 메시지 수 상한 (쿼리 크기 제한)
+AI_CONTEXT_MAX_MESSAGES = int(os.getenv("AI_CONTEXT_MAX_MESSAGES", "50"))
+# 예산 밖으로 밀려난 메시지가 이 개수 이상 쌓이면 요약에 반영
+AI_SUMMARY_MIN_BATCH = int(os.getenv("AI_SUMMARY_MIN_BATCH", "6"))
+AI_SUMMARY_MAX_CHARS = int(os.getenv("AI_SUMMARY_MAX_CHARS", "800"))
+# 요약 호출이 입장 제어(admission)에서 쓰는 사용자 키: 모든 요약이 한 사용자 몫의 차례만 받음
+SUMMARY_ADMISSION_KEY = "summary"
+
+def estimate_tokens(text: Optional[str]) -> int:
+    """
+    Cheap local token estimate (~4 UTF-8 bytes per token; a Hangul syllable is 3 bytes)
+    """
+    if not text:
+        return 0
+    return math.ceil(len(text.encode("utf-8")) / 4)
+
+@dataclass
+class ConversationContext:
+    summary: Optional[str] = None
+    history: List[dict] = field(default_factory=list)
+    # Unsummarized messages that fell outside the budget
+    overflow_count: int = 0
+
+def split_by_budget(messages_newest_first: list, budget: int):
+    """
+    Keep the newest messages that fit the budget; returns (kept_oldest_first, overflow_oldest_first)
+    """
+    kept = []
+    used = 0
+    for index, msg in enumerate(messages_newest_first):
+        cost = estimate_tokens(msg.content)
+        if used + cost > budget:
+            return list(reversed(kept)), list(reversed(messages_newest_first[index:]))
+        kept.append(msg)
+        used += cost
+    return list(reversed(kept)), []
+
+def to_turn(msg: Message) -> dict:
+    return {'content': msg.content, 'is_user': msg.is_user}
+
+class ConversationContextBuilder:
+    """
+    Builds a token-bounded prompt context: a stored rolling summary plus the newest turns
+
+    Messages that no longer fit the budget are folded into ChatSession.summary by a
+    background task, so prompt size stays bounded however long a session runs.
+    Summary calls take a slot from `admission` (when given) like chat requests,
+    so they count against the same global AI concurrency cap.
+    """
+    def __init__(
+        self,
+        ai_service,
+        session_factory,
+        token_budget: int = AI_CONTEXT_TOKEN_BUDGET,
+        max_messages: int = AI_CONTEXT_MAX_MESSAGES,
+        summary_min_batch: int = AI_SUMMARY_MIN_BATCH,
+        summary_max_chars: int = AI_SUMMARY_MAX_CHARS,
+        admission=None
+    ):
+        self.ai_service = ai_service
+        self.session_factory = session_factory
+        self.token_budget = token_budget
+        self.max_messages = max_messages
+        self.summary_min_batch = summary_min_batch
+        self.summary_max_chars = summary_max_chars
+        self.admission = admission
+        self._summarizing = set()
+        self._tasks = set()
+
+    async def _unsummarized_messages(self, db: AsyncSession, session: ChatSession, exclude_id: Optional[int] = None):
+        """
+        Newest unsummarized messages, at most max_messages (newest first)
+        """
+        query = select(Message).where(Message.session_id == session.id)
+        if session.summary_message_id is not None:
+            query = query.where(Message.id > session.summary_message_id)
+        if exclude_id is not None:
+            query = query.where(Message.id != exclude_id)
+        return (await db.scalars(
+            query.order_by(Message.created_at.desc(), Message.id.desc()).limit(self.max_messages)
+        )).all()
+
+    async def _count_before_window(self, db: AsyncSession, session: ChatSession, oldest_id: int) -> int:
+        """
+        Unsummarized messages older than the fetched window (never sent to the model)
+        """
+        query = select(func.count(Message.id)).where(
+            Message.session_id == session.id,
+            Message.id < oldest_id
+        )
+        if session.summary_message_id is not None:
+            query = query.where(Message.id > session.summary_message_id)
+        return await db.scalar(query)
+
+    async def build(self, db: AsyncSession, session: ChatSession, current_message_id: int) -> ConversationContext:
+        """
+        Context for answering current_message_id (which is sent separately as the question)
+        """
+        budget = self.token_budget - estimate_tokens(session.summary)
+        messages = await self._unsummarized_messages(db, session, exclude_id=current_message_id)
+        kept, overflow = split_by_budget(messages, max(budget, 0))
+        overflow_count = len(overflow)
+        if len(messages) == self.max_messages:
+            # Window full: older unsummarized turns are dropped too and must be summarized
+            overflow_count += await self._count_before_window(db, session, messages[-1].id)
+        return ConversationContext(
+            summary=session.summary,
+            history=[to_turn(msg) for msg in kept],
+            overflow_count=overflow_count
+        )
+
+    def schedule_summary(self, session_id: int, context: ConversationContext):
+        """
+        Fold overflowing turns into the session summary in the background once enough piled up
+        """
+        # +2: the current question and answer will push two more messages out next turn
+        if context.overflow_count + 2 < self.summary_min_batch or session_id in self._summarizing:
+            return
+        self._summarizing.add(session_id)
+        task = asyncio.create_task(self._update_summary(session_id))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _update_summary(self, session_id: int):
+        try:
+            async with self.session_factory() as db:
+                session = await db.get(ChatSession, session_id)
+                if session is None:
+                    return
+                # Everything older than the turns build() would keep gets summarized,
+                # including turns beyond the max_messages window
+                budget = self.token_budget - estimate_tokens(session.summary)
+                kept, _ = split_by_budget(await self._unsummarized_messages(db, session), max(budget, 0))
+                boundary_id = kept[0].id if kept else None
+
+                # Oldest first, max_messages per summarize call, no cap on the total
+                first_batch = True
+                while True:
+                    query = select(Message).where(Message.session_id == session_id)
+                    if session.summary_message_id is not None:
+                        query = query.where(Message.id > session.summary_message_id)
+                    if boundary_id is not None:
+                        query = query.where(Message.id < boundary_id)
+                    batch = (await db.scalars(
+                        query.order_by(Message.created_at, Message.id).limit(self.max_messages)
+                    )).all()
+                    if not batch or (first_batch and len(batch) < self.summary_min_batch):
+                        return
+                    first_batch = False
+
+                    turns = [to_turn(msg) for msg in batch]
+                    # End the read transaction so no connection is held during the AI call
+                    await db.commit()
+                    summary = await self._summarize(session.summary, turns)
+                    if not summary:
+                        return
+                    session.summary = summary
+                    session.summary_message_id = batch[-1].id
+                    await db.commit()
+                    if len(batch) < self.max_messages:
+                        return
+        except AdmissionRejected:
+            # AI capacity is taken by chat traffic; the next turn schedules the summary again
+            logger.info("conversation summary deferred", extra={"session_id": session_id})
+        except Exception:
+            logger.exception("conversation summary update failed", extra={"session_id": session_id})
+        finally:
+            self._summarizing.discard(session_id)
+
+    async def _summarize(self, previous_summary: Optional[str], turns: List[dict]) -> str:
+        ticket = await self.admission.acquire(SUMMARY_ADMISSION_KEY) if self.admission is not None else None
+        try:
+            return await self.ai_service.summarize_conversation(
+                previous_summary, turns, max_chars=self.summary_max_chars
+            )
+        finally:
+            if ticket is not None:
+                ticket.release()
@@ -1,41 +1,275 @@
-from sqlalchemy import create_engine, Column, Integer, String, DateTime
+from sqlalchemy import create_engine, event, text, Column, Integer, String, DateTime
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker, AsyncSession
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import AsyncAdaptedQueuePool, NullPool
+from urllib.parse import urlsplit, urlunsplit, parse_qsl, urlencode
+import asyncio
+import contextvars
 import os
+import threading
+import time
+import uuid
 from dotenv import load_dotenv
 
+from env_utils import env_flag
+
 load_dotenv()
 
+# Connection pool settings
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "5"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "10"))
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "30"))
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", "1800"))
+DB_POOL_PRE_PING = env_flag("DB_POOL_PRE_PING", "true")
+# Server-side statement timeout in milliseconds (0 = disabled)
+DB_STATEMENT_TIMEOUT_MS = int(os.getenv("DB_STATEMENT_TIMEOUT_MS", "0"))
+# PgBouncer transaction-mode pooler (e.g. Supabase port 6543): no app-side
+# pooling, no prepared statements, no startup parameters
+DB_PGBOUNCER = env_flag("DB_PGBOUNCER")
+# Connections the app can hold at once (None: no app-side pool, the pooler limits them)
+DB_POOL_CAPACITY = None if DB_PGBOUNCER else DB_POOL_SIZE + DB_MAX_OVERFLOW
+
 # Database URL - supports both SQLite (local) and PostgreSQL (production)
 DATABASE_URL = os.getenv("DATABASE_URL")
 
 if DATABASE_URL is None:
     # Local development with SQLite
     SQLALCHEMY_DATABASE_URL = "sqlite:///./aissam.db"
-    engine = create_engine(
-        SQLALCHEMY_DATABASE_URL, 
-        connect_args={"check_same_thread": False}  # Needed for SQLite
-    )
 elif DATABASE_URL.startswith("postgres://"):
     # Production with PostgreSQL (Supabase)
     # Supabase uses postgres:// but SQLAlchemy needs postgresql://
     SQLALCHEMY_DATABASE_URL = DATABASE_URL.replace("postgres://", "postgresql://", 1)
-    engine = create_engine(SQLALCHEMY_DATABASE_URL)
 else:
     # Already in postgresql:// format
     SQLALCHEMY_DATABASE_URL = DATABASE_URL
-    engine = create_engine(SQLALCHEMY_DATABASE_URL)
 
-# Create SessionLocal class
+IS_SQLITE = SQLALCHEMY_DATABASE_URL.startswith("sqlite")
+
+# Schema changes are Alembic migrations run once per deploy (alembic upgrade head).
+# Local SQLite has no release step, so the app applies them at startup there by default
+DB_AUTO_MIGRATE = env_flag("DB_AUTO_MIGRATE", "true" if IS_SQLITE else "false")
+# Connections opened at startup so the first requests do not pay for connection setup
+DB_POOL_PREWARM = int(os.getenv("DB_POOL_PREWARM", str(min(DB_POOL_SIZE, 2))))
+
+class PoolStats:
+    """
+    Connection checkout counters shared by the engines' pools
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.checkouts = 0
+        self.waiting = 0
+        self.wait_seconds_total = 0.0
+        self.wait_seconds_max = 0.0
+        self.timeouts = 0
+
+    def begin_wait(self):
+        with self._lock:
+            self.waiting += 1
+
+    def end_wait(self, elapsed: float, timed_out: bool = False):
+        with self._lock:
+            self.waiting -= 1
+            if timed_out:
+                self.timeouts += 1
+                return
+            self.checkouts += 1
+            self.wait_seconds_total += elapsed
+            self.wait_seconds_max = max(self.wait_seconds_max, elapsed)
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {
+                "checkouts": self.checkouts,
+                "waiting": self.waiting,
+                "wait_seconds_total": round(self.wait_seconds_total, 6),
+                "wait_seconds_max": round(self.wait_seconds_max, 6),
+                "timeouts": self.timeouts,
+            }
+
+pool_stats = PoolStats()
+
+class InstrumentedAsyncQueuePool(AsyncAdaptedQueuePool):
+    """
+    AsyncAdaptedQueuePool that records how long requests wait for a connection
+    """
+    def _do_get(self):
+        pool_stats.begin_wait()
+        start = time.perf_counter()
+        try:
+            conn = super()._do_get()
+        except PoolTimeoutError:
+            pool_stats.end_wait(time.perf_counter() - start, timed_out=True)
+            raise
+        except BaseException:
+            pool_stats.end_wait(time.perf_counter() - start)
+            raise
+        pool_stats.end_wait(time.perf_counter() - start)
+        return conn
+
+def to_async_url(url: str):
+    """
+    Map a sync database URL to its async driver (aiosqlite / asyncpg)
+
+    Returns (async_url, connect_args). asyncpg does not understand libpq's
+    sslmode query parameter, so it is moved into connect_args.
+    """
+    if url.startswith("sqlite"):
+        return url.replace("sqlite://", "sqlite+aiosqlite://", 1), {}
+
+    scheme, netloc, path, query, fragment = urlsplit(url)
+    params = dict(parse_qsl(query))
+    connect_args = {}
+    sslmode = params.pop("sslmode", None)
+    if sslmode and sslmode != "disable":
+        connect_args["ssl"] = sslmode
+    scheme = "postgresql+asyncpg"
+    return urlunsplit((scheme, netloc, path, urlencode(params), fragment)), connect_args
+
+def engine_options(is_async: bool) -> dict:
+    """
+    Engine keyword arguments for the configured database and pool settings
+    """
+    if IS_SQLITE:
+        if is_async:
+            return {
+                "poolclass": InstrumentedAsyncQueuePool,
+                "pool_size": DB_POOL_SIZE,
+                "max_overflow": DB_MAX_OVERFLOW,
+                "pool_timeout": DB_POOL_TIMEOUT,
+            }
+        return {"connect_args": {"check_same_thread": False}}  # Needed for SQLite
+
+    connect_args = {}
+    options = {"pool_pre_ping": DB_POOL_PRE_PING}
+
+    if DB_PGBOUNCER:
+        # The pooler owns the connections; prepared statements do not survive
+        # transaction-mode connection switching
+        options["poolclass"] = NullPool
+        if is_async:
+            connect_args["statement_cache_size"] = 0
+            connect_args["prepared_statement_cache_size"] = 0
+            connect_args["prepared_statement_name_func"] = lambda: f"__asyncpg_{uuid.uuid4()}__"
+    else:
+        options.update(
+            pool_size=DB_POOL_SIZE,
+            max_overflow=DB_MAX_OVERFLOW,
+            pool_timeout=DB_POOL_TIMEOUT,
+            pool_recycle=DB_POOL_RECYCLE,
+        )
+        if is_async:
+            options["poolclass"] = InstrumentedAsyncQueuePool
+        if DB_STATEMENT_TIMEOUT_MS > 0:
+            if is_async:
+                connect_args["server_settings"] = {"statement_timeout": str(DB_STATEMENT_TIMEOUT_MS)}
+            else:
+                connect_args["options"] = f"-c statement_timeout={DB_STATEMENT_TIMEOUT_MS}"
+
+    if connect_args:
+        options["connect_args"] = connect_args
+    return options
+
+# Sync engine (migrations and scripts)
+engine = create_engine(SQLALCHEMY_DATABASE_URL, **engine_options(is_async=False))
+
+# Async engine used by the API handlers
+ASYNC_DATABASE_URL, async_connect_args = to_async_url(SQLALCHEMY_DATABASE_URL)
+async_engine_options = engine_options(is_async=True)
+async_engine_options["connect_args"] = {**async_connect_args, **async_engine_options.get("connect_args", {})}
+async_engine = create_async_engine(ASYNC_DATABASE_URL, **async_engine_options)
+
+class QueryCounter:
+    """
+    Number of SQL statements executed while this counter is the current one
+    """
+    __slots__ = ("count",)
+
+    def __init__(self):
+        self.count = 0
+
+# Set per request by the metrics middleware. A mutable holder, because
+# SQLAlchemy's async bridge runs the cursor events in a copied context
+current_query_counter = contextvars.ContextVar("current_query_counter", default=None)
+
+class QueryStats:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.queries = 0
+
+    def increment(self):
+        with self._lock:
+            self.queries += 1
+
+query_stats = QueryStats()
+
+@event.listens_for(engine, "before_cursor_execute")
+@event.listens_for(async_engine.sync_engine, "before_cursor_execute")
+def _count_query(conn, cursor, statement, parameters, context, executemany):
+    query_stats.increment()
+    counter = current_query_counter.get()
+    if counter is not None:
+        counter.count += 1
+
+def get_pool_status() -> dict:
+    """
+    Current pool occupancy plus cumulative checkout wait counters
+    """
+    pool = async_engine.pool
+    status = {"pool_class": type(pool).__name__, **pool_stats.snapshot(), "queries": query_stats.queries}
+    if isinstance(pool, AsyncAdaptedQueuePool):
+        status.update(
+            size=pool.size(),
+            checked_out=pool.checkedout(),
+            checked_in=pool.checkedin(),
+            overflow=pool.overflow(),
+        )
+    return status
+
+def upgrade_schema():
+    """
+    alembic upgrade head (blocking); the same migrations the release command runs
+    """
+    from alembic import command
+    from alembic.config import Config
+
+    config = Config(os.path.join(os.path.dirname(os.path.abspath(__file__)), "alembic.ini"))
+    # Keep the app's logging configuration
+    config.attributes["configure_logger"] = False
+    command.upgrade(config, "head")
+
+async def prewarm_pool(connections: int = DB_POOL_PREWARM) -> int:
+    """
+    Open pooled connections concurrently and return them to the pool; returns how many were opened
+    """
+    if connections <= 0 or isinstance(async_engine.pool, NullPool):
+        return 0
+
+    async def open_one():
+        async with async_engine.connect() as conn:
+            await conn.execute(text("SELECT 1"))
+
+    # All connections must be checked out at once, or the pool would hand back the same one
+    results = await asyncio.gather(*(open_one() for _ in range(connections)), return_exceptions=True)
+    return sum(1 for result in results if not isinstance(result, BaseException))
+
+# Create SessionLocal class (sync - migrations and scripts)
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+# Create AsyncSessionLocal class (API handlers)
+AsyncSessionLocal = async_sessionmaker(
+    async_engine,
+    class_=AsyncSession,
+    autoflush=False,
+    expire_on_commit=False
+)
+
 # Create Base class
 Base = declarative_base()
 
 # Database dependency
-def get_db():
-    db = SessionLocal()
-    try:
+async def get_db():
+    async with AsyncSessionLocal() as db:
         yield db
-    finally:
-        db.close()
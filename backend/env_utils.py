@@ -0,0 +1,7 @@
+import os
+
+def env_flag(name: str, default: str = "false") -> bool:
+    """
+    Boolean environment setting: 1/true/yes/on (any case) are true, everything else false
+    """
+    return os.getenv(name, default).strip().lower() in ("1", "true", "yes", "on")
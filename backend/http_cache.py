@@ -0,0 +1,38 @@
+import hashlib
+from typing import Any, Optional
+
+from fastapi.responses import Response
+
+# 조건부 GET: 브라우저가 저장한 응답을 매번 재검증 (If-None-Match -> 304)
+PRIVATE_CACHE_CONTROL = "private, no-cache"
+PUBLIC_CACHE_CONTROL = "no-cache"
+
+def make_etag(*parts: Any) -> str:
+    """
+    Weak ETag from a version stamp (e.g. message count/max id) plus the query parameters
+    """
+    digest = hashlib.blake2b(digest_size=12)
+    for part in parts:
+        digest.update(repr(part).encode("utf-8"))
+        digest.update(b"\0")
+    return f'W/"{digest.hexdigest()}"'
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """
+    Weak comparison against an If-None-Match header value (RFC 9110 13.1.2)
+    """
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    opaque = etag.removeprefix("W/")
+    return any(candidate.strip().removeprefix("W/") == opaque for candidate in if_none_match.split(","))
+
+def cache_headers(etag: str, private: bool = True) -> dict:
+    return {
+        "ETag": etag,
+        "Cache-Control": PRIVATE_CACHE_CONTROL if private else PUBLIC_CACHE_CONTROL
+    }
+
+def not_modified(etag: str, private: bool = True) -> Response:
+    return Response(status_code=304, headers=cache_headers(etag, private))
@@ -0,0 +1,155 @@
+import asyncio
+import hashlib
+import os
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Hashable, Optional, Tuple
+
+# Idempotency-Key 저장 설정 (완료된 응답 재전송 보관 기간/개수)
+IDEMPOTENCY_TTL_SECONDS = float(os.getenv("IDEMPOTENCY_TTL_SECONDS", "600"))
+IDEMPOTENCY_MAX_ENTRIES = int(os.getenv("IDEMPOTENCY_MAX_ENTRIES", "10000"))
+IDEMPOTENCY_MAX_KEY_LENGTH = 255
+
+class IdempotencyConflict(Exception):
+    """
+    The key was already used for a different request
+    """
+
+def request_fingerprint(*parts: Any) -> str:
+    digest = hashlib.sha256()
+    for part in parts:
+        digest.update(repr(part).encode("utf-8"))
+        digest.update(b"\0")
+    return digest.hexdigest()
+
+class _Entry:
+    __slots__ = ("fingerprint", "future", "response", "expires_at")
+
+    def __init__(self, fingerprint: str, future: asyncio.Future):
+        self.fingerprint = fingerprint
+        self.future = future
+        self.response = None
+        self.expires_at = None
+
+class IdempotencyStore:
+    """
+    In-process single-flight + replay store for Idempotency-Key requests
+
+    The first request for a key leads and does the work. Duplicates arriving
+    while it runs await the leader's future. Duplicates arriving after it
+    completed get the stored response for IDEMPOTENCY_TTL_SECONDS. Failed
+    requests are forgotten so that a retry runs again.
+    """
+    def __init__(self, ttl: float = IDEMPOTENCY_TTL_SECONDS, max_entries: int = IDEMPOTENCY_MAX_ENTRIES):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        # Stats
+        self.replayed = 0
+        self.coalesced = 0
+
+    def begin(self, key: Hashable, fingerprint: str) -> Tuple[str, Any]:
+        """
+        ("replay", response), ("wait", future) or ("lead", entry); the leader must call
+        complete() or fail() and pass the entry as owner
+        """
+        self._evict_expired()
+        entry = self._entries.get(key)
+        if entry is not None:
+            if entry.fingerprint != fingerprint:
+                raise IdempotencyConflict("Idempotency-Key was already used for a different request")
+            if entry.response is not None:
+                self.replayed += 1
+                return "replay", entry.response
+            self.coalesced += 1
+            return "wait", entry.future
+
+        entry = self._entries[key] = _Entry(fingerprint, asyncio.get_running_loop().create_future())
+        while len(self._entries) > self.max_entries:
+            # Never drop in-flight entries; waiters hold their future anyway
+            oldest_key, oldest = next(iter(self._entries.items()))
+            if oldest.response is None:
+                break
+            del self._entries[oldest_key]
+        return "lead", entry
+
+    def _owned_entry(self, key: Hashable, owner: Optional[_Entry]) -> Optional[_Entry]:
+        """
+        The entry for key, unless it was replaced since owner began (e.g. a retry after fail())
+        """
+        entry = self._entries.get(key)
+        if entry is None or (owner is not None and entry is not owner):
+            return None
+        return entry
+
+    def complete(self, key: Hashable, response: Any, owner: Optional[_Entry] = None):
+        entry = self._owned_entry(key, owner)
+        if entry is None:
+            return
+        entry.response = response
+        entry.expires_at = time.monotonic() + self.ttl
+        self._entries.move_to_end(key)
+        if not entry.future.done():
+            entry.future.set_result(response)
+
+    def fail(self, key: Hashable, error: Optional[BaseException] = None, owner: Optional[_Entry] = None):
+        entry = self._owned_entry(key, owner)
+        if entry is None or entry.response is not None:
+            return
+        del self._entries[key]
+        if entry.future.done():
+            return
+        if error is None or isinstance(error, asyncio.CancelledError):
+            # Leader went away before finishing; waiters retry and one of them leads
+            entry.future.cancel()
+        else:
+            entry.future.set_exception(error)
+            # Avoid "exception was never retrieved" when nobody was waiting
+            entry.future.exception()
+
+    async def run(self, key: Hashable, fingerprint: str, func: Callable[[], Awaitable[Any]]) -> Any:
+        """
+        Run func once per key; concurrent duplicates share its result
+        """
+        while True:
+            state, value = self.begin(key, fingerprint)
+            if state == "replay":
+                return value
+            if state == "wait":
+                try:
+                    return await asyncio.shield(value)
+                except asyncio.CancelledError:
+                    if value.cancelled() and not asyncio.current_task().cancelling():
+                        continue
+                    raise
+            try:
+                response = await func()
+            except BaseException as e:
+                self.fail(key, e, owner=value)
+                raise
+            self.complete(key, response, owner=value)
+            return response
+
+    def _evict_expired(self):
+        # Completed entries are kept in completion order, so expiry is monotonic among them
+        now = time.monotonic()
+        expired = []
+        for key, entry in self._entries.items():
+            if entry.expires_at is None:
+                continue
+            if entry.expires_at > now:
+                break
+            expired.append(key)
+        for key in expired:
+            del self._entries[key]
+
+    def get_status(self) -> dict:
+        in_flight = sum(1 for entry in self._entries.values() if entry.response is None)
+        return {
+            "entries": len(self._entries),
+            "in_flight": in_flight,
+            "replayed": self.replayed,
+            "coalesced": self.coalesced
+        }
+
+idempotency_store = IdempotencyStore()
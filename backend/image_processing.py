@@ -0,0 +1,83 @@
+import asyncio
+import io
+import logging
+import os
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Optional
+
+from PIL import Image, ImageOps
+
+from env_utils import env_flag
+from tracing import tracer
+
+logger = logging.getLogger(__name__)
+
+# 업로드 이미지 전처리 설정 (문제 OCR에 충분한 해상도)
+IMAGE_MAX_EDGE = int(os.getenv("IMAGE_MAX_EDGE", "1600"))
+IMAGE_JPEG_QUALITY = int(os.getenv("IMAGE_JPEG_QUALITY", "85"))
+IMAGE_GRAYSCALE = env_flag("IMAGE_GRAYSCALE", "false")
+
+@dataclass
+class ProcessedImage:
+    data: bytes            # JPEG bytes for Cloudinary
+    image: Image.Image     # Decoded image for Gemini
+    filename: str
+    width: int
+    height: int
+
+def preprocess_image(
+    data: bytes,
+    filename: str,
+    max_edge: int = IMAGE_MAX_EDGE,
+    quality: int = IMAGE_JPEG_QUALITY,
+    grayscale: bool = IMAGE_GRAYSCALE
+) -> ProcessedImage:
+    """
+    Decode once, apply EXIF orientation, downsize to max_edge and re-encode as JPEG
+    """
+    image = Image.open(io.BytesIO(data))
+    image = ImageOps.exif_transpose(image)
+
+    if max_edge > 0:
+        # thumbnail keeps aspect ratio and never upscales
+        image.thumbnail((max_edge, max_edge), Image.LANCZOS)
+
+    if grayscale:
+        image = image.convert("L")
+    elif image.mode not in ("RGB", "L"):
+        # JPEG has no alpha/palette; flatten transparent backgrounds onto white
+        if image.mode in ("RGBA", "LA", "P"):
+            image = image.convert("RGBA")
+            background = Image.new("RGB", image.size, (255, 255, 255))
+            background.paste(image, mask=image.split()[-1])
+            image = background
+        else:
+            image = image.convert("RGB")
+
+    buffer = io.BytesIO()
+    image.save(buffer, format="JPEG", quality=quality, optimize=True)
+
+    return ProcessedImage(
+        data=buffer.getvalue(),
+        image=image,
+        filename=f"{Path(filename or 'image').stem}.jpg",
+        width=image.width,
+        height=image.height
+    )
+
+async def preprocess_image_async(data: bytes, filename: str) -> Optional[ProcessedImage]:
+    """
+    Run preprocess_image off the event loop; returns None if the data cannot be decoded
+    """
+    loop = asyncio.get_running_loop()
+    with tracer.start_as_current_span("image.preprocess", attributes={"image.bytes": len(data)}) as span:
+        try:
+            processed = await loop.run_in_executor(None, preprocess_image, data, filename)
+        except Exception as e:
+            span.record_exception(e)
+            logger.warning("could not preprocess image", extra={"error": str(e)})
+            return None
+        span.set_attribute("image.width", processed.width)
+        span.set_attribute("image.height", processed.height)
+        return processed
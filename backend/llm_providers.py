@@ -0,0 +1,271 @@
+import hashlib
+import logging
+import math
+import os
+import random
+import threading
+import time
+from abc import ABC, abstractmethod
+from typing import Iterator, Optional
+
+from google.api_core import exceptions as google_exceptions
+
+logger = logging.getLogger(__name__)
+
+# LLM 백엔드 선택: gemini(기본) 또는 fake(부하 테스트/벤치마크용 로컬 가짜 모델)
+AI_PROVIDER = os.getenv("AI_PROVIDER", "gemini").strip().lower()
+AI_MODEL_NAME = os.getenv("AI_MODEL_NAME", "gemini-2.5-flash-preview-05-20")
+
+# Fake 모델 설정
+FAKE_LLM_SEED = int(os.getenv("FAKE_LLM_SEED", "0"))
+FAKE_LLM_LATENCY_DIST = os.getenv("FAKE_LLM_LATENCY_DIST", "lognormal").strip().lower()  # fixed | uniform | normal | lognormal
+FAKE_LLM_LATENCY_MS = float(os.getenv("FAKE_LLM_LATENCY_MS", "800"))
+FAKE_LLM_LATENCY_SPREAD = float(os.getenv("FAKE_LLM_LATENCY_SPREAD", "0.5"))
+FAKE_LLM_RESPONSE_CHARS = int(os.getenv("FAKE_LLM_RESPONSE_CHARS", "600"))
+FAKE_LLM_CHUNK_CHARS = int(os.getenv("FAKE_LLM_CHUNK_CHARS", "40"))
+FAKE_LLM_CHUNK_INTERVAL_MS = float(os.getenv("FAKE_LLM_CHUNK_INTERVAL_MS", "50"))
+FAKE_LLM_ERROR_RATE = float(os.getenv("FAKE_LLM_ERROR_RATE", "0"))
+FAKE_LLM_ERROR_KIND = os.getenv("FAKE_LLM_ERROR_KIND", "unavailable").strip().lower()  # unavailable | quota | invalid | hang
+# hang 오류의 대기 시간 (기본: AI_TIMEOUT_SECONDS보다 1초 길게)
+FAKE_LLM_HANG_SECONDS = float(os.getenv("FAKE_LLM_HANG_SECONDS", str(float(os.getenv("AI_TIMEOUT_SECONDS", "30")) + 1)))
+
+class LLMProvider(ABC):
+    """
+    Backend behind AIService
+
+    Models are blocking and SDK-shaped: generate_content(contents, stream=False)
+    returns an object with .text, or an iterator of such chunks when streaming.
+    AIService runs them on its executor and owns retries, timeouts and the breaker.
+    """
+    name = "base"
+    # True when subject models already carry the subject prompt
+    system_instruction = False
+
+    @property
+    @abstractmethod
+    def model(self):
+        """
+        Subject-independent model (summaries, pattern analysis)
+        """
+
+    def model_for(self, subject_name: str):
+        return self.model
+
+    def close(self):
+        pass
+
+class GeminiProvider(LLMProvider):
+    name = "gemini"
+
+    def __init__(self, prompts: dict, default_subject: str, model_name: str = AI_MODEL_NAME):
+        # Imported here: google.generativeai is slow to import and only needed once a call is made
+        import google.generativeai as genai
+        from subject_models import SubjectModelRegistry
+
+        # Configure Gemini API
+        api_key = os.getenv("GEMINI_API_KEY")
+        if not api_key:
+            logger.warning("GEMINI_API_KEY not found in environment variables")
+
+        genai.configure(api_key=api_key)
+
+        # Configure safety settings
+        safety_settings = [
+            {
+                "category": "HARM_CATEGORY_HARASSMENT",
+                "threshold": "BLOCK_MEDIUM_AND_ABOVE"
+            },
+            {
+                "category": "HARM_CATEGORY_HATE_SPEECH",
+                "threshold": "BLOCK_MEDIUM_AND_ABOVE"
+            },
+            {
+                "category": "HARM_CATEGORY_SEXUALLY_EXPLICIT",
+                "threshold": "BLOCK_MEDIUM_AND_ABOVE"
+            },
+            {
+                "category": "HARM_CATEGORY_DANGEROUS_CONTENT",
+                "threshold": "BLOCK_MEDIUM_AND_ABOVE"
+            }
+        ]
+
+        # Configure generation config
+        generation_config = {
+            "temperature": 0.3,  # Lower temperature for more precise math responses
+            "top_p": 1,
+            "top_k": 1,
+            # "max_output_tokens": 2048,
+        }
+
+        model_kwargs = {
+            "safety_settings": safety_settings,
+            "generation_config": generation_config
+        }
+
+        # Initialize the latest Gemini 2.5 Flash Preview model (supports both text and vision)
+        # Used for subject-independent calls (summaries, pattern analysis)
+        self._model = genai.GenerativeModel(model_name=model_name, **model_kwargs)
+
+        # Per-subject models carrying the subject prompt as system_instruction
+        self.subject_models = SubjectModelRegistry(
+            model_name=model_name,
+            model_kwargs=model_kwargs,
+            prompts=prompts,
+            default_subject=default_subject
+        )
+        self.system_instruction = self.subject_models.enabled
+
+    @property
+    def model(self):
+        return self._model
+
+    def model_for(self, subject_name: str):
+        if self.system_instruction:
+            return self.subject_models.get(subject_name)
+        return self._model
+
+    def close(self):
+        # Delete provider-side prompt caches
+        self.subject_models.close()
+
+class FakeResponse:
+    def __init__(self, text: str):
+        self.text = text
+
+class FakeModel:
+    """
+    Deterministic stand-in for a GenerativeModel
+
+    The text depends only on the subject and the text parts of the prompt. Latency,
+    chunk cadence and injected errors come from a seeded RNG, so runs with the same
+    settings and request order are reproducible.
+    """
+    def __init__(self, provider: "FakeProvider", subject_name: Optional[str] = None):
+        self.provider = provider
+        self.subject_name = subject_name
+
+    def generate_content(self, contents, stream: bool = False, **kwargs):
+        text = self.provider.response_text(self.subject_name, contents)
+        latency, error = self.provider.draw()
+        if not stream:
+            time.sleep(latency)
+            if error is not None:
+                raise error
+            return FakeResponse(text)
+        return self._stream(text, latency, error)
+
+    def _stream(self, text: str, latency: float, error: Optional[Exception]) -> Iterator[FakeResponse]:
+        # Latency is time to first chunk; errors surface where the API reports them, before any text
+        time.sleep(latency)
+        if error is not None:
+            raise error
+        size = max(1, self.provider.chunk_chars)
+        for index in range(0, len(text), size):
+            if index:
+                time.sleep(self.provider.chunk_interval)
+            yield FakeResponse(text[index:index + size])
+
+class FakeProvider(LLMProvider):
+    """
+    Offline provider for load tests and benchmarks (AI_PROVIDER=fake)
+    """
+    name = "fake"
+    system_instruction = True
+
+    def __init__(
+        self,
+        prompts: dict,
+        default_subject: str,
+        seed: int = FAKE_LLM_SEED,
+        latency_dist: str = FAKE_LLM_LATENCY_DIST,
+        latency_ms: float = FAKE_LLM_LATENCY_MS,
+        latency_spread: float = FAKE_LLM_LATENCY_SPREAD,
+        response_chars: int = FAKE_LLM_RESPONSE_CHARS,
+        chunk_chars: int = FAKE_LLM_CHUNK_CHARS,
+        chunk_interval_ms: float = FAKE_LLM_CHUNK_INTERVAL_MS,
+        error_rate: float = FAKE_LLM_ERROR_RATE,
+        error_kind: str = FAKE_LLM_ERROR_KIND,
+        hang_seconds: float = FAKE_LLM_HANG_SECONDS
+    ):
+        self.prompts = prompts
+        self.default_subject = default_subject
+        self.latency_dist = latency_dist
+        self.latency = latency_ms / 1000
+        self.latency_spread = latency_spread
+        self.response_chars = response_chars
+        self.chunk_chars = chunk_chars
+        self.chunk_interval = chunk_interval_ms / 1000
+        self.error_rate = error_rate
+        self.error_kind = error_kind
+        self.hang_seconds = hang_seconds
+        # Set on close() so injected hangs release their executor threads
+        self._closed = threading.Event()
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self._model = FakeModel(self)
+        self._subject_models = {}
+        self.calls = 0
+
+    @property
+    def model(self):
+        return self._model
+
+    def model_for(self, subject_name: str):
+        if subject_name not in self.prompts:
+            subject_name = self.default_subject
+        model = self._subject_models.get(subject_name)
+        if model is None:
+            model = self._subject_models.setdefault(subject_name, FakeModel(self, subject_name))
+        return model
+
+    def draw(self):
+        """
+        Next (latency seconds, error or None) from the seeded RNG
+        """
+        with self._lock:
+            self.calls += 1
+            latency = self._draw_latency()
+            failed = self.error_rate > 0 and self._random.random() < self.error_rate
+        return latency, (self._make_error() if failed else None)
+
+    def _draw_latency(self) -> float:
+        mean = self.latency
+        spread = self.latency_spread
+        if mean <= 0 or self.latency_dist == "fixed":
+            return max(0.0, mean)
+        if self.latency_dist == "uniform":
+            return self._random.uniform(mean * max(0.0, 1 - spread), mean * (1 + spread))
+        if self.latency_dist == "normal":
+            return max(0.0, self._random.gauss(mean, mean * spread))
+        # lognormal with the configured mean: long right tail like real LLM latency
+        mu = math.log(mean) - spread ** 2 / 2
+        return self._random.lognormvariate(mu, spread)
+
+    def _make_error(self) -> Exception:
+        if self.error_kind == "quota":
+            return google_exceptions.ResourceExhausted("fake quota exceeded")
+        if self.error_kind == "invalid":
+            return google_exceptions.InvalidArgument("fake invalid request")
+        if self.error_kind == "hang":
+            # Just past the AI timeout, to exercise timeouts without pinning the executor
+            self._closed.wait(self.hang_seconds)
+        return google_exceptions.ServiceUnavailable("fake provider unavailable")
+
+    def close(self):
+        self._closed.set()
+
+    def response_text(self, subject_name: Optional[str], contents) -> str:
+        parts = contents if isinstance(contents, list) else [contents]
+        prompt = "".join(part for part in parts if isinstance(part, str))
+        digest = hashlib.sha256(f"{subject_name}\0{prompt}".encode("utf-8")).hexdigest()
+        sentence = f"[{subject_name or 'fake'}] {digest[:8]} 단계별 풀이입니다: $x^2 + {int(digest[8:10], 16)}x$. "
+        repeats = max(1, math.ceil(self.response_chars / len(sentence)))
+        return (sentence * repeats)[:max(1, self.response_chars)]
+
+def create_provider(prompts: dict, default_subject: str, name: str = AI_PROVIDER) -> LLMProvider:
+    if name == "fake":
+        logger.warning("AI_PROVIDER=fake: using the local fake LLM (no Gemini calls)")
+        return FakeProvider(prompts, default_subject)
+    if name != "gemini":
+        logger.warning("unknown AI_PROVIDER, using gemini", extra={"provider": name})
+    return GeminiProvider(prompts, default_subject)
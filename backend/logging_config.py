@@ -0,0 +1,212 @@
+import atexit
+import contextvars
+import json
+import logging
+import os
+import queue
+import random
+import re
+import sys
+import time
+import uuid
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener
+
+from env_utils import env_flag
+
+# 로깅 설정
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").strip().upper()
+LOG_FORMAT = os.getenv("LOG_FORMAT", "json").strip().lower()  # json | text
+# DEBUG/INFO 로그를 남길 요청 비율 (WARNING 이상은 항상 기록)
+LOG_SAMPLE_RATE = float(os.getenv("LOG_SAMPLE_RATE", "1.0"))
+LOG_REDACT = env_flag("LOG_REDACT", "true")
+LOG_QUEUE_SIZE = int(os.getenv("LOG_QUEUE_SIZE", "10000"))
+LOG_REQUESTS = env_flag("LOG_REQUESTS", "true")
+
+# Extra fields whose values are user content and never logged verbatim
+REDACTED_FIELDS = {"content", "message", "text", "prompt", "password", "title"}
+EMAIL_PATTERN = re.compile(r"([A-Za-z0-9._%+-])[A-Za-z0-9._%+-]*@([A-Za-z0-9.-]+\.[A-Za-z]{2,})")
+REQUEST_ID_PATTERN = re.compile(r"^[A-Za-z0-9._-]{1,128}$")
+
+request_id_var = contextvars.ContextVar("request_id", default=None)
+log_sampled_var = contextvars.ContextVar("log_sampled", default=True)
+
+# LogRecord attributes that are not user-supplied extra fields
+_RECORD_ATTRS = set(vars(logging.LogRecord("", 0, "", 0, "", None, None))) | {"message", "asctime", "request_id"}
+
+def redact_emails(text: str) -> str:
+    return EMAIL_PATTERN.sub(r"\1***@\2", text)
+
+def redact_value(key: str, value):
+    if key in REDACTED_FIELDS and value is not None:
+        return f"<redacted {len(str(value))} chars>"
+    if key == "email" and isinstance(value, str):
+        return redact_emails(value)
+    return value
+
+class RequestContextFilter(logging.Filter):
+    """
+    Attaches the request id and drops DEBUG/INFO records of unsampled requests
+    """
+    def filter(self, record: logging.LogRecord) -> bool:
+        record.request_id = request_id_var.get()
+        return record.levelno >= logging.WARNING or log_sampled_var.get()
+
+class NonBlockingQueueHandler(QueueHandler):
+    """
+    Enqueues records without formatting them; drops instead of blocking when the queue is full
+
+    The stdlib QueueHandler formats in the calling thread. Here only the
+    message is merged with its args; formatting, redaction and the stdout write
+    happen on the listener thread.
+    """
+    def __init__(self, log_queue: queue.Queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        record.msg = record.getMessage()
+        record.args = None
+        return record
+
+    def enqueue(self, record: logging.LogRecord):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+class JsonFormatter(logging.Formatter):
+    """
+    One JSON object per line with redacted user content
+    """
+    def __init__(self, redact: bool = LOG_REDACT):
+        super().__init__()
+        self.redact = redact
+
+    def format(self, record: logging.LogRecord) -> str:
+        message = record.getMessage()
+        entry = {
+            "ts": datetime.fromtimestamp(record.created, tz=timezone.utc).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": redact_emails(message) if self.redact else message,
+        }
+        request_id = getattr(record, "request_id", None)
+        if request_id:
+            entry["request_id"] = request_id
+        for key, value in record.__dict__.items():
+            if key in _RECORD_ATTRS or key.startswith("_"):
+                continue
+            entry[key] = redact_value(key, value) if self.redact else value
+        if record.exc_info:
+            entry["exc"] = self.formatException(record.exc_info)
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+class TextFormatter(JsonFormatter):
+    """
+    Human-readable variant for local development (LOG_FORMAT=text)
+    """
+    def format(self, record: logging.LogRecord) -> str:
+        message = record.getMessage()
+        if self.redact:
+            message = redact_emails(message)
+        fields = [
+            f"{key}={redact_value(key, value) if self.redact else value}"
+            for key, value in record.__dict__.items()
+            if key not in _RECORD_ATTRS and not key.startswith("_")
+        ]
+        request_id = getattr(record, "request_id", None)
+        prefix = f"{datetime.fromtimestamp(record.created):%H:%M:%S} {record.levelname:<7} {record.name}"
+        if request_id:
+            prefix += f" [{request_id[:8]}]"
+        line = f"{prefix} {message}" + (f" {' '.join(fields)}" if fields else "")
+        if record.exc_info:
+            line += "\n" + self.formatException(record.exc_info)
+        return line
+
+_listener = None
+_queue_handler = None
+
+def setup_logging():
+    """
+    Route all logging through a bounded queue drained by a background thread (idempotent)
+    """
+    global _listener, _queue_handler
+    if _listener is not None:
+        return
+
+    stream_handler = logging.StreamHandler(sys.stdout)
+    stream_handler.setFormatter(TextFormatter() if LOG_FORMAT == "text" else JsonFormatter())
+
+    log_queue = queue.Queue(maxsize=LOG_QUEUE_SIZE)
+    _queue_handler = NonBlockingQueueHandler(log_queue)
+    _queue_handler.addFilter(RequestContextFilter())
+    _listener = QueueListener(log_queue, stream_handler, respect_handler_level=False)
+    _listener.start()
+
+    root = logging.getLogger()
+    root.setLevel(LOG_LEVEL)
+    root.addHandler(_queue_handler)
+    atexit.register(shutdown_logging)
+
+def shutdown_logging():
+    """
+    Flush queued records and stop the listener thread
+    """
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+
+def get_logging_status() -> dict:
+    return {
+        "queued": _queue_handler.queue.qsize() if _queue_handler else 0,
+        "dropped": _queue_handler.dropped if _queue_handler else 0,
+        "sample_rate": LOG_SAMPLE_RATE
+    }
+
+request_logger = logging.getLogger("aissam.request")
+
+class RequestContextMiddleware:
+    """
+    Per-request correlation id (X-Request-ID in/out) and log sampling decision
+    """
+    def __init__(self, app, sample_rate: float = LOG_SAMPLE_RATE):
+        self.app = app
+        self.sample_rate = sample_rate
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        incoming = dict(scope["headers"]).get(b"x-request-id", b"").decode("latin-1")
+        request_id = incoming if REQUEST_ID_PATTERN.match(incoming) else uuid.uuid4().hex
+        id_token = request_id_var.set(request_id)
+        sampled_token = log_sampled_var.set(self.sample_rate >= 1 or random.random() < self.sample_rate)
+        status_code = 500
+        started = time.perf_counter()
+
+        async def send_wrapper(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+                message.setdefault("headers", [])
+                message["headers"] = list(message["headers"]) + [(b"x-request-id", request_id.encode("latin-1"))]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            if LOG_REQUESTS:
+                request_logger.info(
+                    "request completed",
+                    extra={
+                        "method": scope["method"],
+                        "path": scope["path"],
+                        "status": status_code,
+                        "duration_ms": round((time.perf_counter() - started) * 1000, 2)
+                    }
+                )
+            log_sampled_var.reset(sampled_token)
+            request_id_var.reset(id_token)
@@ -1,58 +1,74 @@
-from fastapi import FastAPI, HTTPException, Depends, Form, File, UploadFile, status, Request
+from fastapi import FastAPI, HTTPException, Depends, Form, File, UploadFile, Query, Header, status, Request
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, StreamingResponse, RedirectResponse, Response
 from fastapi.exceptions import RequestValidationError
-from sqlalchemy.orm import Session
+from starlette.background import BackgroundTask
+from sqlalchemy import select, func, or_, and_
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import contains_eager
+from contextlib import asynccontextmanager
 from datetime import datetime, timedelta
 import os
+import time
 from pathlib import Path
 from typing import List, Optional
 from jose import jwt
-from passlib.context import CryptContext
-from passlib.hash import bcrypt
 import asyncio
-from PIL import Image
-import io
+import anyio
+import mimetypes
 from dotenv import load_dotenv
-import json  # Added missing import
+import orjson
+import logging
 
-from database import get_db, engine, SessionLocal
-from models import Base, User, Subject, ChatSession, Message, UploadedImage
+from database import get_db, get_pool_status, prewarm_pool, upgrade_schema, AsyncSessionLocal, DB_AUTO_MIGRATE
+from models import User, Subject, ChatSession, Message, UploadedImage
 from schemas import (
     UserCreate, UserResponse, LoginRequest, Token, SubjectResponse, 
     ChatSessionCreate, ChatSessionResponse, MessageResponse
 )
-from ai_service import AIService
+from ai_service import AIService, AI_FALLBACK_MESSAGE
+from user_cache import user_cache
+from password_hasher import password_hasher
+from image_processing import preprocess_image_async
+from upload_spool import UploadSpool, public_image_url
+from context_builder import ConversationContextBuilder
+from admission import ai_admission, AdmissionRejected
+from idempotency import idempotency_store, request_fingerprint, IdempotencyConflict, IDEMPOTENCY_MAX_KEY_LENGTH
+from metrics import MetricsMiddleware, register_status_collector, render_metrics
+from logging_config import RequestContextMiddleware, setup_logging, shutdown_logging, get_logging_status
+from tracing import TracingMiddleware, setup_tracing, shutdown_tracing, tracer
 from cloudinary_service import CloudinaryService
+from http_cache import make_etag, etag_matches, cache_headers, not_modified
+from subject_catalog import subject_catalog
 
 # Load environment variables
 load_dotenv()
 
+# 구조화 로그 (큐 기반, 출력은 별도 스레드에서)
+setup_logging()
+logger = logging.getLogger(__name__)
+
+# 요청 추적 (TRACING_EXPORTER=none이면 no-op)
+setup_tracing()
+
 # JWT 설정
 SECRET_KEY = os.getenv("SECRET_KEY", "your-secret-key-here")
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 30
 
-# Password hashing
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
-
-def verify_password(plain_password, hashed_password):
-    return pwd_context.verify(plain_password, hashed_password)
-
-def get_password_hash(password):
-    hashed = pwd_context.hash(password)
-    # Ensure it's a string, not bytes
-    if isinstance(hashed, bytes):
-        return hashed.decode('utf-8')
-    return hashed
-
-def authenticate_user(db: Session, email: str, password: str):
-    user = db.query(User).filter(User.email == email).first()
+async def authenticate_user(db: AsyncSession, email: str, password: str):
+    user = await db.scalar(select(User).where(User.email == email))
     if not user:
         return False
-    if not verify_password(password, user.hashed_password):
+    # bcrypt는 워커 풀에서 실행 (이벤트 루프 블로킹 방지)
+    valid, new_hash = await password_hasher.verify_and_update(password, user.hashed_password)
+    if not valid:
         return False
+    if new_hash:
+        # 비용(cost) 설정이 바뀐 경우 로그인 시 재해싱
+        user.hashed_password = new_hash
+        await db.commit()
     return user
 
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
@@ -68,116 +84,73 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
         encoded_jwt = encoded_jwt.decode('utf-8')
     return encoded_jwt
 
-# 데이터베이스 마이그레이션 실행
-def run_migrations():
-    """애플리케이션 시작 시 필요한 마이그레이션 실행"""
-    try:
-        from sqlalchemy import text
-        with SessionLocal() as db:
-            # messages 테이블에 image_path 컬럼 존재 여부 확인 후 추가
-            try:
-                # 컬럼 존재 여부 확인
-                result = db.execute(text("""
-                    SELECT column_name 
-                    FROM information_schema.columns 
-                    WHERE table_name = 'messages' AND column_name = 'image_path'
-                """))
-                column_exists = result.fetchone() is not None
-                
-                if not column_exists:
-                    db.execute(text("ALTER TABLE messages ADD COLUMN image_path VARCHAR NULL"))
-                    db.commit()
-                    print("✅ Database migration: image_path column added")
-                else:
-                    print("⚠️ image_path column already exists")
-            except Exception as e:
-                db.rollback()
-                print(f"⚠️ Migration warning: {e}")
-            
-            # uploaded_images 테이블 존재 여부 확인 후 생성
-            try:
-                result = db.execute(text("""
-                    SELECT table_name 
-                    FROM information_schema.tables 
-                    WHERE table_name = 'uploaded_images'
-                """))
-                table_exists = result.fetchone() is not None
-                
-                if not table_exists:
-                    db.execute(text("""
-                        CREATE TABLE uploaded_images (
-                            id SERIAL PRIMARY KEY,
-                            session_id INTEGER NOT NULL,
-                            filename VARCHAR NOT NULL,
-                            filepath VARCHAR NOT NULL,
-                            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-                        )
-                    """))
-                    db.commit()
-                    print("✅ Database migration: uploaded_images table created")
-                else:
-                    print("⚠️ uploaded_images table already exists")
-            except Exception as e:
-                db.rollback()
-                print(f"⚠️ uploaded_images table creation warning: {e}")
-                
-            # 기본 subjects 데이터 확인/추가
-            try:
-                result = db.execute(text("SELECT COUNT(*) FROM subjects"))
-                count = result.scalar()
-                
-                if count == 0:
-                    db.execute(text("""
-                        INSERT INTO subjects (name, color, icon) VALUES
-                        ('수학', '#3B82F6', 'calculator'),
-                        ('영어', '#EF4444', 'globe'),
-                        ('국어', '#10B981', 'book'),
-                        ('사회탐구', '#F97316', 'building'),
-                        ('과학탐구', '#8B5CF6', 'beaker')
-                    """))
-                    db.commit()
-                    print("✅ Default subjects data inserted")
-            except Exception as e:
-                db.rollback()
-                print(f"⚠️ Subjects insertion warning: {e}")
-                
-    except Exception as e:
-        print(f"❌ Migration failed: {e}")
-
-# 데이터베이스 테이블 생성
-Base.metadata.create_all(bind=engine)
-
-# 마이그레이션 실행
-run_migrations()
-
-# Custom JSON encoder to handle bytes objects
-class CustomJSONEncoder(json.JSONEncoder):
-    def default(self, obj):
-        if isinstance(obj, bytes):
-            return obj.decode('utf-8')
-        return super().default(obj)
-
-# Custom JSONResponse that uses our encoder
-class CustomJSONResponse(JSONResponse):
+def orjson_default(obj):
+    """orjson이 직접 처리하지 못하는 타입 (bytes는 UTF-8 문자열로)"""
+    if isinstance(obj, bytes):
+        return obj.decode('utf-8')
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+# orjson 기반 JSON 응답 (datetime/UUID 등은 orjson이 C 수준에서 직렬화)
+class FastJSONResponse(JSONResponse):
     def render(self, content) -> bytes:
-        return json.dumps(
-            content,
-            ensure_ascii=False,
-            allow_nan=False,
-            indent=None,
-            separators=(",", ":"),
-            cls=CustomJSONEncoder,
-        ).encode("utf-8")
+        return orjson.dumps(content, default=orjson_default, option=orjson.OPT_NON_STR_KEYS)
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """시작: (로컬 SQLite만) 마이그레이션, 업로드 워커 시작, DB 풀 예열, AI 프로바이더 백그라운드 초기화
+
+    운영 DB 마이그레이션은 릴리스 단계의 `alembic upgrade head`에서 한 번만 실행
+    """
+    started = time.perf_counter()
+    loop = asyncio.get_running_loop()
+    if DB_AUTO_MIGRATE:
+        await loop.run_in_executor(None, upgrade_schema)
+    await upload_spool.start()
+    prewarmed = await prewarm_pool()
+
+    # 기다리지 않음: 첫 AI 요청은 ensure_provider()로 이 초기화를 (이벤트 루프를 막지 않고) 기다림
+    ai_warm_up = ai_service.start_warm_up()
+    logger.info(
+        "startup complete",
+        extra={"duration_ms": round((time.perf_counter() - started) * 1000, 2), "db_connections_prewarmed": prewarmed}
+    )
+    try:
+        yield
+    finally:
+        await upload_spool.stop()
+        await asyncio.gather(ai_warm_up, return_exceptions=True)
+        ai_service.shutdown()
+        password_hasher.shutdown()
+        shutdown_tracing()
+        shutdown_logging()
 
 # FastAPI 앱 생성
-app = FastAPI(title="AISSAM API", version="1.0.0", default_response_class=CustomJSONResponse)
+app = FastAPI(
+    title="AISSAM API",
+    version="1.0.0",
+    default_response_class=FastJSONResponse,
+    lifespan=lifespan
+)
 
-# AI 서비스 초기화
+# AI 서비스 (LLM 프로바이더는 시작 후 백그라운드에서 또는 첫 호출 시 생성)
 ai_service = AIService()
 
 # Cloudinary 서비스 초기화
 cloudinary_service = CloudinaryService()
 
+# 대화 컨텍스트 빌더 (토큰 예산 + 누적 요약)
+context_builder = ConversationContextBuilder(ai_service, AsyncSessionLocal, admission=ai_admission)
+
+# 이미지 업로드 스풀 (백그라운드 Cloudinary 업로드)
+upload_spool = UploadSpool(cloudinary_service, AsyncSessionLocal)
+
+# /metrics에 노출할 서비스 상태 (스크레이프 시점에 읽음)
+register_status_collector("aissam_db_pool", get_pool_status, "Database connection pool")
+register_status_collector("aissam_ai_admission", ai_admission.get_status, "AI generation admission control")
+register_status_collector("aissam_ai_breaker", ai_service.breaker.get_status, "AI provider circuit breaker")
+register_status_collector("aissam_idempotency", idempotency_store.get_status, "Idempotency-Key store")
+register_status_collector("aissam_logging", get_logging_status, "Log queue")
+
 # CORS 설정
 FRONTEND_URL = os.getenv("FRONTEND_URL", "http://localhost:5173")
 
@@ -197,21 +170,22 @@ app.add_middleware(
     expose_headers=["*"]
 )
 
+# 라우트별 지연 시간/동시 요청/요청당 쿼리 수 측정
+app.add_middleware(MetricsMiddleware, fastapi_app=app)
+
+# 요청별 트레이스 (DB/Cloudinary/Gemini span의 부모)
+app.add_middleware(TracingMiddleware, fastapi_app=app)
+
+# 요청 ID(X-Request-ID) 부여 및 로그 샘플링 - 가장 바깥에서 실행
+app.add_middleware(RequestContextMiddleware)
+
 # Initialize services
 
 oauth2_scheme = HTTPBearer()
 
-# Dependency to get database session
-def get_db():
-    db = SessionLocal()
-    try:
-        yield db
-    finally:
-        db.close()
-
 @app.exception_handler(RequestValidationError)
 async def validation_error_handler(request: Request, exc: RequestValidationError):
-    return CustomJSONResponse(
+    return FastJSONResponse(
         status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
         content={"detail": exc.errors(), "body": exc.body},
     )
@@ -220,37 +194,55 @@ async def validation_error_handler(request: Request, exc: RequestValidationError
 async def root():
     return {"message": "AISSAM API is running"}
 
+@app.get("/metrics", include_in_schema=False)
+async def metrics():
+    """Prometheus 스크레이프 엔드포인트"""
+    body, content_type = render_metrics()
+    return Response(content=body, media_type=content_type)
+
+@app.get("/health/db-pool")
+async def db_pool_status():
+    """DB 커넥션 풀 점유/대기 현황"""
+    return get_pool_status()
+
+@app.get("/health/ai-provider")
+async def ai_provider_status():
+    """Gemini 서킷 브레이커 상태 및 재시도 횟수"""
+    return {**ai_service.breaker.get_status(), "retries": ai_service.retries}
+
+@app.get("/health/ai-admission")
+async def ai_admission_status():
+    """AI 생성 동시 실행/대기열 현황"""
+    return ai_admission.get_status()
+
 @app.post("/register", response_model=UserResponse)
-async def register_user(user: UserCreate, db: Session = Depends(get_db)):
+async def register_user(user: UserCreate, db: AsyncSession = Depends(get_db)):
     try:
-        # 받은 데이터 로깅
-        print(f"Registration attempt: email={user.email}, name='{user.name}', grade='{user.grade}'")
-        
-        # Validation 확인
+        # Validation 확인 (이메일은 로그 출력 시 마스킹됨)
         if not user.name or not user.name.strip():
-            print("Error: Name is empty or whitespace")
+            logger.info("registration rejected", extra={"reason": "empty_name"})
             raise HTTPException(status_code=400, detail="이름을 입력해주세요.")
         
         if not user.email or not user.email.strip():
-            print("Error: Email is empty or whitespace")
+            logger.info("registration rejected", extra={"reason": "empty_email"})
             raise HTTPException(status_code=400, detail="이메일을 입력해주세요.")
             
         if not user.password or len(user.password) < 6:
-            print("Error: Password too short")
+            logger.info("registration rejected", extra={"reason": "short_password"})
             raise HTTPException(status_code=400, detail="비밀번호는 최소 6자 이상이어야 합니다.")
             
         if not user.grade or user.grade not in ['고1', '고2', '고3']:
-            print(f"Error: Invalid grade '{user.grade}'")
+            logger.info("registration rejected", extra={"reason": "invalid_grade", "grade": user.grade})
             raise HTTPException(status_code=400, detail="올바른 학년을 선택해주세요.")
         
         # Check if user already exists
-        db_user = db.query(User).filter(User.email == user.email).first()
+        db_user = await db.scalar(select(User).where(User.email == user.email))
         if db_user:
-            print(f"Error: Email {user.email} already exists")
+            logger.info("registration rejected", extra={"reason": "email_exists", "email": user.email})
             raise HTTPException(status_code=400, detail="Email already registered")
         
         # Create new user
-        hashed_password = get_password_hash(user.password)
+        hashed_password = await password_hasher.hash(user.password)
         db_user = User(
             email=user.email,
             name=user.name,
@@ -258,10 +250,10 @@ async def register_user(user: UserCreate, db: Session = Depends(get_db)):
             grade=user.grade
         )
         db.add(db_user)
-        db.commit()
-        db.refresh(db_user)
+        await db.commit()
+        await db.refresh(db_user)
         
-        print(f"User successfully created: {user.email}")
+        logger.info("user registered", extra={"user_id": db_user.id, "grade": db_user.grade})
         return UserResponse(
             id=db_user.id,
             email=db_user.email,
@@ -271,15 +263,15 @@ async def register_user(user: UserCreate, db: Session = Depends(get_db)):
     except HTTPException:
         # Re-raise HTTP exceptions
         raise
-    except Exception as e:
+    except Exception:
         # Log the error and return a generic message
-        print(f"Registration error: {e}")
-        db.rollback()
+        logger.exception("registration failed")
+        await db.rollback()
         raise HTTPException(status_code=500, detail="Registration failed. Please try again.")
 
 @app.post("/token", response_model=Token)
-async def login(username: str = Form(...), password: str = Form(...), db: Session = Depends(get_db)):
-    user = authenticate_user(db, username, password)
+async def login(username: str = Form(...), password: str = Form(...), db: AsyncSession = Depends(get_db)):
+    user = await authenticate_user(db, username, password)
     if not user:
         raise HTTPException(
             status_code=401,
@@ -292,73 +284,77 @@ async def login(username: str = Form(...), password: str = Form(...), db: Sessio
     )
     return {"access_token": access_token, "token_type": "bearer"}
 
-def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(oauth2_scheme), db: Session = Depends(get_db)):
-    """현재 인증된 사용자 반환"""
+def get_current_user_id(credentials: HTTPAuthorizationCredentials = Depends(oauth2_scheme)) -> int:
+    """JWT 클레임만으로 사용자 id 반환 (DB 조회 없음)"""
     try:
         token = credentials.credentials
         payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
         user_id_str: str = payload.get("sub")
         if user_id_str is None:
             raise HTTPException(status_code=401, detail="Invalid authentication credentials")
-        user_id = int(user_id_str)
+        return int(user_id_str)
     except (jwt.JWTError, jwt.ExpiredSignatureError, jwt.JWTClaimsError):
         raise HTTPException(status_code=401, detail="Invalid authentication credentials")
+
+async def get_current_user(
+    user_id: int = Depends(get_current_user_id),
+    db: AsyncSession = Depends(get_db)
+) -> UserResponse:
+    """현재 인증된 사용자 반환 (캐시 우선, 없으면 DB 조회)"""
+    principal = user_cache.get(user_id)
+    if principal is not None:
+        return principal
     
-    user = db.query(User).filter(User.id == user_id).first()
+    user = await db.get(User, user_id)
     if user is None:
         raise HTTPException(status_code=401, detail="User not found")
-    return user
+    
+    principal = UserResponse(
+        id=user.id,
+        email=user.email,
+        name=user.name,
+        grade=user.grade
+    )
+    user_cache.set(principal)
+    return principal
 
 @app.get("/me", response_model=UserResponse)
-async def get_current_user_info(current_user: User = Depends(get_current_user)):
-    return UserResponse(
-        id=current_user.id,
-        email=current_user.email,
-        name=current_user.name,
-        grade=current_user.grade
-    )
+async def get_current_user_info(current_user: UserResponse = Depends(get_current_user)):
+    return current_user
 
 @app.get("/subjects", response_model=List[SubjectResponse])
-async def get_subjects(db: Session = Depends(get_db)):
-    subjects = db.query(Subject).all()
-    if not subjects:
-        # Initialize default subjects
-        default_subjects = [
-            Subject(name="수학", color="#3B82F6", icon="calculator"),
-            Subject(name="영어", color="#EF4444", icon="globe"),
-            Subject(name="국어", color="#10B981", icon="book"),
-            Subject(name="사회탐구", color="#F97316", icon="building"),
-            Subject(name="과학탐구", color="#8B5CF6", icon="beaker")
-        ]
-        for subject in default_subjects:
-            db.add(subject)
-        db.commit()
-        subjects = default_subjects
-    
-    return [SubjectResponse(
-        id=subject.id,
-        name=subject.name,
-        color=subject.color,
-        icon=subject.icon
-    ) for subject in subjects]
+async def get_subjects(
+    if_none_match: Optional[str] = Header(None),
+    db: AsyncSession = Depends(get_db)
+):
+    # 과목 목록은 마이그레이션(0001)에서 시드되고 거의 바뀌지 않으므로 프로세스 내 캐시에서 제공
+    catalog = await subject_catalog.get(db)
+    if etag_matches(if_none_match, catalog.etag):
+        return not_modified(catalog.etag, private=False)
+    return Response(
+        content=catalog.body,
+        media_type="application/json",
+        headers=cache_headers(catalog.etag, private=False)
+    )
 
 @app.post("/chat-sessions", response_model=ChatSessionResponse)
 async def create_chat_session(
     session_data: ChatSessionCreate,
-    current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    current_user: UserResponse = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db)
 ):
+    # 사용자 소유 행을 새로 만들므로 클레임만이 아니라 사용자 존재까지 확인 (삭제된 사용자는 401)
     db_session = ChatSession(
         user_id=current_user.id,
         subject_id=session_data.subject_id,
         title=session_data.title or f"{datetime.now().strftime('%Y-%m-%d %H:%M')} 질문"
     )
     db.add(db_session)
-    db.commit()
-    db.refresh(db_session)
+    await db.commit()
+    await db.refresh(db_session)
     
     # Get subject info for response
-    subject = db.query(Subject).filter(Subject.id == db_session.subject_id).first()
+    subject = await db.get(Subject, db_session.subject_id)
     
     return ChatSessionResponse(
         id=db_session.id,
@@ -375,56 +371,109 @@ async def create_chat_session(
         message_count=0  # New session starts with 0 messages
     )
 
+SESSION_PAGE_DEFAULT = 50
+SESSION_PAGE_MAX = 200
+
 @app.get("/chat-sessions", response_model=List[ChatSessionResponse])
 async def get_chat_sessions(
-    current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    subject_id: Optional[int] = Query(None, description="과목별 세션만 조회"),
+    limit: int = Query(SESSION_PAGE_DEFAULT, ge=1, le=SESSION_PAGE_MAX),
+    cursor: Optional[int] = Query(None, description="이 세션보다 이전 세션만 조회 (keyset 페이지네이션)"),
+    if_none_match: Optional[str] = Header(None),
+    current_user_id: int = Depends(get_current_user_id),
+    db: AsyncSession = Depends(get_db)
 ):
-    # Get sessions with message count and subject info, only sessions that have messages
-    sessions = db.query(ChatSession).filter(
-        ChatSession.user_id == current_user.id
-    ).join(Subject).all()
-    
-    # Filter sessions that have at least one message and include message count
-    session_responses = []
-    for session in sessions:
-        message_count = db.query(Message).filter(Message.session_id == session.id).count()
-        if message_count > 0:  # Only include sessions with messages
-            session_responses.append(ChatSessionResponse(
-                id=session.id,
-                user_id=session.user_id,
-                subject_id=session.subject_id,
-                title=session.title,
-                created_at=session.created_at,
-                subject=SubjectResponse(
-                    id=session.subject.id,
-                    name=session.subject.name,
-                    color=session.subject.color,
-                    icon=session.subject.icon
-                ),
-                message_count=message_count
-            ))
-    
-    # Sort by creation date, most recent first
-    session_responses.sort(key=lambda x: x.created_at, reverse=True)
-    return session_responses
+    # 메시지 추가 시 ETag가 바뀌도록 count·max(id)로 스탬프 (과목 정보는 카탈로그 ETag)
+    stamp_query = select(
+        func.count(Message.id), func.max(Message.id)
+    ).join(
+        ChatSession, Message.session_id == ChatSession.id
+    ).where(
+        ChatSession.user_id == current_user_id
+    )
+    if subject_id is not None:
+        stamp_query = stamp_query.where(ChatSession.subject_id == subject_id)
+    stamp = (await db.execute(stamp_query)).one()
+    catalog = await subject_catalog.get(db)
+    etag = make_etag("sessions", current_user_id, *stamp, catalog.etag, subject_id, limit, cursor)
+    if etag_matches(if_none_match, etag):
+        return not_modified(etag)
+    
+    # 세션·과목·메시지 수를 한 쿼리로 (메시지 없는 세션은 inner join으로 제외, ORM 엔티티 없이 컬럼만)
+    message_count = func.count(Message.id).label("message_count")
+    query = select(
+        ChatSession.id,
+        ChatSession.user_id,
+        ChatSession.subject_id,
+        ChatSession.title,
+        ChatSession.created_at,
+        Subject.name,
+        Subject.color,
+        Subject.icon,
+        message_count
+    ).join(
+        Subject, ChatSession.subject
+    ).join(
+        Message, Message.session_id == ChatSession.id
+    ).where(
+        ChatSession.user_id == current_user_id
+    )
+    
+    if subject_id is not None:
+        query = query.where(ChatSession.subject_id == subject_id)
+    
+    if cursor is not None:
+        cursor_created_at = await db.scalar(select(ChatSession.created_at).where(
+            ChatSession.id == cursor,
+            ChatSession.user_id == current_user_id
+        ))
+        if cursor_created_at is None:
+            raise HTTPException(status_code=400, detail="Invalid cursor")
+        # (created_at, id) < (cursor.created_at, cursor)
+        query = query.where(or_(
+            ChatSession.created_at < cursor_created_at,
+            and_(ChatSession.created_at == cursor_created_at, ChatSession.id < cursor)
+        ))
+    
+    rows = (await db.execute(query.group_by(
+        ChatSession.id, Subject.id
+    ).order_by(
+        ChatSession.created_at.desc(), ChatSession.id.desc()
+    ).limit(limit))).all()
+    
+    # ChatSessionResponse 형태 그대로 바로 직렬화 (Pydantic 객체 생성 없이)
+    return FastJSONResponse([{
+        "id": session_id,
+        "user_id": user_id,
+        "subject_id": row_subject_id,
+        "subject": {"id": row_subject_id, "name": name, "color": color, "icon": icon},
+        "title": title,
+        "message_count": count,
+        "created_at": created_at
+    } for session_id, user_id, row_subject_id, title, created_at, name, color, icon, count in rows], headers=cache_headers(etag))
 
 @app.get("/chat-sessions/{session_id}", response_model=ChatSessionResponse)
 async def get_chat_session(
     session_id: int,
-    current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    current_user_id: int = Depends(get_current_user_id),
+    db: AsyncSession = Depends(get_db)
 ):
-    session = db.query(ChatSession).filter(
+    session = await db.scalar(select(ChatSession).join(
+        Subject, ChatSession.subject
+    ).where(
         ChatSession.id == session_id,
-        ChatSession.user_id == current_user.id
-    ).join(Subject).first()
+        ChatSession.user_id == current_user_id
+    ).options(
+        contains_eager(ChatSession.subject)
+    ))
     
     if not session:
         raise HTTPException(status_code=404, detail="Chat session not found")
     
     # Get message count for this session
-    message_count = db.query(Message).filter(Message.session_id == session.id).count()
+    message_count = await db.scalar(
+        select(func.count(Message.id)).where(Message.session_id == session.id)
+    )
     
     return ChatSessionResponse(
         id=session.id,
@@ -441,162 +490,430 @@ async def get_chat_session(
         message_count=message_count
     )
 
-@app.post("/chat-sessions/{session_id}/messages")
-async def send_message_with_image(
+def message_payload(message: Message) -> dict:
+    """Message 행을 응답용 dict로 변환"""
+    return {
+        "id": message.id,
+        "session_id": message.session_id,
+        "content": message.content,
+        "is_user": message.is_user,
+        "image_path": public_image_url(message.image_path),
+        "image_url": public_image_url(message.image_path),
+        "created_at": message.created_at.isoformat()
+    }
+
+async def prepare_message(
     session_id: int,
-    content: str = Form(...),
-    image: UploadFile = File(None),
-    current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    content: str,
+    image: Optional[UploadFile],
+    current_user_id: int,
+    db: AsyncSession
 ):
-    """이미지와 함께 메시지 전송"""
-    import os
-    from pathlib import Path
+    """세션 확인, 이미지 스풀 저장, 사용자 메시지 저장 후 AI 호출에 필요한 컨텍스트 반환
     
-    print(f"🔍 Message endpoint called:")
-    print(f"   session_id: {session_id}")
-    print(f"   content: '{content}'")
-    print(f"   image: {image.filename if image else 'None'}")
-    print(f"   user: {current_user.email}")
+    이미지는 로컬 스풀에 저장되고 Cloudinary 업로드는 백그라운드 워커가 처리
+    """
+    # 메시지 본문은 길이만 기록 (LOG_REDACT)
+    logger.debug(
+        "message received",
+        extra={
+            "session_id": session_id,
+            "user_id": current_user_id,
+            "content": content,
+            "has_image": image is not None
+        }
+    )
     
     # 세션 확인
-    session = db.query(ChatSession).filter(
-        ChatSession.id == session_id,
-        ChatSession.user_id == current_user.id
-    ).first()
+    with tracer.start_as_current_span("message.load_session"):
+        session = await db.scalar(select(ChatSession).where(
+            ChatSession.id == session_id,
+            ChatSession.user_id == current_user_id
+        ))
     
     if not session:
-        print(f"❌ Session {session_id} not found for user {current_user.id}")
+        logger.info("chat session not found", extra={"session_id": session_id, "user_id": current_user_id})
         raise HTTPException(status_code=404, detail="Chat session not found")
     
-    image_path = None
+    image_ref = None
+    pil_image = None
     
     # 이미지 업로드 처리
     if image:
-        # 이미지 데이터 읽기
-        image_data = await image.read()
+        # 이미지 데이터 한 번만 읽고 디코딩/회전/축소/JPEG 변환 (이벤트 루프 밖에서)
+        with tracer.start_as_current_span("message.read_image"):
+            image_data = await image.read()
+        processed = await preprocess_image_async(image_data, image.filename)
+        if processed:
+            upload_data, upload_filename = processed.data, processed.filename
+            pil_image = processed.image
+        else:
+            upload_data, upload_filename = image_data, image.filename
         
-        # Cloudinary에 이미지 업로드
-        upload_result = cloudinary_service.upload_image(
-            file_data=image_data,
-            filename=image.filename
+        # 로컬 스풀에 저장 (Cloudinary 업로드는 백그라운드, 실패 시 재시도)
+        with tracer.start_as_current_span("message.spool_image", attributes={"image.bytes": len(upload_data)}):
+            image_ref = await upload_spool.spool(upload_data, upload_filename, session_id)
+    
+    # 사용자 메시지 저장 (image_path는 업로드 완료 시 워커가 Cloudinary URL로 교체)
+    with tracer.start_as_current_span("message.save_user_message"):
+        user_message = Message(
+            session_id=session_id,
+            content=content,
+            is_user=True,
+            image_path=image_ref
         )
-        
-        if upload_result["success"]:
-            image_path = upload_result["url"]
-            print(f"✅ Image uploaded to Cloudinary: {image_path}")
-        else:
-            print(f"❌ Cloudinary upload failed: {upload_result.get('error')}")
-            image_path = None
-    
-    # 사용자 메시지 저장
-    user_message = Message(
-        session_id=session_id,
-        content=content,
-        is_user=True,
-        image_path=image_path
-    )
-    db.add(user_message)
-    db.commit()
-    db.refresh(user_message)
+        db.add(user_message)
+        try:
+            await db.commit()
+        except Exception:
+            # 메시지가 저장되지 않았으므로 스풀 항목도 제거 (재시작까지 남지 않도록)
+            if image_ref:
+                await upload_spool.discard(image_ref)
+            raise
+        await db.refresh(user_message)
     
-    try:
+    if image_ref:
+        upload_spool.enqueue(image_ref)
+    
+    with tracer.start_as_current_span("message.build_context") as span:
         # 과목 정보 가져오기
-        subject = db.query(Subject).filter(Subject.id == session.subject_id).first()
+        subject = await db.get(Subject, session.subject_id)
         subject_name = subject.name if subject else "수학"
         
-        # 대화 히스토리 가져오기 (최근 10개 메시지)
-        conversation_history = []
-        recent_messages = db.query(Message).filter(
-            Message.session_id == session_id
-        ).order_by(Message.created_at.desc()).limit(10).all()
-        
-        for msg in reversed(recent_messages):  # 시간순으로 정렬
-            conversation_history.append({
-                'content': msg.content,
-                'is_user': msg.is_user
-            })
-        
-        # 이미지가 있는 경우 PIL Image 객체로 변환
-        pil_image = None
-        if image:
-            try:
-                # 이미지 데이터를 다시 읽어서 PIL Image로 변환
-                image.file.seek(0)  # 파일 포인터를 처음으로 이동
-                image_data_for_pil = await image.read()
-                pil_image = Image.open(io.BytesIO(image_data_for_pil))
-            except Exception as e:
-                print(f"Warning: Could not load image for AI analysis: {e}")
-                pil_image = None
-        
-        # AI 응답 생성
-        ai_response_content = await ai_service.generate_response(
-            subject_name=subject_name,
-            message_text=content,
-            conversation_history=conversation_history,
-            image=pil_image
+        # 대화 컨텍스트: 누적 요약 + 토큰 예산 내 최근 메시지 (현재 질문 제외)
+        context = await context_builder.build(db, session, user_message.id)
+        span.set_attribute("context.history_messages", len(context.history))
+        span.set_attribute("context.has_summary", bool(context.summary))
+        # 읽기 트랜잭션 종료: AI 생성 동안 커넥션을 붙잡지 않도록 풀에 반환
+        await db.commit()
+
+    return user_message, subject_name, context, pil_image
+
+async def save_ai_message(session_id: int, content: str, db: AsyncSession) -> Message:
+    """AI 응답 메시지 저장"""
+    with tracer.start_as_current_span("message.save_ai_message"):
+        ai_message = Message(
+            session_id=session_id,
+            content=content,
+            is_user=False
+        )
+        db.add(ai_message)
+        await db.commit()
+        await db.refresh(ai_message)
+        return ai_message
+
+async def acquire_ai_slot(current_user_id: int):
+    """AI 생성 슬롯 확보 (대기열이 가득 차면 429)"""
+    try:
+        with tracer.start_as_current_span("ai.admission"):
+            return await ai_admission.acquire(current_user_id)
+    except AdmissionRejected as e:
+        logger.warning(
+            "AI admission rejected",
+            extra={"user_id": current_user_id, "reason": e.reason, "retry_after": e.retry_after}
+        )
+        raise HTTPException(
+            status_code=429,
+            detail="질문이 많아 잠시 후 다시 시도해 주세요.",
+            headers={"Retry-After": str(e.retry_after)}
+        )
+
+def idempotency_scope(
+    idempotency_key: str,
+    session_id: int,
+    content: str,
+    image: Optional[UploadFile],
+    current_user_id: int
+):
+    """Idempotency-Key 저장소 키와 요청 지문 (일반/스트리밍 전송이 같은 키 공간을 공유)"""
+    if len(idempotency_key) > IDEMPOTENCY_MAX_KEY_LENGTH:
+        raise HTTPException(status_code=400, detail="Idempotency-Key is too long")
+    key = ("message", current_user_id, session_id, idempotency_key)
+    fingerprint = request_fingerprint(
+        content,
+        image.filename if image else None,
+        image.size if image else None
+    )
+    return key, fingerprint
+
+def idempotency_conflict(e: IdempotencyConflict) -> HTTPException:
+    return HTTPException(status_code=422, detail=str(e))
+
+@app.post("/chat-sessions/{session_id}/messages")
+async def send_message_with_image(
+    session_id: int,
+    content: str = Form(...),
+    image: UploadFile = File(None),
+    idempotency_key: Optional[str] = Header(None, alias="Idempotency-Key"),
+    current_user_id: int = Depends(get_current_user_id),
+    db: AsyncSession = Depends(get_db)
+):
+    """이미지와 함께 메시지 전송
+    
+    Idempotency-Key가 있으면 진행 중인 중복 요청은 같은 결과를 기다리고,
+    완료된 중복 요청은 저장된 응답을 그대로 돌려받음
+    """
+    if not idempotency_key:
+        return await send_message(session_id, content, image, current_user_id, db)
+    
+    key, fingerprint = idempotency_scope(idempotency_key, session_id, content, image, current_user_id)
+    try:
+        return await idempotency_store.run(
+            key,
+            fingerprint,
+            lambda: send_message(session_id, content, image, current_user_id, db)
+        )
+    except IdempotencyConflict as e:
+        raise idempotency_conflict(e)
+
+async def send_message(
+    session_id: int,
+    content: str,
+    image: Optional[UploadFile],
+    current_user_id: int,
+    db: AsyncSession
+) -> dict:
+    # 메시지를 저장하기 전에 슬롯을 확보해 거절된 요청이 질문만 남기지 않도록 함
+    ticket = await acquire_ai_slot(current_user_id)
+    try:
+        user_message, subject_name, context, pil_image = await prepare_message(
+            session_id, content, image, current_user_id, db
         )
         
-    except Exception as e:
-        print(f"AI response generation error: {e}")
-        ai_response_content = "죄송합니다. 일시적인 오류가 발생했습니다. 다시 시도해 주세요."
+        try:
+            # AI 응답 생성
+            ai_response_content = await ai_service.generate_response(
+                subject_name=subject_name,
+                message_text=content,
+                conversation_history=context.history,
+                image=pil_image,
+                summary=context.summary
+            )
+            
+        except Exception:
+            logger.exception("AI response generation failed", extra={"session_id": session_id})
+            ai_response_content = AI_FALLBACK_MESSAGE
+    finally:
+        ticket.release()
     
     # AI 응답 메시지 저장
-    ai_message = Message(
-        session_id=session_id,
-        content=ai_response_content,
-        is_user=False
-    )
-    db.add(ai_message)
-    db.commit()
-    db.refresh(ai_message)
+    ai_message = await save_ai_message(session_id, ai_response_content, db)
+    context_builder.schedule_summary(session_id, context)
     
     return {
-        "user_message": {
-            "id": user_message.id,
-            "session_id": user_message.session_id,
-            "content": user_message.content,
-            "is_user": user_message.is_user,
-            "image_path": user_message.image_path,
-            "image_url": user_message.image_path,
-            "created_at": user_message.created_at.isoformat()
-        },
-        "ai_response": {
-            "id": ai_message.id,
-            "session_id": ai_message.session_id,
-            "content": ai_message.content,
-            "is_user": ai_message.is_user,
-            "image_path": None,
-            "image_url": None,
-            "created_at": ai_message.created_at.isoformat()
-        }
+        "user_message": message_payload(user_message),
+        "ai_response": message_payload(ai_message)
     }
 
+def sse_event(event: str, data: dict) -> str:
+    """Server-Sent Events 프레임 생성"""
+    return f"event: {event}\ndata: {orjson.dumps(data).decode()}\n\n"
+
+async def replay_message_stream(state: str, value):
+    """중복 스트리밍 요청: 첫 요청의 결과(완료 또는 대기)를 user_message → done 이벤트로 전달"""
+    if state == "wait":
+        try:
+            value = await asyncio.shield(value)
+        except HTTPException as e:
+            yield sse_event("error", {"detail": e.detail})
+            return
+        except asyncio.CancelledError:
+            if not value.cancelled():
+                raise
+            yield sse_event("error", {"detail": AI_FALLBACK_MESSAGE})
+            return
+        except Exception:
+            yield sse_event("error", {"detail": AI_FALLBACK_MESSAGE})
+            return
+    yield sse_event("user_message", value["user_message"])
+    yield sse_event("done", {"ai_response": value["ai_response"]})
+
+@app.post("/chat-sessions/{session_id}/messages/stream")
+async def stream_message_with_image(
+    session_id: int,
+    content: str = Form(...),
+    image: UploadFile = File(None),
+    idempotency_key: Optional[str] = Header(None, alias="Idempotency-Key"),
+    current_user_id: int = Depends(get_current_user_id),
+    db: AsyncSession = Depends(get_db)
+):
+    """이미지와 함께 메시지 전송 (SSE로 AI 응답을 스트리밍)
+    
+    이벤트 순서: user_message → chunk* → done (실패 시 error → done)
+    같은 Idempotency-Key의 중복 요청은 chunk 없이 user_message → done만 받음
+    """
+    key = None
+    lead = None
+    if idempotency_key:
+        key, fingerprint = idempotency_scope(idempotency_key, session_id, content, image, current_user_id)
+        try:
+            state, value = idempotency_store.begin(key, fingerprint)
+        except IdempotencyConflict as e:
+            raise idempotency_conflict(e)
+        if state != "lead":
+            return StreamingResponse(
+                replay_message_stream(state, value),
+                media_type="text/event-stream",
+                headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+            )
+        lead = value
+    
+    ticket = None
+    try:
+        ticket = await acquire_ai_slot(current_user_id)
+        user_message, subject_name, context, pil_image = await prepare_message(
+            session_id, content, image, current_user_id, db
+        )
+    except BaseException as e:
+        if ticket is not None:
+            ticket.release()
+        if key is not None:
+            idempotency_store.fail(key, e, owner=lead)
+        raise
+    user_payload = message_payload(user_message)
+    
+    async def event_stream():
+        chunks = []
+        ai_message = None
+        yield sse_event("user_message", user_payload)
+        try:
+            async for text in ai_service.stream_response(
+                subject_name=subject_name,
+                message_text=content,
+                conversation_history=context.history,
+                image=pil_image,
+                summary=context.summary
+            ):
+                chunks.append(text)
+                yield sse_event("chunk", {"text": text})
+        except Exception:
+            logger.exception("AI response streaming failed", extra={"session_id": session_id})
+            yield sse_event("error", {"detail": AI_FALLBACK_MESSAGE})
+        finally:
+            # 스트림이 중단되어도(클라이언트 연결 종료 포함) 받은 부분까지 저장
+            # 연결 종료 시 취소가 전파되므로 저장은 shield 안에서 수행
+            ai_response_content = "".join(chunks).strip() or AI_FALLBACK_MESSAGE
+            with anyio.CancelScope(shield=True):
+                async with AsyncSessionLocal() as stream_db:
+                    ai_message = await save_ai_message(session_id, ai_response_content, stream_db)
+            context_builder.schedule_summary(session_id, context)
+            if key is not None:
+                idempotency_store.complete(key, {
+                    "user_message": user_payload,
+                    "ai_response": message_payload(ai_message)
+                }, owner=lead)
+        
+        yield sse_event("done", {"ai_response": message_payload(ai_message)})
+    
+    stream = event_stream()
+    
+    async def finish_stream():
+        # 연결이 끊겨도 Starlette는 제너레이터를 닫지 않으므로 여기서 닫아 저장/완료(finally)를 바로 실행
+        try:
+            await stream.aclose()
+        finally:
+            ticket.release()
+            if key is not None:
+                # complete()가 실행되지 못한 경우(스트림 시작 전 종료)에만 대기 중인 중복 요청 해제
+                idempotency_store.fail(key, owner=lead)
+    
+    return StreamingResponse(
+        stream,
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+        background=BackgroundTask(finish_stream)
+    )
+
+@app.get("/uploads/pending/{spool_id}")
+async def get_pending_upload(spool_id: str):
+    """Cloudinary 업로드 대기 중인 이미지를 스풀에서 직접 제공 (업로드 완료 후에는 Cloudinary로 리다이렉트)"""
+    path = upload_spool.pending_file(spool_id)
+    if path is not None:
+        try:
+            # 워커가 업로드 후 파일을 지울 수 있으므로 응답 전에 미리 읽어 둠
+            data = await anyio.to_thread.run_sync(path.read_bytes)
+        except FileNotFoundError:
+            data = None
+        if data is not None:
+            media_type = mimetypes.guess_type(upload_spool.pending_filename(spool_id) or "")[0] or "image/jpeg"
+            return Response(content=data, media_type=media_type)
+    url = await anyio.to_thread.run_sync(upload_spool.uploaded_url, spool_id)
+    if url is None:
+        raise HTTPException(status_code=404, detail="Pending image not found")
+    return RedirectResponse(url, status_code=307)
+
+MESSAGE_PAGE_DEFAULT = 50
+MESSAGE_PAGE_MAX = 200
+
 @app.get("/chat-sessions/{session_id}/messages", response_model=List[MessageResponse])
 async def get_messages(
     session_id: int,
-    current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    limit: int = Query(MESSAGE_PAGE_DEFAULT, ge=1, le=MESSAGE_PAGE_MAX),
+    before_id: Optional[int] = Query(None, description="이 메시지보다 이전 메시지만 조회 (keyset 페이지네이션)"),
+    if_none_match: Optional[str] = Header(None),
+    current_user_id: int = Depends(get_current_user_id),
+    db: AsyncSession = Depends(get_db)
 ):
-    # Verify session belongs to user
-    session = db.query(ChatSession).filter(
+    # 소유권 확인 + 메시지 추가/수정 시 ETag가 바뀌도록 version·count·max(id)로 스탬프
+    stamp = (await db.execute(select(
+        ChatSession.version,
+        func.count(Message.id),
+        func.max(Message.id)
+    ).outerjoin(
+        Message, Message.session_id == ChatSession.id
+    ).where(
         ChatSession.id == session_id,
-        ChatSession.user_id == current_user.id
-    ).first()
+        ChatSession.user_id == current_user_id
+    ).group_by(ChatSession.id, ChatSession.version))).one_or_none()
     
-    if not session:
+    if stamp is None:
         raise HTTPException(status_code=404, detail="Chat session not found")
     
-    messages = db.query(Message).filter(Message.session_id == session_id).all()
-    return [MessageResponse(
-        id=message.id,
-        session_id=message.session_id,
-        content=message.content,
-        is_user=message.is_user,
-        image_path=message.image_path,
-        image_url=message.image_path,
-        created_at=message.created_at
-    ) for message in messages]
+    etag = make_etag("messages", session_id, *stamp, limit, before_id)
+    if etag_matches(if_none_match, etag):
+        return not_modified(etag)
+    
+    # ORM 엔티티/Pydantic 모델 없이 컬럼 값을 바로 직렬화
+    query = select(
+        Message.id,
+        Message.session_id,
+        Message.content,
+        Message.is_user,
+        Message.image_path,
+        Message.created_at
+    ).where(Message.session_id == session_id)
+    
+    if before_id is not None:
+        cursor_created_at = await db.scalar(select(Message.created_at).where(
+            Message.id == before_id,
+            Message.session_id == session_id
+        ))
+        if cursor_created_at is None:
+            raise HTTPException(status_code=400, detail="Invalid before_id")
+        # (created_at, id) < (cursor.created_at, before_id)
+        query = query.where(or_(
+            Message.created_at < cursor_created_at,
+            and_(Message.created_at == cursor_created_at, Message.id < before_id)
+        ))
+    
+    # 최신 메시지부터 limit개를 가져온 뒤 시간순으로 반환
+    rows = (await db.execute(query.order_by(
+        Message.created_at.desc(), Message.id.desc()
+    ).limit(limit))).all()
+    
+    payload = []
+    for message_id, message_session_id, content, is_user, image_path, created_at in reversed(rows):
+        image_url = public_image_url(image_path)
+        payload.append({
+            "id": message_id,
+            "session_id": message_session_id,
+            "content": content,
+            "is_user": is_user,
+            "image_path": image_url,
+            "image_url": image_url,
+            "created_at": created_at
+        })
+    return FastJSONResponse(payload, headers=cache_headers(etag))
 
 if __name__ == "__main__":
     uvicorn.run(app, host="0.0.0.0", port=8080)
\ No newline at end of file
@@ -0,0 +1,144 @@
+import time
+from typing import Callable
+
+from prometheus_client import CONTENT_TYPE_LATEST, REGISTRY, Counter, Gauge, Histogram, generate_latest
+from prometheus_client.core import GaugeMetricFamily
+from starlette.routing import Match
+
+from database import QueryCounter, current_query_counter
+
+# Prometheus 메트릭 정의 (GET /metrics로 노출)
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+SIZE_BUCKETS = (100, 300, 1000, 3000, 10000, 30000, 100000)
+BYTES_BUCKETS = (10_000, 50_000, 100_000, 250_000, 500_000, 1_000_000, 2_500_000, 5_000_000)
+
+HTTP_REQUEST_DURATION = Histogram(
+    "aissam_http_request_duration_seconds",
+    "HTTP request latency by route template (streams: until the last byte)",
+    ["method", "route", "status"],
+    buckets=LATENCY_BUCKETS
+)
+HTTP_REQUESTS_IN_FLIGHT = Gauge(
+    "aissam_http_requests_in_flight",
+    "HTTP requests currently being handled",
+    ["method", "route"]
+)
+HTTP_REQUEST_DB_QUERIES = Histogram(
+    "aissam_http_request_db_queries",
+    "SQL statements executed per HTTP request",
+    ["method", "route"],
+    buckets=(0, 1, 2, 3, 5, 8, 13, 21, 34, 55)
+)
+
+AI_REQUEST_DURATION = Histogram(
+    "aissam_ai_request_duration_seconds",
+    "LLM call latency including retries (streams: until the last chunk)",
+    ["operation", "outcome"],
+    buckets=LATENCY_BUCKETS
+)
+AI_TIME_TO_FIRST_CHUNK = Histogram(
+    "aissam_ai_time_to_first_chunk_seconds",
+    "Streaming LLM latency until the first text chunk",
+    buckets=LATENCY_BUCKETS
+)
+AI_RETRIES = Counter("aissam_ai_retries_total", "LLM call retries after transient errors")
+AI_TIMEOUTS = Counter("aissam_ai_timeouts_total", "LLM calls that hit AI_TIMEOUT_SECONDS")
+AI_PROMPT_CHARS = Histogram(
+    "aissam_ai_prompt_chars",
+    "Prompt size sent to the LLM (characters)",
+    ["operation"],
+    buckets=SIZE_BUCKETS
+)
+AI_RESPONSE_CHARS = Histogram(
+    "aissam_ai_response_chars",
+    "LLM response size (characters)",
+    ["operation"],
+    buckets=SIZE_BUCKETS
+)
+
+CLOUDINARY_UPLOAD_DURATION = Histogram(
+    "aissam_cloudinary_upload_duration_seconds",
+    "Cloudinary upload latency",
+    ["outcome"],
+    buckets=LATENCY_BUCKETS
+)
+CLOUDINARY_UPLOAD_BYTES = Histogram(
+    "aissam_cloudinary_upload_bytes",
+    "Size of images sent to Cloudinary",
+    buckets=BYTES_BUCKETS
+)
+
+class StatusCollector:
+    """
+    Exposes a get_status()-style dict as gauges, read at scrape time
+
+    Numeric values become <prefix>_<key>; string values become
+    <prefix>_<key>_info{value="..."} 1 (e.g. the circuit breaker state).
+    """
+    def __init__(self, prefix: str, get_status: Callable[[], dict], documentation: str):
+        self.prefix = prefix
+        self.get_status = get_status
+        self.documentation = documentation
+
+    def collect(self):
+        for key, value in self.get_status().items():
+            if isinstance(value, bool):
+                value = int(value)
+            if isinstance(value, (int, float)):
+                yield GaugeMetricFamily(f"{self.prefix}_{key}", f"{self.documentation}: {key}", value=value)
+            elif isinstance(value, str):
+                family = GaugeMetricFamily(f"{self.prefix}_{key}_info", f"{self.documentation}: {key}", labels=["value"])
+                family.add_metric([value], 1)
+                yield family
+
+def register_status_collector(prefix: str, get_status: Callable[[], dict], documentation: str):
+    REGISTRY.register(StatusCollector(prefix, get_status, documentation))
+
+def render_metrics():
+    return generate_latest(REGISTRY), CONTENT_TYPE_LATEST
+
+def route_template(app, scope) -> str:
+    """
+    Route path template for labels (/chat-sessions/{session_id}), never the raw path
+    """
+    for route in app.router.routes:
+        match, _ = route.matches(scope)
+        if match == Match.FULL:
+            return route.path
+    return "unmatched"
+
+class MetricsMiddleware:
+    """
+    Pure ASGI middleware (no body buffering, so SSE streams pass through untouched)
+    """
+    def __init__(self, app, fastapi_app):
+        self.app = app
+        self.fastapi_app = fastapi_app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        method = scope["method"]
+        route = route_template(self.fastapi_app, scope)
+        status_code = 500
+        counter = QueryCounter()
+        token = current_query_counter.set(counter)
+        in_flight = HTTP_REQUESTS_IN_FLIGHT.labels(method, route)
+        in_flight.inc()
+        started = time.perf_counter()
+
+        async def send_wrapper(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            in_flight.dec()
+            HTTP_REQUEST_DURATION.labels(method, route, str(status_code)).observe(time.perf_counter() - started)
+            HTTP_REQUEST_DB_QUERIES.labels(method, route).observe(counter.count)
+            current_query_counter.reset(token)
@@ -0,0 +1,44 @@
+from logging.config import fileConfig
+
+from alembic import context
+
+from database import engine, SQLALCHEMY_DATABASE_URL
+from models import Base
+
+config = context.config
+
+# The app runs migrations in-process (DB_AUTO_MIGRATE) with its own logging already set up
+if config.config_file_name is not None and config.attributes.get("configure_logger", True):
+    fileConfig(config.config_file_name)
+
+target_metadata = Base.metadata
+
+def run_migrations_offline() -> None:
+    """
+    Emit SQL to stdout (alembic upgrade head --sql) instead of running it
+    """
+    context.configure(
+        url=SQLALCHEMY_DATABASE_URL,
+        target_metadata=target_metadata,
+        literal_binds=True,
+        dialect_opts={"paramstyle": "named"},
+    )
+
+    with context.begin_transaction():
+        context.run_migrations()
+
+def run_migrations_online() -> None:
+    with engine.connect() as connection:
+        context.configure(
+            connection=connection,
+            target_metadata=target_metadata,
+            render_as_batch=connection.dialect.name == "sqlite",
+        )
+
+        with context.begin_transaction():
+            context.run_migrations()
+
+if context.is_offline_mode():
+    run_migrations_offline()
+else:
+    run_migrations_online()
@@ -0,0 +1,130 @@
+"""baseline schema
+
+Adopts databases created by the old import-time create_all + run_migrations()
+(or by the SQL in DEPLOYMENT_GUIDE.md): every step checks what already exists,
+so the first `alembic upgrade head` on such a database only fills in the gaps
+and stamps it. Fresh databases get the full schema.
+
+Revision ID: 0001
+Revises:
+Create Date: 2026-10-16 00:00:00
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "0001"
+down_revision: Union[str, None] = None
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+DEFAULT_SUBJECTS = [
+    {"name": "수학", "color": "#3B82F6", "icon": "calculator"},
+    {"name": "영어", "color": "#EF4444", "icon": "globe"},
+    {"name": "국어", "color": "#10B981", "icon": "book"},
+    {"name": "사회탐구", "color": "#F97316", "icon": "building"},
+    {"name": "과학탐구", "color": "#8B5CF6", "icon": "beaker"},
+]
+
+
+def upgrade() -> None:
+    inspector = sa.inspect(op.get_bind())
+    tables = set(inspector.get_table_names())
+
+    if "users" not in tables:
+        op.create_table(
+            "users",
+            sa.Column("id", sa.Integer(), primary_key=True),
+            sa.Column("email", sa.String()),
+            sa.Column("name", sa.String(), nullable=False),
+            sa.Column("hashed_password", sa.String()),
+            sa.Column("grade", sa.String()),
+            sa.Column("created_at", sa.DateTime()),
+        )
+        op.create_index("ix_users_id", "users", ["id"])
+        op.create_index("ix_users_email", "users", ["email"], unique=True)
+
+    if "subjects" not in tables:
+        op.create_table(
+            "subjects",
+            sa.Column("id", sa.Integer(), primary_key=True),
+            sa.Column("name", sa.String(), nullable=False),
+            sa.Column("color", sa.String(), nullable=False),
+            sa.Column("icon", sa.String(), nullable=False),
+        )
+        op.create_index("ix_subjects_id", "subjects", ["id"])
+
+    if "chat_sessions" not in tables:
+        op.create_table(
+            "chat_sessions",
+            sa.Column("id", sa.Integer(), primary_key=True),
+            sa.Column("user_id", sa.Integer(), sa.ForeignKey("users.id"), nullable=False),
+            sa.Column("subject_id", sa.Integer(), sa.ForeignKey("subjects.id"), nullable=False),
+            sa.Column("title", sa.String(), nullable=False),
+            sa.Column("created_at", sa.DateTime()),
+            sa.Column("summary", sa.Text(), nullable=True),
+            sa.Column("summary_message_id", sa.Integer(), nullable=True),
+        )
+        op.create_index("ix_chat_sessions_id", "chat_sessions", ["id"])
+    else:
+        columns = {column["name"] for column in inspector.get_columns("chat_sessions")}
+        if "summary" not in columns:
+            op.add_column("chat_sessions", sa.Column("summary", sa.Text(), nullable=True))
+        if "summary_message_id" not in columns:
+            op.add_column("chat_sessions", sa.Column("summary_message_id", sa.Integer(), nullable=True))
+
+    if "messages" not in tables:
+        op.create_table(
+            "messages",
+            sa.Column("id", sa.Integer(), primary_key=True),
+            sa.Column("session_id", sa.Integer(), sa.ForeignKey("chat_sessions.id"), nullable=False),
+            sa.Column("content", sa.Text(), nullable=False),
+            sa.Column("is_user", sa.Boolean()),
+            sa.Column("image_path", sa.String(), nullable=True),
+            sa.Column("created_at", sa.DateTime()),
+        )
+        op.create_index("ix_messages_id", "messages", ["id"])
+    elif "image_path" not in {column["name"] for column in inspector.get_columns("messages")}:
+        op.add_column("messages", sa.Column("image_path", sa.String(), nullable=True))
+
+    if "uploaded_images" not in tables:
+        op.create_table(
+            "uploaded_images",
+            sa.Column("id", sa.Integer(), primary_key=True),
+            sa.Column("session_id", sa.Integer(), sa.ForeignKey("chat_sessions.id"), nullable=False),
+            sa.Column("filename", sa.String(), nullable=False),
+            sa.Column("filepath", sa.String(), nullable=False),
+            sa.Column("created_at", sa.DateTime()),
+        )
+        op.create_index("ix_uploaded_images_id", "uploaded_images", ["id"])
+
+    # History pagination and per-subject session list indexes
+    indexes = {
+        ("messages", "ix_messages_session_created_id"): ["session_id", "created_at", "id"],
+        ("chat_sessions", "ix_chat_sessions_user_subject_created"): ["user_id", "subject_id", "created_at"],
+    }
+    for (table, name), columns in indexes.items():
+        existing = {index["name"] for index in sa.inspect(op.get_bind()).get_indexes(table)}
+        if name not in existing:
+            op.create_index(name, table, columns)
+
+    subjects = sa.table(
+        "subjects",
+        sa.column("name", sa.String()),
+        sa.column("color", sa.String()),
+        sa.column("icon", sa.String()),
+    )
+    if not op.get_bind().scalar(sa.select(sa.func.count()).select_from(subjects)):
+        op.bulk_insert(subjects, DEFAULT_SUBJECTS)
+
+
+def downgrade() -> None:
+    op.drop_table("uploaded_images")
+    op.drop_table("messages")
+    op.drop_table("chat_sessions")
+    op.drop_table("subjects")
+    op.drop_table("users")
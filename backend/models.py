@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, DateTime, Boolean, ForeignKey, Text
+from sqlalchemy import Column, Integer, String, DateTime, Boolean, ForeignKey, Text, Index
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import relationship
 from datetime import datetime
@@ -50,12 +50,20 @@ class ChatSession(Base):
     subject_id = Column(Integer, ForeignKey("subjects.id"), nullable=False)
     title = Column(String, nullable=False)
     created_at = Column(DateTime, default=datetime.utcnow)
+    summary = Column(Text, nullable=True)  # 토큰 예산 밖으로 밀려난 이전 대화의 누적 요약
+    summary_message_id = Column(Integer, nullable=True)  # 요약에 반영된 마지막 메시지 id
+    version = Column(Integer, nullable=False, default=0, server_default="0")  # 기존 메시지가 바뀔 때(이미지 업로드 완료 등) 증가, ETag에 사용
     
     # Relationships
     user = relationship("User", back_populates="chat_sessions")
     subject = relationship("Subject", back_populates="chat_sessions")
     messages = relationship("Message", back_populates="session")
     uploaded_images = relationship("UploadedImage", back_populates="session")
+    
+    __table_args__ = (
+        # 사용자/과목별 세션 목록 조회/페이지네이션용 (user_id, subject_id, created_at)
+        Index("ix_chat_sessions_user_subject_created", "user_id", "subject_id", "created_at"),
+    )
 
 class Message(Base):
     __tablename__ = "messages"
@@ -69,6 +77,11 @@ class Message(Base):
     
     # Relationships
     session = relationship("ChatSession", back_populates="messages")
+    
+    __table_args__ = (
+        # 세션별 메시지 히스토리 조회/페이지네이션용 (session_id, created_at, id)
+        Index("ix_messages_session_created_id", "session_id", "created_at", "id"),
+    )
 
 class UploadedImage(Base):
     __tablename__ = "uploaded_images"
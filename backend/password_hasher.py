@@ -0,0 +1,86 @@
+import asyncio
+import concurrent.futures
+import logging
+import multiprocessing
+import os
+from concurrent.futures.process import BrokenProcessPool
+from typing import Optional, Tuple
+
+from passlib.context import CryptContext
+
+from env_utils import env_flag
+
+logger = logging.getLogger(__name__)
+
+# bcrypt 비용(cost) 및 해싱 워커 설정
+BCRYPT_ROUNDS = int(os.getenv("BCRYPT_ROUNDS", "12"))
+PASSWORD_HASH_WORKERS = int(os.getenv("PASSWORD_HASH_WORKERS", str(min(4, os.cpu_count() or 1))))
+# false면 프로세스 대신 스레드 풀 사용 (bcrypt는 GIL을 해제하지만 병렬성은 프로세스가 더 확실)
+PASSWORD_HASH_USE_PROCESSES = env_flag("PASSWORD_HASH_USE_PROCESSES", "true")
+
+# Hashes with a different cost than BCRYPT_ROUNDS are flagged for update on login
+pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto", bcrypt__rounds=BCRYPT_ROUNDS)
+
+def hash_password(password: str) -> str:
+    hashed = pwd_context.hash(password)
+    # Ensure it's a string, not bytes
+    if isinstance(hashed, bytes):
+        return hashed.decode('utf-8')
+    return hashed
+
+def verify_and_update(password: str, hashed_password: str) -> Tuple[bool, Optional[str]]:
+    """
+    Verify a password; the second value is a fresh hash when the stored one uses an outdated cost
+    """
+    return pwd_context.verify_and_update(password, hashed_password)
+
+class PasswordHasher:
+    """
+    Runs bcrypt hashing/verification on a bounded worker pool off the event loop
+    """
+    def __init__(self, workers: int = PASSWORD_HASH_WORKERS, use_processes: bool = PASSWORD_HASH_USE_PROCESSES):
+        self.workers = max(1, workers)
+        self.use_processes = use_processes
+        self._executor = None
+
+    def _get_executor(self):
+        # Created lazily so importing the app does not spawn workers
+        if self._executor is None:
+            if self.use_processes:
+                # spawn: forking a process that already runs threads is unsafe
+                self._executor = concurrent.futures.ProcessPoolExecutor(
+                    max_workers=self.workers,
+                    mp_context=multiprocessing.get_context("spawn")
+                )
+            else:
+                self._executor = concurrent.futures.ThreadPoolExecutor(
+                    max_workers=self.workers,
+                    thread_name_prefix="bcrypt"
+                )
+        return self._executor
+
+    async def _run(self, func, *args):
+        loop = asyncio.get_running_loop()
+        executor = self._get_executor()
+        try:
+            return await loop.run_in_executor(executor, func, *args)
+        except BrokenProcessPool:
+            # A worker died (e.g. OOM kill); the pool is unusable from now on, so replace it once
+            logger.warning("password hash worker pool broken; recreating it")
+            if self._executor is executor:
+                executor.shutdown(wait=False, cancel_futures=True)
+                self._executor = None
+            return await loop.run_in_executor(self._get_executor(), func, *args)
+
+    async def hash(self, password: str) -> str:
+        return await self._run(hash_password, password)
+
+    async def verify_and_update(self, password: str, hashed_password: str) -> Tuple[bool, Optional[str]]:
+        return await self._run(verify_and_update, password, hashed_password)
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+password_hasher = PasswordHasher()
@@ -0,0 +1,130 @@
+import logging
+import os
+import random
+import threading
+import time
+
+from google.api_core import exceptions as google_exceptions
+
+logger = logging.getLogger(__name__)
+
+# Gemini 재시도/서킷 브레이커 설정
+AI_RETRY_MAX_ATTEMPTS = int(os.getenv("AI_RETRY_MAX_ATTEMPTS", "3"))
+AI_RETRY_BASE_DELAY_SECONDS = float(os.getenv("AI_RETRY_BASE_DELAY_SECONDS", "0.5"))
+AI_RETRY_MAX_DELAY_SECONDS = float(os.getenv("AI_RETRY_MAX_DELAY_SECONDS", "8"))
+AI_BREAKER_FAILURE_THRESHOLD = int(os.getenv("AI_BREAKER_FAILURE_THRESHOLD", "5"))
+AI_BREAKER_RESET_SECONDS = float(os.getenv("AI_BREAKER_RESET_SECONDS", "30"))
+
+# Transient provider/network failures; anything else (bad request, auth, safety block) fails at once
+RETRYABLE_EXCEPTIONS = (
+    google_exceptions.TooManyRequests,  # includes ResourceExhausted (quota)
+    google_exceptions.InternalServerError,
+    google_exceptions.BadGateway,
+    google_exceptions.ServiceUnavailable,
+    google_exceptions.GatewayTimeout,  # includes DeadlineExceeded
+    ConnectionError,
+    TimeoutError
+)
+
+def is_retryable(error: BaseException) -> bool:
+    return isinstance(error, RETRYABLE_EXCEPTIONS)
+
+def backoff_delay(
+    attempt: int,
+    base: float = AI_RETRY_BASE_DELAY_SECONDS,
+    cap: float = AI_RETRY_MAX_DELAY_SECONDS
+) -> float:
+    """
+    Full-jitter exponential backoff for the given retry number (1-based)
+    """
+    return random.uniform(0, min(cap, base * (2 ** (attempt - 1))))
+
+class CircuitOpenError(Exception):
+    """
+    The provider is considered unhealthy; the call was not attempted
+    """
+
+class CircuitBreaker:
+    """
+    Consecutive-failure circuit breaker
+
+    closed: calls pass; AI_BREAKER_FAILURE_THRESHOLD failures in a row open it.
+    open: calls fail fast until reset_timeout has passed.
+    half_open: a single probe call is let through; success closes the
+    breaker, failure opens it again for another reset_timeout.
+    """
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(
+        self,
+        failure_threshold: int = AI_BREAKER_FAILURE_THRESHOLD,
+        reset_timeout: float = AI_BREAKER_RESET_SECONDS
+    ):
+        self.failure_threshold = max(1, failure_threshold)
+        self.reset_timeout = reset_timeout
+        self.state = self.CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._probe_in_flight = False
+        self._lock = threading.Lock()
+        # Stats
+        self.rejected = 0
+        self.opened = 0
+
+    def before_call(self):
+        """
+        Raise CircuitOpenError unless a call may be attempted now
+        """
+        with self._lock:
+            if self.state == self.OPEN:
+                if time.monotonic() - self._opened_at < self.reset_timeout:
+                    self.rejected += 1
+                    raise CircuitOpenError("AI provider circuit is open")
+                self.state = self.HALF_OPEN
+                self._probe_in_flight = False
+            if self.state == self.HALF_OPEN:
+                if self._probe_in_flight:
+                    self.rejected += 1
+                    raise CircuitOpenError("AI provider circuit is half-open (probe in flight)")
+                self._probe_in_flight = True
+
+    def record_success(self):
+        with self._lock:
+            self.state = self.CLOSED
+            self._failures = 0
+            self._probe_in_flight = False
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            if self.state == self.HALF_OPEN or self._failures >= self.failure_threshold:
+                if self.state != self.OPEN:
+                    self.opened += 1
+                    logger.error("AI provider circuit opened", extra={"consecutive_failures": self._failures})
+                self.state = self.OPEN
+                self._opened_at = time.monotonic()
+                self._probe_in_flight = False
+
+    def record_ignored(self):
+        """
+        The call ended without telling us anything about provider health (e.g. client went away)
+        """
+        with self._lock:
+            self._probe_in_flight = False
+
+    def get_status(self) -> dict:
+        with self._lock:
+            retry_in = 0.0
+            if self.state == self.OPEN:
+                retry_in = max(0.0, self.reset_timeout - (time.monotonic() - self._opened_at))
+            return {
+                "state": self.state,
+                "consecutive_failures": self._failures,
+                "failure_threshold": self.failure_threshold,
+                "reset_seconds": self.reset_timeout,
+                "probe_in_seconds": round(retry_in, 3),
+                "opened": self.opened,
+                "rejected": self.rejected
+            }
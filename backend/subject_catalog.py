@@ -0,0 +1,67 @@
+import os
+import time
+from dataclasses import dataclass
+from typing import Optional
+
+import orjson
+from sqlalchemy import event, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from http_cache import make_etag
+from models import Subject
+
+# 과목 목록 캐시 설정 (과목은 마이그레이션으로만 바뀌므로 TTL은 직접 DB를 수정한 경우 대비)
+SUBJECT_CACHE_TTL_SECONDS = float(os.getenv("SUBJECT_CACHE_TTL_SECONDS", "300"))
+
+@dataclass
+class CatalogSnapshot:
+    body: bytes  # Serialized List[SubjectResponse]
+    etag: str
+    expires_at: float
+
+class SubjectCatalog:
+    """
+    In-process cache of the subject catalog, serialized once per load
+
+    The ETag is derived from the serialized catalog, so every worker computes
+    the same one for the same rows.
+    """
+    def __init__(self, ttl: float = SUBJECT_CACHE_TTL_SECONDS):
+        self.ttl = ttl
+        self._snapshot: Optional[CatalogSnapshot] = None
+        # Stats
+        self.loads = 0
+
+    async def get(self, db: AsyncSession) -> CatalogSnapshot:
+        snapshot = self._snapshot
+        if snapshot is not None and snapshot.expires_at > time.monotonic():
+            return snapshot
+        subjects = (await db.scalars(select(Subject).order_by(Subject.id))).all()
+        body = orjson.dumps([{
+            "id": subject.id,
+            "name": subject.name,
+            "color": subject.color,
+            "icon": subject.icon
+        } for subject in subjects])
+        snapshot = CatalogSnapshot(
+            body=body,
+            etag=make_etag("subjects", body),
+            expires_at=time.monotonic() + self.ttl
+        )
+        self.loads += 1
+        if subjects:
+            # An empty catalog (migrations not applied yet) is not cached
+            self._snapshot = snapshot
+        return snapshot
+
+    def invalidate(self):
+        self._snapshot = None
+
+subject_catalog = SubjectCatalog()
+
+# 과목 추가/변경/삭제 시 캐시 무효화 (이 프로세스에서 변경한 경우)
+@event.listens_for(Subject, "after_insert")
+@event.listens_for(Subject, "after_update")
+@event.listens_for(Subject, "after_delete")
+def _invalidate_catalog(mapper, connection, target):
+    subject_catalog.invalidate()
@@ -0,0 +1,208 @@
+import datetime
+import inspect
+import itertools
+import logging
+import os
+import threading
+import time
+from dataclasses import dataclass
+from typing import Any, Optional
+
+import google.generativeai as genai
+from google.api_core import exceptions as google_exceptions
+
+logger = logging.getLogger(__name__)
+
+# 과목 프롬프트 캐시 설정
+# off: system_instruction만 사용, gemini: Gemini cached contents 사용, local: 네트워크 없는 테스트용 스텁
+AI_PROMPT_CACHE = os.getenv("AI_PROMPT_CACHE", "off").strip().lower()
+AI_PROMPT_CACHE_TTL_SECONDS = int(os.getenv("AI_PROMPT_CACHE_TTL_SECONDS", "3600"))
+
+def supports_system_instruction() -> bool:
+    """
+    system_instruction needs google-generativeai>=0.5; older SDKs get the prompt inline instead
+    """
+    try:
+        return "system_instruction" in inspect.signature(genai.GenerativeModel.__init__).parameters
+    except (TypeError, ValueError):
+        return False
+
+def is_below_min_cache_size(error: Exception) -> bool:
+    """
+    Gemini rejects cached contents under its minimum token count ("Cached content is too small ...
+    min_total_token_count=..."); the subject prompt does not grow, so retrying cannot succeed
+    """
+    message = str(error).lower()
+    return isinstance(error, google_exceptions.InvalidArgument) and (
+        "too small" in message or "min_total_token_count" in message
+    )
+
+class GeminiPromptCache:
+    """
+    Provider-side cached contents holding the static subject prompt
+    """
+    def __init__(self, ttl: int = AI_PROMPT_CACHE_TTL_SECONDS):
+        from google.generativeai import caching  # google-generativeai>=0.7
+        self._caching = caching
+        self.ttl = ttl
+
+    def create(self, model_name: str, system_instruction: str, model_kwargs: dict):
+        cached = self._caching.CachedContent.create(
+            model=model_name,
+            system_instruction=system_instruction,
+            ttl=datetime.timedelta(seconds=self.ttl)
+        )
+        model = genai.GenerativeModel.from_cached_content(cached, **model_kwargs)
+        return model, cached
+
+    def delete(self, handle):
+        handle.delete()
+
+class LocalPromptCache:
+    """
+    In-process stand-in for GeminiPromptCache: same lifecycle, no network calls
+    """
+    def __init__(self, ttl: int = AI_PROMPT_CACHE_TTL_SECONDS):
+        self.ttl = ttl
+        self.entries = {}
+        self._ids = itertools.count(1)
+
+    def create(self, model_name: str, system_instruction: str, model_kwargs: dict):
+        # Expire entries like the provider does (replaced entries are not deleted explicitly)
+        now = time.monotonic()
+        for expired in [key for key, (_, expires_at) in self.entries.items() if expires_at <= now]:
+            del self.entries[expired]
+        name = f"cachedContents/local-{next(self._ids)}"
+        self.entries[name] = (system_instruction, now + self.ttl)
+        model = genai.GenerativeModel(
+            model_name=model_name,
+            system_instruction=system_instruction,
+            **model_kwargs
+        )
+        return model, name
+
+    def delete(self, handle):
+        self.entries.pop(handle, None)
+
+def create_prompt_cache(mode: str, ttl: int = AI_PROMPT_CACHE_TTL_SECONDS):
+    if mode == "gemini":
+        try:
+            return GeminiPromptCache(ttl)
+        except ImportError:
+            logger.warning("AI_PROMPT_CACHE=gemini requires google-generativeai>=0.7; prompt caching disabled")
+            return None
+    if mode == "local":
+        return LocalPromptCache(ttl)
+    return None
+
+@dataclass
+class SubjectModel:
+    model: Any
+    expires_at: Optional[float] = None
+    cache_handle: Any = None
+
+class SubjectModelRegistry:
+    """
+    One GenerativeModel per subject, created once with the subject prompt as system_instruction
+
+    With a prompt cache the static prompt is stored provider-side and the model is
+    rebuilt shortly before the cache entry expires. If caching fails the plain
+    system_instruction model is used for that subject and caching is retried later,
+    except when the prompt is below the provider's minimum cacheable size: that
+    subject then keeps the plain model for good.
+    """
+    # Recreate cached models this long before the provider-side entry expires
+    REFRESH_MARGIN_SECONDS = 60
+    # Retry prompt caching this long after a failed attempt
+    FALLBACK_RETRY_SECONDS = 300
+
+    def __init__(
+        self,
+        model_name: str,
+        model_kwargs: dict,
+        prompts: dict,
+        default_subject: str,
+        cache_mode: str = AI_PROMPT_CACHE,
+        cache_ttl: int = AI_PROMPT_CACHE_TTL_SECONDS
+    ):
+        self.model_name = model_name
+        self.model_kwargs = model_kwargs
+        self.prompts = prompts
+        self.default_subject = default_subject
+        self.enabled = supports_system_instruction()
+        self.cache = create_prompt_cache(cache_mode, cache_ttl) if self.enabled else None
+        self._models = {}
+        self._lock = threading.Lock()
+        # Per-subject: only one thread builds a subject's model, without blocking other subjects
+        self._create_locks = {name: threading.Lock() for name in prompts}
+
+    def get(self, subject_name: str):
+        """
+        Model for a subject (unknown subjects share the default subject's model)
+        """
+        if subject_name not in self.prompts:
+            subject_name = self.default_subject
+        with self._lock:
+            entry = self._models.get(subject_name)
+        if entry is not None and (entry.expires_at is None or entry.expires_at > time.monotonic()):
+            return entry.model
+
+        create_lock = self._create_locks[subject_name]
+        if entry is None:
+            create_lock.acquire()
+        elif not create_lock.acquire(blocking=False):
+            # Another thread is refreshing; the old model stays valid until its cache TTL ends
+            return entry.model
+        try:
+            with self._lock:
+                entry = self._models.get(subject_name)
+            if entry is not None and (entry.expires_at is None or entry.expires_at > time.monotonic()):
+                return entry.model
+            # Network calls happen outside self._lock. The old cache entry is not
+            # deleted: requests may still be using it, and it expires provider-side
+            entry = self._create(subject_name)
+            with self._lock:
+                self._models[subject_name] = entry
+            return entry.model
+        finally:
+            create_lock.release()
+
+    def _create(self, subject_name: str) -> SubjectModel:
+        system_instruction = self.prompts[subject_name]
+        retry_caching = self.cache is not None
+        if self.cache is not None:
+            try:
+                model, handle = self.cache.create(self.model_name, system_instruction, self.model_kwargs)
+                expires_at = time.monotonic() + max(self.cache.ttl - self.REFRESH_MARGIN_SECONDS, 1)
+                return SubjectModel(model=model, expires_at=expires_at, cache_handle=handle)
+            except Exception as e:
+                retry_caching = not is_below_min_cache_size(e)
+                logger.warning(
+                    "prompt cache unavailable, using system_instruction only",
+                    extra={"subject": subject_name, "retry": retry_caching, "error": str(e)}
+                )
+        model = genai.GenerativeModel(
+            model_name=self.model_name,
+            system_instruction=system_instruction,
+            **self.model_kwargs
+        )
+        if retry_caching:
+            # Caching failed: use the plain model for now and try caching again later
+            return SubjectModel(model=model, expires_at=time.monotonic() + self.FALLBACK_RETRY_SECONDS)
+        return SubjectModel(model=model)
+
+    def _delete_cache(self, handle):
+        try:
+            self.cache.delete(handle)
+        except Exception as e:
+            logger.warning("prompt cache cleanup failed", extra={"error": str(e)})
+
+    def close(self):
+        """
+        Delete provider-side cache entries so they stop accruing storage
+        """
+        with self._lock:
+            for entry in self._models.values():
+                if entry.cache_handle is not None:
+                    self._delete_cache(entry.cache_handle)
+            self._models.clear()
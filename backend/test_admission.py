@@ -0,0 +1,164 @@
+import asyncio
+
+import pytest
+from fastapi import HTTPException
+
+import main
+from admission import AdmissionController, AdmissionRejected, pool_bounded_concurrency
+
+async def _settle():
+    # Let queued acquire() calls reach their wait
+    for _ in range(5):
+        await asyncio.sleep(0)
+
+def test_freed_slots_go_to_users_in_round_robin_order():
+    async def scenario():
+        admission = AdmissionController(max_concurrent=1, max_queue=10, max_queue_per_user=3)
+        holder = await admission.acquire(1)
+        order = []
+
+        async def request(user_id, name):
+            ticket = await admission.acquire(user_id)
+            order.append(name)
+            return ticket
+
+        # User 1 queues two requests before user 2 queues one
+        tasks = [
+            asyncio.create_task(request(1, "a1")),
+            asyncio.create_task(request(1, "a2")),
+        ]
+        await _settle()
+        tasks.append(asyncio.create_task(request(2, "b1")))
+        await _settle()
+        assert admission.get_status()["queue_depth"] == 3
+
+        # Each release hands the slot to exactly one waiter
+        ticket = holder
+        pending = list(tasks)
+        for _ in range(3):
+            ticket.release()
+            await _settle()
+            done = [task for task in pending if task.done()]
+            assert len(done) == 1
+            pending.remove(done[0])
+            ticket = done[0].result()
+        ticket.release()
+
+        assert order == ["a1", "b1", "a2"]
+        assert admission.get_status()["in_flight"] == 0
+
+    asyncio.run(scenario())
+
+def test_full_user_queue_is_rejected_with_retry_after():
+    async def scenario():
+        admission = AdmissionController(max_concurrent=1, max_queue=10, max_queue_per_user=1)
+        holder = await admission.acquire(1)
+        waiter = asyncio.create_task(admission.acquire(2))
+        await _settle()
+
+        with pytest.raises(AdmissionRejected) as rejected:
+            await admission.acquire(2)
+        assert rejected.value.retry_after >= 1
+        # Another user still has room in the queue
+        other = asyncio.create_task(admission.acquire(3))
+        await _settle()
+        assert admission.get_status()["queue_depth"] == 2
+
+        holder.release()
+        (await waiter).release()
+        (await other).release()
+        assert admission.rejected == 1
+
+    asyncio.run(scenario())
+
+def test_full_global_queue_is_rejected():
+    async def scenario():
+        admission = AdmissionController(max_concurrent=1, max_queue=0)
+        holder = await admission.acquire(1)
+        with pytest.raises(AdmissionRejected):
+            await admission.acquire(2)
+        holder.release()
+        (await admission.acquire(2)).release()
+
+    asyncio.run(scenario())
+
+def test_queue_timeout_rejects_and_leaves_the_queue():
+    async def scenario():
+        admission = AdmissionController(max_concurrent=1, queue_timeout=0.01)
+        holder = await admission.acquire(1)
+        with pytest.raises(AdmissionRejected):
+            await admission.acquire(2)
+        assert admission.get_status()["queue_depth"] == 0
+        assert admission.timeouts == 1
+        holder.release()
+        assert admission.get_status()["in_flight"] == 0
+
+    asyncio.run(scenario())
+
+def test_cancelled_waiter_releases_its_place():
+    async def scenario():
+        admission = AdmissionController(max_concurrent=1)
+        holder = await admission.acquire(1)
+        waiter = asyncio.create_task(admission.acquire(2))
+        await _settle()
+        waiter.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await waiter
+        assert admission.get_status()["queue_depth"] == 0
+
+        holder.release()
+        assert admission.get_status()["in_flight"] == 0
+
+    asyncio.run(scenario())
+
+def test_slot_handed_to_a_cancelled_waiter_is_released():
+    async def scenario():
+        admission = AdmissionController(max_concurrent=1)
+        holder = await admission.acquire(1)
+        waiter = asyncio.create_task(admission.acquire(2))
+        await _settle()
+        # The slot is handed over and the waiter is cancelled before it resumes
+        holder.release()
+        waiter.cancel()
+        try:
+            ticket = await waiter
+        except asyncio.CancelledError:
+            pass
+        else:
+            # Some Python versions let the completed wait win over the cancellation
+            ticket.release()
+        assert admission.get_status()["in_flight"] == 0
+
+    asyncio.run(scenario())
+
+def test_ticket_release_is_idempotent():
+    async def scenario():
+        admission = AdmissionController(max_concurrent=2)
+        ticket = await admission.acquire(1)
+        other = await admission.acquire(2)
+        ticket.release()
+        ticket.release()
+        assert admission.get_status()["in_flight"] == 1
+        other.release()
+
+    asyncio.run(scenario())
+
+def test_concurrency_is_bounded_by_pool_capacity():
+    assert pool_bounded_concurrency(16, 15, 5) == 10
+    assert pool_bounded_concurrency(4, 15, 5) == 4
+    assert pool_bounded_concurrency(16, 3, 5) == 1
+    # No app-side pool (PgBouncer): the configured value stands
+    assert pool_bounded_concurrency(16, None, 5) == 16
+
+def test_rejected_send_is_a_429_with_retry_after(monkeypatch):
+    async def scenario():
+        admission = AdmissionController(max_concurrent=1, max_queue=0)
+        monkeypatch.setattr(main, "ai_admission", admission)
+        holder = await admission.acquire(1)
+        with pytest.raises(HTTPException) as rejected:
+            await main.acquire_ai_slot(2)
+        assert rejected.value.status_code == 429
+        assert int(rejected.value.headers["Retry-After"]) >= 1
+        holder.release()
+
+    asyncio.run(scenario())
@@ -0,0 +1,239 @@
+import asyncio
+from datetime import datetime, timedelta
+from urllib.parse import urlencode
+
+import pytest
+from fastapi.testclient import TestClient
+from passlib.context import CryptContext
+from sqlalchemy import create_engine
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+from sqlalchemy.orm import Session
+from sqlalchemy.pool import NullPool
+
+import main
+import password_hasher
+from database import get_db
+from http_cache import etag_matches, make_etag
+from idempotency import idempotency_store
+from models import Base, ChatSession, Message, Subject, User
+from subject_catalog import subject_catalog
+
+BASE_TIME = datetime(2026, 1, 1, 9, 0, 0)
+
+@pytest.fixture
+def api(tmp_path):
+    """
+    Test client on a throwaway SQLite file (the app's lifespan is not run)
+    """
+    path = tmp_path / "api.db"
+    sync_engine = create_engine(f"sqlite:///{path}")
+    Base.metadata.create_all(sync_engine)
+    async_engine = create_async_engine(f"sqlite+aiosqlite:///{path}", poolclass=NullPool)
+    session_factory = async_sessionmaker(async_engine, class_=AsyncSession, expire_on_commit=False)
+
+    async def override_get_db():
+        async with session_factory() as db:
+            yield db
+
+    main.app.dependency_overrides[get_db] = override_get_db
+    subject_catalog.invalidate()
+    with Session(sync_engine) as db:
+        user = User(email="a@b.com", name="n", hashed_password="x", grade="고1")
+        math = Subject(name="수학", color="#3B82F6", icon="calculator")
+        english = Subject(name="영어", color="#10B981", icon="book")
+        db.add_all([user, math, english])
+        db.commit()
+        token = main.create_access_token({"sub": str(user.id)})
+        client = TestClient(main.app, headers={"Authorization": f"Bearer {token}"})
+        client.db = db
+        client.session_factory = session_factory
+        client.user_id, client.subject_ids = user.id, (math.id, english.id)
+        yield client
+    main.app.dependency_overrides.pop(get_db, None)
+    subject_catalog.invalidate()
+    sync_engine.dispose()
+
+def add_session(client, subject_id: int, created_at: datetime, messages: int = 1) -> int:
+    session = ChatSession(user_id=client.user_id, subject_id=subject_id, title="t", created_at=created_at)
+    client.db.add(session)
+    client.db.flush()
+    client.db.add_all([
+        Message(session_id=session.id, content=f"m{index}", is_user=index % 2 == 0, created_at=created_at)
+        for index in range(messages)
+    ])
+    client.db.commit()
+    return session.id
+
+def test_message_history_pages_backwards_through_timestamp_ties(api):
+    session_id = add_session(api, api.subject_ids[0], BASE_TIME, messages=0)
+    # Pairs of messages share a timestamp, so paging must break ties on id
+    api.db.add_all([
+        Message(session_id=session_id, content=f"m{index}", created_at=BASE_TIME + timedelta(seconds=index // 2))
+        for index in range(7)
+    ])
+    api.db.commit()
+
+    pages = []
+    before_id = None
+    while True:
+        params = {"limit": 3, **({"before_id": before_id} if before_id else {})}
+        page = api.get(f"/chat-sessions/{session_id}/messages", params=params).json()
+        if not page:
+            break
+        pages.append([message["content"] for message in page])
+        before_id = page[0]["id"]
+
+    assert pages == [["m4", "m5", "m6"], ["m1", "m2", "m3"], ["m0"]]
+
+def test_message_history_rejects_a_foreign_cursor(api):
+    session_id = add_session(api, api.subject_ids[0], BASE_TIME, messages=2)
+    other_id = add_session(api, api.subject_ids[0], BASE_TIME, messages=1)
+    foreign_id = api.get(f"/chat-sessions/{other_id}/messages").json()[0]["id"]
+
+    response = api.get(f"/chat-sessions/{session_id}/messages", params={"before_id": foreign_id})
+    assert response.status_code == 400
+
+def test_session_list_filters_by_subject_and_pages_by_cursor(api):
+    math_id, english_id = api.subject_ids
+    math_sessions = [add_session(api, math_id, BASE_TIME + timedelta(minutes=index // 2)) for index in range(5)]
+    add_session(api, english_id, BASE_TIME)
+    # Sessions without messages are not listed
+    add_session(api, math_id, BASE_TIME + timedelta(hours=1), messages=0)
+
+    seen = []
+    cursor = None
+    while True:
+        params = {"subject_id": math_id, "limit": 2, **({"cursor": cursor} if cursor else {})}
+        page = api.get("/chat-sessions", params=params).json()
+        if not page:
+            break
+        assert all(session["subject"]["id"] == math_id for session in page)
+        seen.extend(session["id"] for session in page)
+        cursor = page[-1]["id"]
+
+    assert seen == list(reversed(math_sessions))
+    assert len(api.get("/chat-sessions").json()) == 6
+    assert api.get("/chat-sessions", params={"cursor": 99999}).status_code == 400
+
+def test_message_history_revalidates_with_etag(api):
+    session_id = add_session(api, api.subject_ids[0], BASE_TIME, messages=2)
+    url = f"/chat-sessions/{session_id}/messages"
+    first = api.get(url)
+    etag = first.headers["ETag"]
+    assert first.headers["Cache-Control"] == "private, no-cache"
+
+    cached = api.get(url, headers={"If-None-Match": etag})
+    assert cached.status_code == 304
+    assert cached.headers["ETag"] == etag
+    # Different page parameters are a different representation
+    assert api.get(url, params={"limit": 1}, headers={"If-None-Match": etag}).status_code == 200
+
+    # A new message changes the ETag
+    api.db.add(Message(session_id=session_id, content="new", created_at=BASE_TIME))
+    api.db.commit()
+    changed = api.get(url, headers={"If-None-Match": etag})
+    assert changed.status_code == 200
+    assert changed.headers["ETag"] != etag
+
+    # So does an in-place change recorded by a version bump (e.g. an image upload finishing)
+    etag = changed.headers["ETag"]
+    api.db.get(ChatSession, session_id).version += 1
+    api.db.commit()
+    assert api.get(url, headers={"If-None-Match": etag}).status_code == 200
+
+def test_session_list_revalidates_with_etag(api):
+    session_id = add_session(api, api.subject_ids[0], BASE_TIME)
+    etag = api.get("/chat-sessions").headers["ETag"]
+    assert api.get("/chat-sessions", headers={"If-None-Match": etag}).status_code == 304
+
+    api.db.add(Message(session_id=session_id, content="new", created_at=BASE_TIME))
+    api.db.commit()
+    assert api.get("/chat-sessions", headers={"If-None-Match": etag}).status_code == 200
+
+def test_subjects_revalidate_with_a_shared_etag(api):
+    first = api.get("/subjects")
+    etag = first.headers["ETag"]
+    assert first.headers["Cache-Control"] == "no-cache"
+    assert [subject["name"] for subject in first.json()] == ["수학", "영어"]
+    assert api.get("/subjects", headers={"If-None-Match": f'"other", {etag}'}).status_code == 304
+
+def test_etag_matching_uses_weak_comparison():
+    etag = make_etag("messages", 1, 2)
+    assert etag_matches(etag.removeprefix("W/"), etag)
+    assert etag_matches("*", etag)
+    assert not etag_matches(None, etag)
+    assert not etag_matches(make_etag("messages", 1, 3), etag)
+
+def test_stream_disconnect_completes_the_idempotency_entry(api, monkeypatch):
+    session_id = add_session(api, api.subject_ids[0], BASE_TIME, messages=0)
+    monkeypatch.setattr(main, "AsyncSessionLocal", api.session_factory)
+
+    async def fake_stream(**kwargs):
+        yield "partial"
+        await asyncio.sleep(3600)
+
+    monkeypatch.setattr(main.ai_service, "stream_response", fake_stream)
+    token = api.headers["Authorization"].encode()
+
+    async def scenario():
+        body = urlencode({"content": "q"}).encode()
+        request_sent = False
+        disconnected = asyncio.Event()
+
+        async def receive():
+            nonlocal request_sent
+            if not request_sent:
+                request_sent = True
+                return {"type": "http.request", "body": body, "more_body": False}
+            await disconnected.wait()
+            return {"type": "http.disconnect"}
+
+        async def send(message):
+            if message["type"] == "http.response.body" and b"event: chunk" in message.get("body", b""):
+                # The client goes away while the chunk is being written (generator parked at its yield)
+                disconnected.set()
+                await asyncio.sleep(3600)
+
+        path = f"/chat-sessions/{session_id}/messages/stream"
+        await main.app({
+            "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1", "method": "POST",
+            "scheme": "http", "path": path, "raw_path": path.encode(), "query_string": b"", "root_path": "",
+            "headers": [
+                (b"host", b"test"),
+                (b"content-type", b"application/x-www-form-urlencoded"),
+                (b"authorization", token),
+                (b"idempotency-key", b"retry-me"),
+            ],
+            "client": ("test", 1), "server": ("test", 80),
+        }, receive, send)
+
+        # By the time the response is finished the partial answer is saved and the key completed,
+        # so a retry replays it instead of leading a second generation
+        key, fingerprint = main.idempotency_scope("retry-me", session_id, "q", None, api.user_id)
+        state, value = idempotency_store.begin(key, fingerprint)
+        assert state == "replay"
+        assert value["ai_response"]["content"] == "partial"
+        assert main.ai_admission.get_status()["in_flight"] == 0
+
+    asyncio.run(scenario())
+
+def test_login_rehashes_a_password_stored_at_another_cost(api, monkeypatch):
+    # Thread workers share the patched context (spawned processes would re-read BCRYPT_ROUNDS)
+    monkeypatch.setattr(password_hasher, "pwd_context", CryptContext(schemes=["bcrypt"], deprecated="auto", bcrypt__rounds=4))
+    monkeypatch.setattr(main, "password_hasher", password_hasher.PasswordHasher(workers=1, use_processes=False))
+    user = api.db.get(User, api.user_id)
+    user.hashed_password = CryptContext(schemes=["bcrypt"], bcrypt__rounds=5).hash("secret")
+    api.db.commit()
+
+    assert api.post("/token", data={"username": "a@b.com", "password": "wrong"}).status_code == 401
+    api.db.expire_all()
+    assert "$05$" in api.db.get(User, api.user_id).hashed_password
+
+    assert api.post("/token", data={"username": "a@b.com", "password": "secret"}).status_code == 200
+    api.db.expire_all()
+    upgraded = api.db.get(User, api.user_id).hashed_password
+    assert "$04$" in upgraded
+    assert password_hasher.pwd_context.verify("secret", upgraded)
+    # Already at the configured cost: nothing left to update
+    assert password_hasher.verify_and_update("secret", upgraded) == (True, None)
+    main.password_hasher.shutdown()
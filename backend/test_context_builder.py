@@ -0,0 +1,113 @@
+import asyncio
+
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+from sqlalchemy.pool import StaticPool
+
+from admission import AdmissionController
+from context_builder import SUMMARY_ADMISSION_KEY, ConversationContextBuilder
+from models import Base, ChatSession, Message, Subject, User
+
+class FakeAIService:
+    """
+    Summary is the previous summary plus every turn's content, so coverage is checkable
+    """
+    def __init__(self):
+        self.calls = []
+
+    async def summarize_conversation(self, previous_summary, turns, max_chars=800):
+        self.calls.append(len(turns))
+        return "\n".join(([previous_summary] if previous_summary else []) + [turn["content"] for turn in turns])
+
+async def _seed(session_factory, message_count: int) -> int:
+    async with session_factory() as db:
+        user = User(email="a@b.com", name="n", hashed_password="x", grade="고1")
+        subject = Subject(name="수학", color="#3B82F6", icon="calculator")
+        db.add_all([user, subject])
+        await db.flush()
+        session = ChatSession(user_id=user.id, subject_id=subject.id, title="t")
+        db.add(session)
+        await db.flush()
+        db.add_all([
+            Message(session_id=session.id, content=f"turn-{index:03d}", is_user=index % 2 == 0)
+            for index in range(message_count)
+        ])
+        await db.commit()
+        return session.id
+
+def test_summary_covers_turns_beyond_message_window():
+    async def scenario():
+        engine = create_async_engine("sqlite+aiosqlite://", poolclass=StaticPool)
+        async with engine.begin() as conn:
+            await conn.run_sync(Base.metadata.create_all)
+        session_factory = async_sessionmaker(engine, expire_on_commit=False)
+        # Existing long session on first deploy: no summary yet, far more than max_messages
+        session_id = await _seed(session_factory, 125)
+
+        ai_service = FakeAIService()
+        builder = ConversationContextBuilder(
+            ai_service,
+            session_factory,
+            token_budget=1000,  # every turn in the 10-message window fits
+            max_messages=10,
+            summary_min_batch=6
+        )
+        async with session_factory() as db:
+            session = await db.get(ChatSession, session_id)
+            current_id = await db.scalar(select(func.max(Message.id)))
+            context = await builder.build(db, session, current_id)
+        assert len(context.history) == 10
+        assert context.overflow_count == 114
+
+        builder.schedule_summary(session_id, context)
+        await asyncio.gather(*builder._tasks)
+
+        async with session_factory() as db:
+            session = await db.get(ChatSession, session_id)
+            context = await builder.build(db, session, current_id)
+        covered = set(session.summary.split("\n")) | {turn["content"] for turn in context.history}
+        assert covered == {f"turn-{index:03d}" for index in range(124)}
+        assert context.overflow_count == 0
+        assert max(ai_service.calls) <= 10
+        await engine.dispose()
+
+    asyncio.run(scenario())
+
+def test_summary_waits_for_an_admission_slot():
+    async def scenario():
+        engine = create_async_engine("sqlite+aiosqlite://", poolclass=StaticPool)
+        async with engine.begin() as conn:
+            await conn.run_sync(Base.metadata.create_all)
+        session_factory = async_sessionmaker(engine, expire_on_commit=False)
+        session_id = await _seed(session_factory, 30)
+
+        admission = AdmissionController(max_concurrent=1, max_queue=10, max_queue_per_user=1)
+        ai_service = FakeAIService()
+        builder = ConversationContextBuilder(
+            ai_service,
+            session_factory,
+            token_budget=20,
+            max_messages=10,
+            summary_min_batch=6,
+            admission=admission
+        )
+        async with session_factory() as db:
+            session = await db.get(ChatSession, session_id)
+            current_id = await db.scalar(select(func.max(Message.id)))
+            context = await builder.build(db, session, current_id)
+
+        # A chat request holds the only slot: the summary queues behind it
+        chat_ticket = await admission.acquire(1)
+        builder.schedule_summary(session_id, context)
+        await asyncio.sleep(0.05)
+        assert ai_service.calls == []
+        assert admission.get_status()["queued_users"] == 1
+        assert SUMMARY_ADMISSION_KEY in admission._queues
+
+        chat_ticket.release()
+        await asyncio.gather(*builder._tasks)
+        assert ai_service.calls
+        assert admission.get_status()["in_flight"] == 0
+        await engine.dispose()
+
+    asyncio.run(scenario())
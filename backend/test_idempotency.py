@@ -0,0 +1,153 @@
+import asyncio
+
+import pytest
+
+from idempotency import IdempotencyConflict, IdempotencyStore, request_fingerprint
+from main import idempotency_conflict
+
+def test_concurrent_duplicates_share_one_run():
+    async def scenario():
+        store = IdempotencyStore()
+        calls = 0
+        release = asyncio.Event()
+
+        async def send():
+            nonlocal calls
+            calls += 1
+            await release.wait()
+            return {"id": calls}
+
+        fingerprint = request_fingerprint("hello", None, None)
+        tasks = [asyncio.create_task(store.run("key", fingerprint, send)) for _ in range(3)]
+        await asyncio.sleep(0)
+        release.set()
+        results = await asyncio.gather(*tasks)
+
+        assert calls == 1
+        assert results == [{"id": 1}] * 3
+        assert store.coalesced == 2
+        # Completed: a later duplicate is replayed without running again
+        assert await store.run("key", fingerprint, send) == {"id": 1}
+        assert store.replayed == 1
+        assert calls == 1
+
+    asyncio.run(scenario())
+
+def test_key_reused_for_a_different_request_conflicts():
+    async def scenario():
+        store = IdempotencyStore()
+
+        async def send():
+            return {"ok": True}
+
+        await store.run("key", request_fingerprint("hello", None, None), send)
+        with pytest.raises(IdempotencyConflict):
+            await store.run("key", request_fingerprint("bye", None, None), send)
+
+    asyncio.run(scenario())
+
+def test_conflict_is_a_422():
+    error = idempotency_conflict(IdempotencyConflict("used"))
+    assert error.status_code == 422
+
+def test_failed_request_is_forgotten_and_waiters_see_the_error():
+    async def scenario():
+        store = IdempotencyStore()
+        release = asyncio.Event()
+
+        async def failing():
+            await release.wait()
+            raise RuntimeError("boom")
+
+        leader = asyncio.create_task(store.run("key", "fp", failing))
+        await asyncio.sleep(0)
+        waiter = asyncio.create_task(store.run("key", "fp", failing))
+        await asyncio.sleep(0)
+        release.set()
+        for task in (leader, waiter):
+            with pytest.raises(RuntimeError):
+                await task
+
+        async def succeeding():
+            return "ok"
+
+        # A retry after the failure runs again
+        assert await store.run("key", "fp", succeeding) == "ok"
+
+    asyncio.run(scenario())
+
+def test_cancelled_leader_hands_over_to_a_waiter():
+    async def scenario():
+        store = IdempotencyStore()
+        calls = 0
+        first = asyncio.Event()
+
+        async def send():
+            nonlocal calls
+            calls += 1
+            if calls == 1:
+                await first.wait()
+            return calls
+
+        leader = asyncio.create_task(store.run("key", "fp", send))
+        await asyncio.sleep(0)
+        waiter = asyncio.create_task(store.run("key", "fp", send))
+        await asyncio.sleep(0)
+        leader.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await leader
+        # The waiter retries, becomes the leader and runs the request itself
+        assert await waiter == 2
+
+    asyncio.run(scenario())
+
+def test_completed_entries_expire_after_ttl():
+    async def scenario():
+        store = IdempotencyStore(ttl=0.01)
+        calls = 0
+
+        async def send():
+            nonlocal calls
+            calls += 1
+            return calls
+
+        assert await store.run("key", "fp", send) == 1
+        await asyncio.sleep(0.02)
+        assert await store.run("key", "fp", send) == 2
+        assert store.get_status()["entries"] == 1
+
+    asyncio.run(scenario())
+
+def test_size_limit_evicts_completed_but_not_in_flight_entries():
+    async def scenario():
+        store = IdempotencyStore(max_entries=1)
+        state, _ = store.begin("in-flight", "fp")
+        assert state == "lead"
+        # The oldest entry is in flight, so nothing is evicted
+        assert store.begin("other", "fp")[0] == "lead"
+        assert store.get_status()["entries"] == 2
+
+        store.complete("in-flight", "done")
+        store.complete("other", "done")
+        store.begin("third", "fp")
+        assert store.get_status()["entries"] == 1
+
+    asyncio.run(scenario())
+
+def test_stale_leader_cannot_complete_a_newer_entry():
+    async def scenario():
+        store = IdempotencyStore()
+        _, old = store.begin("key", "fp")
+        store.fail("key", owner=old)
+        # A retry leads a new entry for the same key
+        state, new = store.begin("key", "fp")
+        assert state == "lead"
+
+        store.complete("key", "old response", owner=old)
+        store.fail("key", owner=old)
+        assert store.begin("key", "fp")[0] == "wait"
+
+        store.complete("key", "new response", owner=new)
+        assert store.begin("key", "fp") == ("replay", "new response")
+
+    asyncio.run(scenario())
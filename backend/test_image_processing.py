@@ -0,0 +1,53 @@
+import asyncio
+import io
+
+from PIL import Image
+
+from image_processing import preprocess_image, preprocess_image_async
+
+def encode(image: Image.Image, format: str, **kwargs) -> bytes:
+    buffer = io.BytesIO()
+    image.save(buffer, format=format, **kwargs)
+    return buffer.getvalue()
+
+def decode(data: bytes) -> Image.Image:
+    image = Image.open(io.BytesIO(data))
+    image.load()
+    return image
+
+def test_exif_orientation_is_applied():
+    # Landscape pixels tagged "rotate 90° clockwise" (orientation 6) display as portrait
+    image = Image.new("RGB", (40, 20), "red")
+    exif = Image.Exif()
+    exif[0x0112] = 6
+    processed = preprocess_image(encode(image, "JPEG", exif=exif), "photo.jpg")
+
+    assert (processed.width, processed.height) == (20, 40)
+    jpeg = decode(processed.data)
+    assert jpeg.size == (20, 40)
+    # The orientation is baked into the pixels, so the tag must not rotate them again
+    assert jpeg.getexif().get(0x0112) in (None, 1)
+
+def test_large_images_are_downsized_keeping_the_aspect_ratio():
+    processed = preprocess_image(encode(Image.new("RGB", (400, 200)), "PNG"), "big.png", max_edge=100)
+    assert (processed.width, processed.height) == (100, 50)
+    assert decode(processed.data).size == (100, 50)
+
+    # Small images are never upscaled
+    small = preprocess_image(encode(Image.new("RGB", (30, 10)), "PNG"), "small.png", max_edge=100)
+    assert (small.width, small.height) == (30, 10)
+
+def test_transparent_png_becomes_a_jpeg_on_white():
+    image = Image.new("RGBA", (10, 10), (0, 0, 0, 0))
+    image.putpixel((0, 0), (255, 0, 0, 255))
+    processed = preprocess_image(encode(image, "PNG"), "scan.final.png")
+
+    assert processed.filename == "scan.final.jpg"
+    jpeg = decode(processed.data)
+    assert jpeg.format == "JPEG"
+    assert jpeg.mode == "RGB"
+    assert processed.image.getpixel((9, 9)) == (255, 255, 255)
+    assert processed.image.getpixel((0, 0)) == (255, 0, 0)
+
+def test_undecodable_data_is_rejected():
+    assert asyncio.run(preprocess_image_async(b"not an image", "x.png")) is None
@@ -0,0 +1,92 @@
+import pytest
+from google.api_core import exceptions as google_exceptions
+
+import resilience
+from resilience import CircuitBreaker, CircuitOpenError, backoff_delay, is_retryable
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(resilience.time, "monotonic", clock)
+    return clock
+
+def test_backoff_delay_is_jittered_and_capped(monkeypatch):
+    # Upper end of the jitter range exposes the exponential bound
+    monkeypatch.setattr(resilience.random, "uniform", lambda low, high: high)
+    assert [backoff_delay(attempt, base=0.5, cap=3) for attempt in range(1, 6)] == [0.5, 1.0, 2.0, 3, 3]
+    monkeypatch.setattr(resilience.random, "uniform", lambda low, high: low)
+    assert backoff_delay(4, base=0.5, cap=3) == 0
+
+def test_only_transient_errors_are_retried():
+    assert is_retryable(google_exceptions.ResourceExhausted("quota"))
+    assert is_retryable(google_exceptions.ServiceUnavailable("down"))
+    assert is_retryable(TimeoutError())
+    assert not is_retryable(google_exceptions.InvalidArgument("bad request"))
+    assert not is_retryable(ValueError())
+
+def test_breaker_opens_after_consecutive_failures(clock):
+    breaker = CircuitBreaker(failure_threshold=3, reset_timeout=30)
+    for _ in range(2):
+        breaker.before_call()
+        breaker.record_failure()
+    # A success resets the streak
+    breaker.before_call()
+    breaker.record_success()
+    for _ in range(3):
+        breaker.before_call()
+        breaker.record_failure()
+
+    assert breaker.state == CircuitBreaker.OPEN
+    with pytest.raises(CircuitOpenError):
+        breaker.before_call()
+    assert breaker.get_status()["rejected"] == 1
+    assert breaker.opened == 1
+
+def test_half_open_allows_a_single_probe(clock):
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=30)
+    breaker.before_call()
+    breaker.record_failure()
+
+    clock.now += 30
+    breaker.before_call()
+    assert breaker.state == CircuitBreaker.HALF_OPEN
+    with pytest.raises(CircuitOpenError):
+        breaker.before_call()
+
+    breaker.record_success()
+    assert breaker.state == CircuitBreaker.CLOSED
+    breaker.before_call()
+
+def test_failed_probe_reopens_the_breaker(clock):
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=30)
+    breaker.before_call()
+    breaker.record_failure()
+
+    clock.now += 30
+    breaker.before_call()
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.OPEN
+    clock.now += 29
+    with pytest.raises(CircuitOpenError):
+        breaker.before_call()
+    clock.now += 1
+    breaker.before_call()
+
+def test_ignored_probe_lets_the_next_call_probe(clock):
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=30)
+    breaker.before_call()
+    breaker.record_failure()
+
+    clock.now += 30
+    breaker.before_call()
+    # The probe's client went away: no verdict, the next call may probe
+    breaker.record_ignored()
+    breaker.before_call()
+    assert breaker.state == CircuitBreaker.HALF_OPEN
@@ -0,0 +1,76 @@
+import pytest
+from google.api_core import exceptions as google_exceptions
+
+import subject_models
+from subject_models import LocalPromptCache, SubjectModelRegistry
+
+PROMPTS = {"수학": "math prompt", "영어": "english prompt"}
+TTL = 600
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(subject_models.time, "monotonic", clock)
+    return clock
+
+@pytest.fixture
+def registry(clock):
+    registry = SubjectModelRegistry("gemini-test", {}, PROMPTS, "수학", cache_mode="local", cache_ttl=TTL)
+    assert isinstance(registry.cache, LocalPromptCache)
+    return registry
+
+def failing_create(error):
+    def create(model_name, system_instruction, model_kwargs):
+        raise error
+    return create
+
+def test_models_are_reused_per_subject(registry):
+    math = registry.get("수학")
+    assert registry.get("수학") is math
+    # Unknown subjects share the default subject's model
+    assert registry.get("과학") is math
+    assert registry.get("영어") is not math
+    assert sorted(prompt for prompt, _ in registry.cache.entries.values()) == sorted(PROMPTS.values())
+
+def test_cached_model_is_rebuilt_before_the_cache_entry_expires(registry, clock):
+    first = registry.get("수학")
+    clock.now += TTL - registry.REFRESH_MARGIN_SECONDS - 1
+    assert registry.get("수학") is first
+
+    clock.now += 1
+    refreshed = registry.get("수학")
+    assert refreshed is not first
+    # The new entry is created while the old one is still valid provider-side
+    assert all(expires_at > clock.now for _, expires_at in registry.cache.entries.values())
+
+def test_failed_caching_falls_back_and_retries_later(registry, clock, monkeypatch):
+    create = registry.cache.create
+    monkeypatch.setattr(registry.cache, "create", failing_create(google_exceptions.ServiceUnavailable("down")))
+    fallback = registry.get("수학")
+    assert fallback is not None
+    assert registry._models["수학"].cache_handle is None
+
+    monkeypatch.setattr(registry.cache, "create", create)
+    clock.now += registry.FALLBACK_RETRY_SECONDS - 1
+    assert registry.get("수학") is fallback
+    clock.now += 1
+    assert registry.get("수학") is not fallback
+    assert registry._models["수학"].cache_handle in registry.cache.entries
+
+def test_prompt_below_the_minimum_cache_size_is_not_retried(registry, clock, monkeypatch):
+    too_small = google_exceptions.InvalidArgument(
+        "Cached content is too small. total_token_count=812, min_total_token_count=1024"
+    )
+    monkeypatch.setattr(registry.cache, "create", failing_create(too_small))
+    model = registry.get("수학")
+
+    clock.now += registry.FALLBACK_RETRY_SECONDS * 10
+    assert registry.get("수학") is model
+    assert registry._models["수학"].expires_at is None
@@ -0,0 +1,190 @@
+import asyncio
+import time
+from datetime import datetime
+
+import pytest
+from sqlalchemy import create_engine, select
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+from sqlalchemy.orm import Session
+from sqlalchemy.pool import NullPool
+
+from models import Base, ChatSession, Message, Subject, UploadedImage, User
+from upload_spool import PENDING_PREFIX, UploadSpool
+
+URL = "https://res.cloudinary.com/demo/image/upload/a.jpg"
+TRANSIENT = {"success": False, "error": "timeout", "retryable": True}
+PERMANENT = {"success": False, "error": "Must supply api_key", "retryable": False}
+UPLOADED = {"success": True, "url": URL}
+
+class FakeUploader:
+    """
+    Stands in for CloudinaryService: returns the scripted results in order, repeating the last one
+    """
+    def __init__(self, *results):
+        self.results = list(results)
+        self.calls = 0
+
+    async def upload_image_async(self, file_data, filename):
+        self.calls += 1
+        return self.results[min(self.calls, len(self.results)) - 1]
+
+@pytest.fixture
+def db(tmp_path):
+    """
+    Throwaway SQLite file with one chat session; yields (sync session, async session factory, session id)
+    """
+    path = tmp_path / "spool.db"
+    sync_engine = create_engine(f"sqlite:///{path}")
+    Base.metadata.create_all(sync_engine)
+    async_engine = create_async_engine(f"sqlite+aiosqlite:///{path}", poolclass=NullPool)
+    session_factory = async_sessionmaker(async_engine, class_=AsyncSession, expire_on_commit=False)
+    with Session(sync_engine) as session:
+        user = User(email="a@b.com", name="n", hashed_password="x", grade="고1")
+        subject = Subject(name="수학", color="#3B82F6", icon="calculator")
+        session.add_all([user, subject])
+        session.flush()
+        chat = ChatSession(user_id=user.id, subject_id=subject.id, title="t", created_at=datetime(2026, 1, 1))
+        session.add(chat)
+        session.commit()
+        yield session, session_factory, chat.id
+    sync_engine.dispose()
+
+def make_spool(tmp_path, uploader, session_factory, **kwargs):
+    kwargs.setdefault("retry_base", 0.01)
+    kwargs.setdefault("orphan_grace", 0)
+    return UploadSpool(uploader, session_factory, directory=str(tmp_path / "spool"), workers=1, **kwargs)
+
+def add_message(session, session_id: int, image_ref: str) -> int:
+    message = Message(session_id=session_id, content="q", is_user=True, image_path=image_ref)
+    session.add(message)
+    session.commit()
+    return message.id
+
+def image_path_of(session, message_id: int):
+    session.expire_all()
+    return session.get(Message, message_id).image_path
+
+async def eventually(condition, timeout: float = 5):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "condition not reached"
+        await asyncio.sleep(0.01)
+
+def test_transient_failure_is_retried_until_the_upload_succeeds(tmp_path, db):
+    session, session_factory, session_id = db
+    uploader = FakeUploader(TRANSIENT, TRANSIENT, UPLOADED)
+    spool = make_spool(tmp_path, uploader, session_factory)
+
+    async def scenario():
+        await spool.start()
+        image_ref = await spool.spool(b"image", "a.jpg", session_id)
+        spool_id = image_ref[len(PENDING_PREFIX):]
+        message_id = add_message(session, session_id, image_ref)
+        spool.enqueue(image_ref)
+        await eventually(lambda: spool.uploaded_url(spool_id) is not None)
+        await spool.stop()
+
+        assert uploader.calls == 3
+        assert image_path_of(session, message_id) == URL
+        assert spool.pending_file(spool_id) is None
+        assert spool.uploaded_url(spool_id) == URL
+        assert session.scalar(select(UploadedImage.filepath)) == URL
+        # The message history ETag changes with the patched image URL
+        assert session.get(ChatSession, session_id).version == 1
+
+    asyncio.run(scenario())
+
+def test_exhausted_retries_move_the_entry_to_failed(tmp_path, db):
+    session, session_factory, session_id = db
+    uploader = FakeUploader(TRANSIENT)
+    spool = make_spool(tmp_path, uploader, session_factory, max_attempts=3)
+
+    async def scenario():
+        await spool.start()
+        image_ref = await spool.spool(b"image", "a.jpg", session_id)
+        spool_id = image_ref[len(PENDING_PREFIX):]
+        message_id = add_message(session, session_id, image_ref)
+        spool.enqueue(image_ref)
+        failed = spool.directory / "failed" / f"{spool_id}.json"
+        await eventually(lambda: failed.exists() and image_path_of(session, message_id) is None)
+        await spool.stop()
+
+        assert uploader.calls == 3
+        assert (spool.directory / "failed" / f"{spool_id}.bin").read_bytes() == b"image"
+        assert spool.pending_file(spool_id) is None
+        assert spool.uploaded_url(spool_id) is None
+
+    asyncio.run(scenario())
+
+def test_permanent_error_is_dead_lettered_without_retrying(tmp_path, db):
+    session, session_factory, session_id = db
+    uploader = FakeUploader(PERMANENT, UPLOADED)
+    spool = make_spool(tmp_path, uploader, session_factory, max_attempts=5)
+
+    async def scenario():
+        await spool.start()
+        image_ref = await spool.spool(b"image", "a.jpg", session_id)
+        spool_id = image_ref[len(PENDING_PREFIX):]
+        message_id = add_message(session, session_id, image_ref)
+        spool.enqueue(image_ref)
+        failed = spool.directory / "failed" / f"{spool_id}.json"
+        await eventually(lambda: failed.exists() and image_path_of(session, message_id) is None)
+        await asyncio.sleep(0.05)
+        await spool.stop()
+
+        assert uploader.calls == 1
+
+    asyncio.run(scenario())
+
+def test_tombstone_is_written_before_the_entry_is_removed(tmp_path, db):
+    session, session_factory, session_id = db
+    spool = make_spool(tmp_path, FakeUploader(UPLOADED), session_factory)
+    seen = []
+    remove_entry = spool._remove_entry
+
+    def recording_remove_entry(spool_id):
+        # The pending URL must already redirect when the spooled bytes disappear
+        seen.append(spool.uploaded_url(spool_id))
+        remove_entry(spool_id)
+
+    spool._remove_entry = recording_remove_entry
+
+    async def scenario():
+        await spool.start()
+        image_ref = await spool.spool(b"image", "a.jpg", session_id)
+        spool_id = image_ref[len(PENDING_PREFIX):]
+        add_message(session, session_id, image_ref)
+        spool.enqueue(image_ref)
+        await eventually(lambda: spool.pending_file(spool_id) is None)
+        await spool.stop()
+
+    asyncio.run(scenario())
+    assert seen == [URL]
+
+def test_orphan_is_kept_for_the_grace_period_then_removed(tmp_path, db):
+    session, session_factory, session_id = db
+    uploader = FakeUploader(UPLOADED)
+    spool = make_spool(tmp_path, uploader, session_factory, orphan_grace=0.3)
+
+    async def scenario():
+        await spool.start()
+        late_ref = await spool.spool(b"late", "late.jpg", session_id)
+        orphan_ref = await spool.spool(b"orphan", "orphan.jpg", session_id)
+        late_id, orphan_id = late_ref[len(PENDING_PREFIX):], orphan_ref[len(PENDING_PREFIX):]
+        for image_ref in (late_ref, orphan_ref):
+            spool.enqueue(image_ref)
+        await asyncio.sleep(0.05)
+        # Neither message row exists yet, but both are still inside the grace period
+        assert spool.pending_file(late_id) and spool.pending_file(orphan_id)
+
+        # A message committed within the grace period is still uploaded
+        message_id = add_message(session, session_id, late_ref)
+        await eventually(lambda: spool.pending_file(late_id) is None and spool.pending_file(orphan_id) is None)
+        await spool.stop()
+
+        assert image_path_of(session, message_id) == URL
+        assert uploader.calls == 1
+        assert spool.uploaded_url(orphan_id) is None
+        assert not (spool.directory / "failed").exists()
+
+    asyncio.run(scenario())
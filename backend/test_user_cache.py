@@ -0,0 +1,71 @@
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import Session
+
+import user_cache as user_cache_module
+from models import Base, User
+from schemas import UserResponse
+from user_cache import UserCache, user_cache
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(user_cache_module.time, "monotonic", clock)
+    return clock
+
+def principal(user_id: int, name: str = "n") -> UserResponse:
+    return UserResponse(id=user_id, email=f"{user_id}@b.com", name=name, grade="고1")
+
+def test_entries_expire_after_ttl(clock):
+    cache = UserCache(ttl=60, max_size=10)
+    cache.set(principal(1))
+    clock.now += 59
+    assert cache.get(1) == principal(1)
+    clock.now += 1
+    assert cache.get(1) is None
+
+def test_least_recently_used_entry_is_evicted(clock):
+    cache = UserCache(ttl=60, max_size=2)
+    cache.set(principal(1))
+    cache.set(principal(2))
+    # Reading 1 makes 2 the least recently used entry
+    assert cache.get(1) is not None
+    cache.set(principal(3))
+    assert cache.get(2) is None
+    assert cache.get(1) is not None
+    assert cache.get(3) is not None
+
+def test_disabled_cache_stores_nothing(clock):
+    for cache in (UserCache(ttl=0, max_size=10), UserCache(ttl=60, max_size=0)):
+        cache.set(principal(1))
+        assert cache.get(1) is None
+
+def test_user_update_and_delete_invalidate_the_shared_cache():
+    engine = create_engine("sqlite://")
+    Base.metadata.create_all(engine)
+    user_cache.clear()
+    try:
+        with Session(engine) as db:
+            user = User(email="a@b.com", name="n", hashed_password="x", grade="고1")
+            db.add(user)
+            db.commit()
+            user_cache.set(principal(user.id))
+
+            user.name = "renamed"
+            db.commit()
+            assert user_cache.get(user.id) is None
+
+            user_cache.set(principal(user.id, "renamed"))
+            db.delete(user)
+            db.commit()
+            assert user_cache.get(user.id) is None
+    finally:
+        user_cache.clear()
+        engine.dispose()
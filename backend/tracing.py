@@ -0,0 +1,226 @@
+import asyncio
+import contextvars
+import functools
+import json
+import logging
+import os
+import threading
+from typing import Optional, Sequence
+
+from opentelemetry import context as otel_context
+from opentelemetry import propagate, trace
+from opentelemetry.trace import SpanKind, Status, StatusCode
+
+from env_utils import env_flag
+from logging_config import request_id_var
+from metrics import route_template
+
+logger = logging.getLogger(__name__)
+
+# 요청 추적(OpenTelemetry) 설정
+# none: 비활성(no-op), console: stdout, file: JSON lines 파일, otlp: 외부 컬렉터 (opentelemetry-exporter-otlp 필요)
+TRACING_EXPORTER = os.getenv("TRACING_EXPORTER", "none").strip().lower()
+TRACING_FILE = os.getenv("TRACING_FILE", "traces.jsonl")
+# 새로 시작하는 트레이스의 샘플링 비율 (들어온 traceparent의 결정은 그대로 따름)
+TRACING_SAMPLE_RATE = float(os.getenv("TRACING_SAMPLE_RATE", "1.0"))
+TRACING_SERVICE_NAME = os.getenv("TRACING_SERVICE_NAME", "aissam-backend")
+# SQL 문장을 span 속성으로 기록 (파라미터는 기록하지 않음)
+TRACING_DB_STATEMENT = env_flag("TRACING_DB_STATEMENT", "true")
+
+tracer = trace.get_tracer("aissam")
+
+_provider = None
+
+def _span_to_dict(span) -> dict:
+    context = span.get_span_context()
+    parent = span.parent
+    return {
+        "name": span.name,
+        "trace_id": format(context.trace_id, "032x"),
+        "span_id": format(context.span_id, "016x"),
+        "parent_id": format(parent.span_id, "016x") if parent else None,
+        "kind": span.kind.name,
+        "start": span.start_time,
+        "duration_ms": round((span.end_time - span.start_time) / 1e6, 3),
+        "status": span.status.status_code.name,
+        "attributes": dict(span.attributes or {}),
+        "events": [
+            {"name": event.name, "time": event.timestamp, "attributes": dict(event.attributes or {})}
+            for event in span.events
+        ],
+        "links": [
+            {"trace_id": format(link.context.trace_id, "032x"), "span_id": format(link.context.span_id, "016x")}
+            for link in span.links
+        ]
+    }
+
+def _create_exporter(name: str):
+    from opentelemetry.sdk.trace.export import ConsoleSpanExporter, SpanExporter, SpanExportResult
+
+    class JsonLinesFileExporter(SpanExporter):
+        """
+        One finished span per line; runs on the batch processor's thread
+        """
+        def __init__(self, path: str):
+            self.path = path
+            self._lock = threading.Lock()
+
+        def export(self, spans: Sequence) -> "SpanExportResult":
+            lines = "".join(json.dumps(_span_to_dict(span), ensure_ascii=False, default=str) + "\n" for span in spans)
+            try:
+                with self._lock, open(self.path, "a", encoding="utf-8") as file:
+                    file.write(lines)
+            except OSError:
+                return SpanExportResult.FAILURE
+            return SpanExportResult.SUCCESS
+
+    if name == "console":
+        return ConsoleSpanExporter(
+            formatter=lambda span: json.dumps(_span_to_dict(span), ensure_ascii=False, default=str) + "\n"
+        )
+    if name == "file":
+        return JsonLinesFileExporter(TRACING_FILE)
+    if name == "otlp":
+        from opentelemetry.exporter.otlp.proto.http.trace_exporter import OTLPSpanExporter
+        return OTLPSpanExporter()
+    raise ValueError(f"unknown TRACING_EXPORTER '{name}'")
+
+def setup_tracing(exporter: str = TRACING_EXPORTER):
+    """
+    Install the SDK tracer provider; with TRACING_EXPORTER=none the API stays a no-op (idempotent)
+    """
+    global _provider
+    if _provider is not None or exporter in ("", "none", "off"):
+        return
+    from opentelemetry.sdk.resources import Resource
+    from opentelemetry.sdk.trace import TracerProvider
+    from opentelemetry.sdk.trace.export import BatchSpanProcessor
+    from opentelemetry.sdk.trace.sampling import ParentBased, TraceIdRatioBased
+
+    try:
+        span_exporter = _create_exporter(exporter)
+    except (ImportError, ValueError) as e:
+        logger.warning("tracing disabled", extra={"exporter": exporter, "error": str(e)})
+        return
+
+    _provider = TracerProvider(
+        resource=Resource.create({"service.name": TRACING_SERVICE_NAME}),
+        sampler=ParentBased(TraceIdRatioBased(TRACING_SAMPLE_RATE))
+    )
+    # Export happens on the processor's background thread, in batches
+    _provider.add_span_processor(BatchSpanProcessor(span_exporter))
+    trace.set_tracer_provider(_provider)
+
+    from database import async_engine, engine
+    instrument_engine(engine)
+    instrument_engine(async_engine.sync_engine)
+
+def shutdown_tracing():
+    """
+    Flush pending spans
+    """
+    global _provider
+    if _provider is not None:
+        _provider.shutdown()
+        _provider = None
+
+async def run_in_executor_with_context(func, *args, executor=None):
+    """
+    loop.run_in_executor that keeps the current span (and other contextvars) in the worker thread
+    """
+    loop = asyncio.get_running_loop()
+    context = contextvars.copy_context()
+    return await loop.run_in_executor(executor, functools.partial(context.run, func, *args))
+
+def inject_trace_context() -> dict:
+    """
+    W3C traceparent of the current span, for work that continues outside the request (e.g. upload spool)
+    """
+    carrier = {}
+    propagate.inject(carrier)
+    return carrier
+
+def linked_span_context(carrier: Optional[dict]):
+    """
+    Span context extracted from inject_trace_context() output, or None
+    """
+    if not carrier:
+        return None
+    span_context = trace.get_current_span(propagate.extract(carrier)).get_span_context()
+    return span_context if span_context.is_valid else None
+
+# SQLAlchemy cursor events: one client span per statement
+def _start_query_span(conn, cursor, statement, parameters, context, executemany):
+    if context is None:
+        return
+    span = tracer.start_span(
+        statement.split(None, 1)[0].upper() if statement else "SQL",
+        kind=SpanKind.CLIENT,
+        attributes={"db.system": conn.engine.dialect.name}
+    )
+    if span.is_recording():
+        if TRACING_DB_STATEMENT:
+            span.set_attribute("db.statement", statement)
+        if executemany:
+            span.set_attribute("db.executemany", True)
+    context._aissam_span = span
+
+def _end_query_span(conn, cursor, statement, parameters, context, executemany):
+    span = getattr(context, "_aissam_span", None)
+    if span is not None:
+        span.end()
+        context._aissam_span = None
+
+def _fail_query_span(exception_context):
+    span = getattr(exception_context.execution_context, "_aissam_span", None)
+    if span is not None:
+        span.record_exception(exception_context.original_exception)
+        span.set_status(Status(StatusCode.ERROR))
+        span.end()
+        exception_context.execution_context._aissam_span = None
+
+def instrument_engine(engine):
+    from sqlalchemy import event
+
+    event.listen(engine, "before_cursor_execute", _start_query_span)
+    event.listen(engine, "after_cursor_execute", _end_query_span)
+    event.listen(engine, "handle_error", _fail_query_span)
+
+class TracingMiddleware:
+    """
+    Pure ASGI middleware: one server span per HTTP request, continuing an incoming traceparent
+    """
+    def __init__(self, app, fastapi_app):
+        self.app = app
+        self.fastapi_app = fastapi_app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or _provider is None:
+            await self.app(scope, receive, send)
+            return
+
+        headers = {key.decode("latin-1"): value.decode("latin-1") for key, value in scope["headers"]}
+        parent = propagate.extract(headers)
+        route = route_template(self.fastapi_app, scope)
+        token = otel_context.attach(parent)
+        try:
+            with tracer.start_as_current_span(
+                f"{scope['method']} {route}",
+                kind=SpanKind.SERVER,
+                attributes={
+                    "http.method": scope["method"],
+                    "http.route": route,
+                    "http.target": scope["path"],
+                    "request.id": request_id_var.get() or ""
+                }
+            ) as span:
+                async def send_wrapper(message):
+                    if message["type"] == "http.response.start":
+                        span.set_attribute("http.status_code", message["status"])
+                        if message["status"] >= 500:
+                            span.set_status(Status(StatusCode.ERROR))
+                    await send(message)
+
+                await self.app(scope, receive, send_wrapper)
+        finally:
+            otel_context.detach(token)
@@ -0,0 +1,381 @@
+import asyncio
+import json
+import logging
+import os
+import random
+import re
+import time
+import uuid
+from pathlib import Path
+from typing import Optional
+
+from opentelemetry.trace import Link
+from sqlalchemy import select, update
+
+from models import ChatSession, Message, UploadedImage
+from tracing import inject_trace_context, linked_span_context, tracer
+
+logger = logging.getLogger(__name__)
+
+# 업로드 스풀 설정
+# Railway 컨테이너 디스크는 재배포 시 초기화되므로 볼륨 경로를 지정하는 것을 권장
+UPLOAD_SPOOL_DIR = os.getenv("UPLOAD_SPOOL_DIR", "./upload_spool")
+UPLOAD_WORKERS = int(os.getenv("UPLOAD_WORKERS", "2"))
+UPLOAD_RETRY_BASE_SECONDS = float(os.getenv("UPLOAD_RETRY_BASE_SECONDS", "2"))
+UPLOAD_RETRY_MAX_SECONDS = float(os.getenv("UPLOAD_RETRY_MAX_SECONDS", "300"))
+# 이 횟수만큼 실패한 업로드는 failed/ 로 옮기고 메시지의 이미지 참조를 제거
+UPLOAD_MAX_ATTEMPTS = int(os.getenv("UPLOAD_MAX_ATTEMPTS", "12"))
+# 메시지 행이 없는 항목을 고아로 보고 지우기까지의 유예 시간
+# (커밋 전인 다른 프로세스의 항목을 지우지 않도록; 스풀 디렉터리를 공유하는 롤링 배포 대비)
+UPLOAD_ORPHAN_GRACE_SECONDS = float(os.getenv("UPLOAD_ORPHAN_GRACE_SECONDS", "600"))
+# 업로드 완료된 스풀 id -> URL 기록 보관 기간 (이전 pending URL을 가진 클라이언트용 리다이렉트)
+UPLOAD_TOMBSTONE_TTL_SECONDS = float(os.getenv("UPLOAD_TOMBSTONE_TTL_SECONDS", "604800"))
+
+# Message.image_path 값으로 저장되는 업로드 대기 참조
+PENDING_PREFIX = "pending:"
+PENDING_URL_PREFIX = "/uploads/pending/"
+SPOOL_ID_PATTERN = re.compile(r"^[0-9a-f]{32}$")
+
+def public_image_url(image_path: Optional[str]) -> Optional[str]:
+    """
+    Map a stored image_path to a client URL; pending uploads are served from the spool
+    """
+    if image_path and image_path.startswith(PENDING_PREFIX):
+        return PENDING_URL_PREFIX + image_path[len(PENDING_PREFIX):]
+    return image_path
+
+class UploadSpool:
+    """
+    Durable on-disk spool of images waiting for Cloudinary, drained by background workers
+
+    Each entry is <id>.bin (image bytes) plus <id>.json (metadata). The message
+    is saved with image_path "pending:<id>"; once the upload succeeds the worker
+    replaces it with the Cloudinary URL, records an UploadedImage row and
+    deletes the entry, leaving uploaded/<id>.json (the URL) behind so old
+    pending URLs can be redirected. Failed uploads are retried with
+    exponential backoff; after max_attempts (or right away when the uploader
+    reports the error as not retryable, e.g. missing Cloudinary config) the
+    entry is moved to failed/ and the message's image reference is cleared (or
+    set to the Cloudinary URL if only the DB patch kept failing). Leftovers are picked up again on startup;
+    an entry without a message row is only dropped as an orphan once it is
+    older than orphan_grace, since its message may not be committed yet.
+    """
+    def __init__(
+        self,
+        cloudinary_service,
+        session_factory,
+        directory: str = UPLOAD_SPOOL_DIR,
+        workers: int = UPLOAD_WORKERS,
+        retry_base: float = UPLOAD_RETRY_BASE_SECONDS,
+        retry_max: float = UPLOAD_RETRY_MAX_SECONDS,
+        max_attempts: int = UPLOAD_MAX_ATTEMPTS,
+        tombstone_ttl: float = UPLOAD_TOMBSTONE_TTL_SECONDS,
+        orphan_grace: float = UPLOAD_ORPHAN_GRACE_SECONDS
+    ):
+        self.cloudinary_service = cloudinary_service
+        self.session_factory = session_factory
+        self.directory = Path(directory)
+        self.workers = max(1, workers)
+        self.retry_base = retry_base
+        self.retry_max = retry_max
+        self.max_attempts = max(1, max_attempts)
+        self.tombstone_ttl = tombstone_ttl
+        self.orphan_grace = orphan_grace
+        self._queue = None
+        self._tasks = []
+        self._retry_handles = set()
+
+    def _data_path(self, spool_id: str) -> Path:
+        return self.directory / f"{spool_id}.bin"
+
+    def _meta_path(self, spool_id: str) -> Path:
+        return self.directory / f"{spool_id}.json"
+
+    def _tombstone_path(self, spool_id: str) -> Path:
+        return self.directory / "uploaded" / f"{spool_id}.json"
+
+    def _write_meta(self, spool_id: str, meta: dict, path: Optional[Path] = None):
+        path = path or self._meta_path(spool_id)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = path.with_name(path.name + ".tmp")
+        tmp_path.write_text(json.dumps(meta, ensure_ascii=False), encoding="utf-8")
+        os.replace(tmp_path, path)
+
+    def _remove_entry(self, spool_id: str):
+        for path in (self._meta_path(spool_id), self._data_path(spool_id)):
+            try:
+                path.unlink()
+            except FileNotFoundError:
+                pass
+
+    def _move_to_failed(self, spool_id: str):
+        failed_dir = self.directory / "failed"
+        failed_dir.mkdir(parents=True, exist_ok=True)
+        for path in (self._data_path(spool_id), self._meta_path(spool_id)):
+            try:
+                os.replace(path, failed_dir / path.name)
+            except FileNotFoundError:
+                pass
+
+    def _prune_tombstones(self):
+        cutoff = time.time() - self.tombstone_ttl
+        for path in (self.directory / "uploaded").glob("*.json"):
+            try:
+                if path.stat().st_mtime < cutoff:
+                    path.unlink()
+            except FileNotFoundError:
+                pass
+
+    def _write_entry(self, spool_id: str, data: bytes, meta: dict):
+        self.directory.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.directory / f"{spool_id}.bin.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self._data_path(spool_id))
+        # Metadata last: an entry only counts once its .json exists
+        self._write_meta(spool_id, meta)
+
+    async def spool(self, data: bytes, filename: str, session_id: int) -> str:
+        """
+        Persist image bytes to the spool and return the pending image_path reference
+        """
+        spool_id = uuid.uuid4().hex
+        meta = {
+            "session_id": session_id,
+            "filename": filename,
+            "attempts": 0,
+            "created_at": time.time(),
+            # Upload spans link back to the request that spooled the image
+            "trace": inject_trace_context()
+        }
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(None, self._write_entry, spool_id, data, meta)
+        return PENDING_PREFIX + spool_id
+
+    def enqueue(self, image_ref: str):
+        """
+        Hand a spooled entry to the workers (call after the message row is committed)
+        """
+        if self._queue is not None:
+            self._queue.put_nowait(image_ref[len(PENDING_PREFIX):])
+
+    async def discard(self, image_ref: str):
+        """
+        Delete a spooled entry whose message was never saved (e.g. the commit failed)
+        """
+        await asyncio.get_running_loop().run_in_executor(
+            None, self._remove_entry, image_ref[len(PENDING_PREFIX):]
+        )
+
+    def pending_file(self, spool_id: str) -> Optional[Path]:
+        """
+        Path of a still-pending spooled image, or None
+        """
+        if not SPOOL_ID_PATTERN.match(spool_id):
+            return None
+        path = self._data_path(spool_id)
+        return path if path.exists() else None
+
+    def pending_filename(self, spool_id: str) -> Optional[str]:
+        try:
+            return json.loads(self._meta_path(spool_id).read_text(encoding="utf-8")).get("filename")
+        except (OSError, ValueError):
+            return None
+
+    def uploaded_url(self, spool_id: str) -> Optional[str]:
+        """
+        Cloudinary URL of an entry that has finished uploading, or None
+        """
+        if not SPOOL_ID_PATTERN.match(spool_id):
+            return None
+        try:
+            return json.loads(self._tombstone_path(spool_id).read_text(encoding="utf-8")).get("url")
+        except (OSError, ValueError):
+            return None
+
+    async def start(self):
+        """
+        Start the workers and requeue entries left over from a previous run
+        """
+        self._queue = asyncio.Queue()
+        if self.directory.exists():
+            for meta_path in sorted(self.directory.glob("*.json")):
+                self._queue.put_nowait(meta_path.stem)
+            await asyncio.get_running_loop().run_in_executor(None, self._prune_tombstones)
+        self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+
+    async def stop(self):
+        for handle in self._retry_handles:
+            handle.cancel()
+        self._retry_handles.clear()
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    async def _worker(self):
+        while True:
+            spool_id = await self._queue.get()
+            try:
+                await self._process(spool_id)
+            except Exception:
+                # Failure bookkeeping itself failed (e.g. disk); retry slowly
+                logger.exception("upload spool worker error", extra={"spool_id": spool_id})
+                self._schedule_retry(spool_id, self.retry_max)
+            finally:
+                self._queue.task_done()
+
+    async def _process(self, spool_id: str):
+        loop = asyncio.get_running_loop()
+        try:
+            meta = json.loads(await loop.run_in_executor(None, self._meta_path(spool_id).read_text))
+            data = await loop.run_in_executor(None, self._data_path(spool_id).read_bytes)
+        except FileNotFoundError:
+            # Already handled (e.g. requeued twice)
+            return
+        except ValueError:
+            logger.error("corrupt upload spool entry", extra={"spool_id": spool_id})
+            await loop.run_in_executor(None, self._move_to_failed, spool_id)
+            return
+
+        link = linked_span_context(meta.get("trace"))
+        with tracer.start_as_current_span(
+            "upload_spool.process",
+            links=[Link(link)] if link else None,
+            attributes={"spool.id": spool_id, "spool.attempts": meta["attempts"]}
+        ):
+            try:
+                await self._upload(spool_id, meta, data)
+            except Exception as e:
+                logger.exception("spooled image processing failed", extra={"spool_id": spool_id})
+                await self._record_failure(spool_id, meta, str(e))
+
+    async def _upload(self, spool_id: str, meta: dict, data: bytes):
+        loop = asyncio.get_running_loop()
+        image_ref = PENDING_PREFIX + spool_id
+        async with self.session_factory() as db:
+            referenced = await db.scalar(select(Message.id).where(
+                Message.session_id == meta["session_id"],
+                Message.image_path == image_ref
+            ).limit(1))
+        if referenced is None:
+            age = time.time() - meta.get("created_at", 0)
+            if age < self.orphan_grace:
+                # The message may still be on its way to a commit (possibly in another process)
+                self._schedule_retry(spool_id, self.orphan_grace - age)
+                return
+            # The message was never committed (or already patched): nothing to upload for
+            logger.warning("orphan upload spool entry removed", extra={"spool_id": spool_id})
+            if meta.get("url"):
+                await self._write_tombstone(spool_id, meta["url"])
+            await loop.run_in_executor(None, self._remove_entry, spool_id)
+            return
+
+        url = meta.get("url")
+        if url is None:
+            result = await self.cloudinary_service.upload_image_async(
+                file_data=data,
+                filename=meta["filename"]
+            )
+
+            if not result["success"]:
+                await self._record_failure(spool_id, meta, result.get("error"), result.get("retryable", True))
+                return
+
+            # Remember the URL so a failed DB patch does not upload twice
+            url = result["url"]
+            meta["url"] = url
+            await loop.run_in_executor(None, self._write_meta, spool_id, meta)
+
+        await self._finish(spool_id, meta, url)
+        logger.info("spooled image uploaded", extra={"spool_id": spool_id})
+
+    async def _finish(self, spool_id: str, meta: dict, url: str):
+        """
+        Point the message at the uploaded URL and replace the entry with its tombstone
+        """
+        async with self.session_factory() as db:
+            if await self._patch_message(db, spool_id, meta, url):
+                db.add(UploadedImage(
+                    session_id=meta["session_id"],
+                    filename=meta["filename"],
+                    filepath=url
+                ))
+            await db.commit()
+
+        # Tombstone first so the pending URL never 404s in between
+        await self._write_tombstone(spool_id, url)
+        await asyncio.get_running_loop().run_in_executor(None, self._remove_entry, spool_id)
+
+    async def _write_tombstone(self, spool_id: str, url: str):
+        await asyncio.get_running_loop().run_in_executor(
+            None, self._write_meta, spool_id, {"url": url, "uploaded_at": time.time()}, self._tombstone_path(spool_id)
+        )
+
+    async def _record_failure(self, spool_id: str, meta: dict, error: Optional[str], retryable: bool = True):
+        """
+        Count a failed attempt; retry with backoff or give up after max_attempts (or at once if not retryable)
+        """
+        loop = asyncio.get_running_loop()
+        meta["attempts"] += 1
+        meta["last_error"] = error
+        await loop.run_in_executor(None, self._write_meta, spool_id, meta)
+        if retryable and meta["attempts"] < self.max_attempts:
+            logger.warning(
+                "spooled image upload failed",
+                extra={"spool_id": spool_id, "attempts": meta["attempts"], "error": error}
+            )
+            self._schedule_retry(spool_id, self._retry_delay(meta["attempts"]))
+            return
+
+        if meta.get("url"):
+            # The image is on Cloudinary and only the DB patch failed: keep it
+            logger.error(
+                "spooled image patch retries exhausted; keeping the uploaded URL",
+                extra={"spool_id": spool_id, "attempts": meta["attempts"], "error": error}
+            )
+            await self._finish(spool_id, meta, meta["url"])
+            return
+
+        logger.error(
+            "spooled image upload abandoned",
+            extra={"spool_id": spool_id, "attempts": meta["attempts"], "retryable": retryable, "error": error}
+        )
+        await loop.run_in_executor(None, self._move_to_failed, spool_id)
+        async with self.session_factory() as db:
+            await self._patch_message(db, spool_id, meta, None)
+            await db.commit()
+
+    async def _patch_message(self, db, spool_id: str, meta: dict, image_path: Optional[str]) -> bool:
+        """
+        Replace the pending reference and bump the session version (message history ETag)
+        """
+        patched = await db.execute(
+            update(Message)
+            .where(Message.session_id == meta["session_id"], Message.image_path == PENDING_PREFIX + spool_id)
+            .values(image_path=image_path)
+        )
+        if not patched.rowcount:
+            return False
+        await db.execute(
+            update(ChatSession)
+            .where(ChatSession.id == meta["session_id"])
+            .values(version=ChatSession.version + 1)
+        )
+        return True
+
+    def _retry_delay(self, attempts: int) -> float:
+        delay = min(self.retry_max, self.retry_base * (2 ** (attempts - 1)))
+        return delay * random.uniform(0.5, 1.0)  # jitter
+
+    def _schedule_retry(self, spool_id: str, delay: float):
+        loop = asyncio.get_running_loop()
+
+        def requeue():
+            self._retry_handles.discard(handle)
+            self._queue.put_nowait(spool_id)
+
+        handle = loop.call_later(delay, requeue)
+        self._retry_handles.add(handle)
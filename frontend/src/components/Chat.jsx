@@ -3,8 +3,22 @@ import { useNavigate } from 'react-router-dom';
 import { useAuth } from '../context/AuthContext';
 import MathRenderer from './MathRenderer';
 
+const MESSAGE_PAGE_SIZE = 50;
+
+// 업로드 대기 중인 이미지는 API 서버의 상대 경로(/uploads/pending/...)로 내려옴
+const resolveImageUrl = (path) =>
+  path && path.startsWith('/') ? `${import.meta.env.VITE_API_BASE_URL}${path}` : path;
+
+// 전송 1회당 하나의 키: 브라우저 재시도나 중복 전송 시 서버가 같은 응답을 재사용
+const newIdempotencyKey = () =>
+  window.crypto?.randomUUID
+    ? window.crypto.randomUUID()
+    : `${Date.now()}-${Math.random().toString(36).slice(2)}`;
+
 const Chat = ({ subject, session, onBack }) => {
   const [messages, setMessages] = useState([]);
+  const [hasOlder, setHasOlder] = useState(false);
+  const [loadingOlder, setLoadingOlder] = useState(false);
   const [newMessage, setNewMessage] = useState('');
   const [loading, setLoading] = useState(false);
   const [sending, setSending] = useState(false);
@@ -58,7 +72,7 @@ const Chat = ({ subject, session, onBack }) => {
     
     try {
       setLoading(true);
-      const response = await fetch(`${import.meta.env.VITE_API_BASE_URL}/chat-sessions/${session.id}/messages`, {
+      const response = await fetch(`${import.meta.env.VITE_API_BASE_URL}/chat-sessions/${session.id}/messages?limit=${MESSAGE_PAGE_SIZE}`, {
         headers: {
           'Authorization': `Bearer ${localStorage.getItem('token')}`
         }
@@ -67,6 +81,7 @@ const Chat = ({ subject, session, onBack }) => {
       if (response.ok) {
         const data = await response.json();
         setMessages(data);
+        setHasOlder(data.length === MESSAGE_PAGE_SIZE);
       }
     } catch (error) {
       console.error('메시지를 불러오는데 실패했어요 😔', error);
@@ -75,6 +90,29 @@ const Chat = ({ subject, session, onBack }) => {
     }
   };
 
+  const fetchOlderMessages = async () => {
+    if (!session || messages.length === 0 || loadingOlder) return;
+
+    try {
+      setLoadingOlder(true);
+      const response = await fetch(`${import.meta.env.VITE_API_BASE_URL}/chat-sessions/${session.id}/messages?limit=${MESSAGE_PAGE_SIZE}&before_id=${messages[0].id}`, {
+        headers: {
+          'Authorization': `Bearer ${localStorage.getItem('token')}`
+        }
+      });
+
+      if (response.ok) {
+        const data = await response.json();
+        setMessages(prev => [...data, ...prev]);
+        setHasOlder(data.length === MESSAGE_PAGE_SIZE);
+      }
+    } catch (error) {
+      console.error('이전 메시지를 불러오는데 실패했어요 😔', error);
+    } finally {
+      setLoadingOlder(false);
+    }
+  };
+
   const handleSendMessage = async () => {
     if (!newMessage.trim() && !selectedImage) return;
     if (sending) return;
@@ -124,17 +162,17 @@ const Chat = ({ subject, session, onBack }) => {
         throw new Error('과목 또는 세션 정보가 필요해요');
       }
 
-      const response = await fetch(endpoint, {
+      const response = await fetch(`${endpoint}/stream`, {
         method: 'POST',
         headers: {
-          'Authorization': `Bearer ${localStorage.getItem('token')}`
+          'Authorization': `Bearer ${localStorage.getItem('token')}`,
+          'Idempotency-Key': newIdempotencyKey()
         },
         body: formData
       });
 
       if (response.ok) {
-        const data = await response.json();
-        setMessages(prev => [...prev, data.user_message, data.ai_response]);
+        await readMessageStream(response);
       } else {
         console.error('메시지 전송에 실패했어요 😔');
         // 실패 시 메시지 복구
@@ -161,6 +199,54 @@ const Chat = ({ subject, session, onBack }) => {
     }
   };
 
+  // SSE 응답 읽기: user_message → chunk* → done
+  const readMessageStream = async (response) => {
+    const reader = response.body.getReader();
+    const decoder = new TextDecoder();
+    const streamingId = `streaming-${Date.now()}`;
+    let buffer = '';
+
+    const handleEvent = (event, data) => {
+      if (event === 'user_message') {
+        setMessages(prev => [...prev, data, {
+          id: streamingId,
+          session_id: data.session_id,
+          content: '',
+          is_user: false,
+          created_at: new Date().toISOString()
+        }]);
+      } else if (event === 'chunk') {
+        setMessages(prev => prev.map(msg =>
+          msg.id === streamingId ? { ...msg, content: msg.content + data.text } : msg
+        ));
+      } else if (event === 'done') {
+        setMessages(prev => prev.map(msg =>
+          msg.id === streamingId ? data.ai_response : msg
+        ));
+      }
+    };
+
+    while (true) {
+      const { value, done } = await reader.read();
+      if (done) break;
+      buffer += decoder.decode(value, { stream: true });
+
+      let boundary;
+      while ((boundary = buffer.indexOf('\n\n')) !== -1) {
+        const frame = buffer.slice(0, boundary);
+        buffer = buffer.slice(boundary + 2);
+
+        let event = 'message';
+        let data = '';
+        for (const line of frame.split('\n')) {
+          if (line.startsWith('event: ')) event = line.slice(7);
+          else if (line.startsWith('data: ')) data += line.slice(6);
+        }
+        if (data) handleEvent(event, JSON.parse(data));
+      }
+    }
+  };
+
   const handleImageSelect = (event) => {
     const file = event.target.files[0];
     if (file) {
@@ -348,7 +434,27 @@ const Chat = ({ subject, session, onBack }) => {
               </p>
             </div>
           ) : (
-            messages.map((message, index) => (
+            <>
+            {hasOlder && (
+              <div style={{ textAlign: 'center', marginBottom: '20px' }}>
+                <button
+                  onClick={fetchOlderMessages}
+                  disabled={loadingOlder}
+                  style={{
+                    background: 'rgba(255, 255, 255, 0.85)',
+                    border: '2px solid rgba(199, 125, 255, 0.3)',
+                    borderRadius: '15px',
+                    padding: '8px 16px',
+                    color: '#8B5A83',
+                    cursor: loadingOlder ? 'default' : 'pointer',
+                    fontFamily: 'inherit'
+                  }}
+                >
+                  {loadingOlder ? '불러오는 중... ⏳' : '이전 메시지 더 보기 ⬆️'}
+                </button>
+              </div>
+            )}
+            {messages.map((message, index) => (
               <div
                 key={index}
                 style={{
@@ -415,7 +521,7 @@ const Chat = ({ subject, session, onBack }) => {
                     {message.image_path && (
                       <div style={{ marginBottom: '15px' }}>
                         <img 
-                          src={message.image_path} 
+                          src={resolveImageUrl(message.image_path)} 
                           alt="업로드된 이미지" 
                           style={{
                             maxWidth: '100%',
@@ -444,7 +550,8 @@ const Chat = ({ subject, session, onBack }) => {
                   </div>
                 </div>
               </div>
-            ))
+            ))}
+            </>
           )}
 
           {sending && (
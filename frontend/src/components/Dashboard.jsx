@@ -3,10 +3,13 @@ import { useAuth } from '../context/AuthContext';
 import { useNavigate } from 'react-router-dom';
 import Chat from './Chat';
 
+const SESSION_PAGE_SIZE = 20;
+
 const Dashboard = () => {
   const [subjects, setSubjects] = useState([]);
   const [selectedSubject, setSelectedSubject] = useState(null);
   const [sessions, setSessions] = useState([]);
+  const [hasMoreSessions, setHasMoreSessions] = useState(false);
   const [selectedSession, setSelectedSession] = useState(null);
   const [loading, setLoading] = useState(true);
   const [error, setError] = useState('');
@@ -62,9 +65,12 @@ const Dashboard = () => {
     }
   };
 
-  const fetchSessions = async (subjectId) => {
+  const fetchSessions = async (subjectId, cursor = null) => {
     try {
-      const response = await fetch(`${import.meta.env.VITE_API_BASE_URL}/chat-sessions`, {
+      const params = new URLSearchParams({ subject_id: subjectId, limit: SESSION_PAGE_SIZE });
+      if (cursor) params.append('cursor', cursor);
+
+      const response = await fetch(`${import.meta.env.VITE_API_BASE_URL}/chat-sessions?${params}`, {
         headers: {
           'Authorization': `Bearer ${localStorage.getItem('token')}`
         }
@@ -72,9 +78,8 @@ const Dashboard = () => {
       
       if (response.ok) {
         const data = await response.json();
-        // Filter sessions by subject_id
-        const filteredSessions = data.filter(session => session.subject_id === subjectId);
-        setSessions(filteredSessions);
+        setSessions(prev => cursor ? [...prev, ...data] : data);
+        setHasMoreSessions(data.length === SESSION_PAGE_SIZE);
       }
     } catch (err) {
       setError('세션을 불러오는데 실패했어요 😔');
@@ -426,6 +431,25 @@ const Dashboard = () => {
                 ))}
               </div>
             )}
+
+            {hasMoreSessions && (
+              <div style={{ textAlign: 'center', marginTop: '15px' }}>
+                <button
+                  onClick={() => fetchSessions(selectedSubject.id, sessions[sessions.length - 1].id)}
+                  style={{
+                    background: 'rgba(255, 255, 255, 0.9)',
+                    border: '2px solid rgba(199, 125, 255, 0.3)',
+                    borderRadius: '15px',
+                    padding: '8px 16px',
+                    color: '#8B5A83',
+                    cursor: 'pointer',
+                    fontFamily: 'inherit'
+                  }}
+                >
+                  이전 대화 더 보기 ⬇️
+                </button>
+              </div>
+            )}
           </div>
         )}
 